@@ -0,0 +1,207 @@
+from dataclasses import dataclass, field
+from typing import Any
+
+from . import types
+from .columnar import INT_MAX, INT_MIN
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+class AggFunc(types.StrEnum):
+    COUNT = 'count'
+    SUM = 'sum'
+    MIN = 'min'
+    MAX = 'max'
+
+
+@dataclass(frozen=True)
+class Aggregation:
+    func: AggFunc
+    key: str | None = None
+
+    @property
+    def name(self) -> str:
+        return str(self.func) if self.key is None else f'{self.func}:{self.key}'
+
+    @classmethod
+    def parse(cls, s: str) -> 'Aggregation':
+        func, _, key = s.partition(':')
+        try:
+            func = AggFunc(func.strip().lower())
+        except ValueError:
+            raise ValueError(f'Unknown aggregation {s}, use {"|".join(AggFunc.values())}[:key]')
+        key = key.strip() or None
+        if key is None and func != AggFunc.COUNT:
+            raise ValueError(f'Aggregation {func} requires a key')
+        return cls(func, key)
+
+
+def _merge(func: AggFunc, current: Any, value: Any) -> Any:
+    if current is None:
+        return value
+    if func in (AggFunc.COUNT, AggFunc.SUM):
+        return current + value
+    if func == AggFunc.MIN:
+        return min(current, value)
+    return max(current, value)
+
+
+@dataclass
+class Aggregator:
+    aggregations: list[Aggregation]
+    group_by: list[str] = field(default_factory=list)
+    key_types: dict[str, types.DbType] = field(default_factory=dict)
+    use_numpy: bool = np is not None
+
+    def __post_init__(self):
+        for agg in self.aggregations:
+            if agg.key is not None and agg.key not in self.key_types:
+                raise ValueError(f'Unknown key {agg.key}')
+            if agg.func == AggFunc.SUM and self.key_types[agg.key] != types.DbType.INT:
+                raise ValueError(f'Cannot sum non int key {agg.key}')
+        for key in self.group_by:
+            if key not in self.key_types:
+                raise ValueError(f'Unknown group by key {key}')
+        # { group: [ value per aggregation ] }
+        self.groups: dict[tuple, list[Any]] = {}
+
+    @property
+    def value_keys(self) -> list[str]:
+        return list(dict.fromkeys(agg.key for agg in self.aggregations if agg.key is not None))
+
+    @property
+    def keys(self) -> list[str]:
+        return list(dict.fromkeys(self.group_by + self.value_keys))
+
+    def _merge_group(self, group: tuple, values: list[Any]) -> None:
+        current = self.groups.get(group)
+        if current is None:
+            self.groups[group] = values
+            return
+        for i, agg in enumerate(self.aggregations):
+            current[i] = _merge(agg.func, current[i], values[i])
+
+    def _is_numeric(self, key: str) -> bool:
+        return self.key_types[key] == types.DbType.INT
+
+    @staticmethod
+    def _pack(column: list[int], size: int) -> tuple[Any, bool] | None:
+        # ( int64 values, sum fits int64 ), None if values do not fit and python ints are used
+        low, high = min(column), max(column)
+        if low < INT_MIN or high > INT_MAX:
+            return None
+        return np.asarray(column, dtype=np.int64), max(-low, high) * size <= INT_MAX
+
+    def add_block(self, columns: dict[str, list], size: int) -> None:
+        if size == 0:
+            return
+        if not self.group_by:
+            self._merge_group((), self._block_totals(columns, size))
+        elif self.use_numpy:
+            self._add_block_grouped_numpy(columns, size)
+        else:
+            self._add_block_grouped(columns, size)
+
+    def _block_totals(self, columns: dict[str, list], size: int) -> list[Any]:
+        values = []
+        packed = {}
+        for agg in self.aggregations:
+            if agg.func == AggFunc.COUNT:
+                values.append(size)
+                continue
+            column = columns[agg.key]
+            if self.use_numpy and self._is_numeric(agg.key) and agg.key not in packed:
+                packed[agg.key] = self._pack(column, size)
+            vector = packed.get(agg.key)
+            if agg.func == AggFunc.SUM:
+                # int64 sum could wrap around, python ints are summed then
+                values.append(int(vector[0].sum()) if vector is not None and vector[1] else sum(column))
+            elif agg.func == AggFunc.MIN:
+                values.append(int(vector[0].min()) if vector is not None else min(column))
+            else:
+                values.append(int(vector[0].max()) if vector is not None else max(column))
+        return values
+
+    def _add_block_grouped(self, columns: dict[str, list], size: int) -> None:
+        group_columns = [columns[key] for key in self.group_by]
+        value_columns = [columns[agg.key] if agg.key is not None else None for agg in self.aggregations]
+        partial: dict[tuple, list[Any]] = {}
+        for i in range(size):
+            group = tuple(column[i] for column in group_columns)
+            state = partial.get(group)
+            if state is None:
+                partial[group] = [
+                    1 if agg.func == AggFunc.COUNT else value_columns[j][i]
+                    for j, agg in enumerate(self.aggregations)
+                ]
+                continue
+            for j, agg in enumerate(self.aggregations):
+                if agg.func == AggFunc.COUNT:
+                    state[j] += 1
+                else:
+                    state[j] = _merge(agg.func, state[j], value_columns[j][i])
+        for group, values in partial.items():
+            self._merge_group(group, values)
+
+    def _add_block_grouped_numpy(self, columns: dict[str, list], size: int) -> None:
+        uniques = []
+        codes = np.zeros(size, dtype=np.int64)
+        for key in self.group_by:
+            unique, inverse = np.unique(np.asarray(columns[key]), return_inverse=True)
+            uniques.append(unique.tolist())
+            codes = codes * len(unique) + inverse.reshape(-1)
+        group_codes, inverse = np.unique(codes, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        groups_size = len(group_codes)
+
+        results = []
+        packed = {}
+        for agg in self.aggregations:
+            if agg.func == AggFunc.COUNT:
+                results.append(np.bincount(inverse, minlength=groups_size).tolist())
+                continue
+            if self._is_numeric(agg.key) and agg.key not in packed:
+                packed[agg.key] = self._pack(columns[agg.key], size)
+            vector = packed.get(agg.key)
+            if vector is None or agg.func == AggFunc.SUM and not vector[1]:
+                results.append(self._reduce_groups_python(agg.func, columns[agg.key], inverse, groups_size))
+                continue
+            values = vector[0]
+            if agg.func == AggFunc.SUM:
+                acc = np.zeros(groups_size, dtype=np.int64)
+                np.add.at(acc, inverse, values)
+            elif agg.func == AggFunc.MIN:
+                acc = np.full(groups_size, np.iinfo(np.int64).max, dtype=np.int64)
+                np.minimum.at(acc, inverse, values)
+            else:
+                acc = np.full(groups_size, np.iinfo(np.int64).min, dtype=np.int64)
+                np.maximum.at(acc, inverse, values)
+            results.append(acc.tolist())
+
+        for g, code in enumerate(group_codes.tolist()):
+            group = []
+            for unique in reversed(uniques):
+                code, part = divmod(code, len(unique))
+                group.append(unique[part])
+            self._merge_group(tuple(reversed(group)), [result[g] for result in results])
+
+    @staticmethod
+    def _reduce_groups_python(func: AggFunc, column: list, inverse, groups_size: int) -> list[Any]:
+        acc = [None] * groups_size
+        for g, value in zip(inverse.tolist(), column):
+            acc[g] = _merge(func, acc[g], value)
+        return acc
+
+    def result(self) -> list[dict]:
+        if not self.group_by and not self.groups:
+            self.groups[()] = [0 if agg.func in (AggFunc.COUNT, AggFunc.SUM) else None for agg in self.aggregations]
+        return [
+            {
+                **dict(zip(self.group_by, group)),
+                **{agg.name: value for agg, value in zip(self.aggregations, values)},
+            }
+            for group, values in sorted(self.groups.items(), key=lambda it: it[0])
+        ]
@@ -0,0 +1,86 @@
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable
+
+from . import types
+from .stats import QueryStats
+
+# approximate memory of cached row besides its values
+_ROW_OVERHEAD = 120
+_VALUE_OVERHEAD = 50
+
+# [ (row ref, position in table, row data), ... ]
+CachedRows = list[tuple[int, int, dict]]
+
+
+def estimate_size(data: dict) -> int:
+    return _ROW_OVERHEAD + sum(_VALUE_OVERHEAD + len(str(value)) for value in data.values())
+
+
+def normalize_filter(filter_: types.Filter) -> str:
+    # equal filters written differently share one cache entry: order of keys and alternatives
+    # and repeated values do not change the result
+    parts = filter_ if isinstance(filter_, list) else [filter_]
+    normalized = []
+    for part in parts:
+        normalized_part = {}
+        for key, value in part.items():
+            values = sorted(set(value)) if isinstance(value, list) else [value]
+            normalized_part[key] = values[0] if len(values) == 1 else values
+        normalized.append(normalized_part)
+    return json.dumps(sorted(normalized, key=str), sort_keys=True, default=str)
+
+
+@dataclass
+class CachedResult:
+    version: int
+    rows: CachedRows
+    size: int
+
+
+@dataclass
+class ResultCache:
+    # LRU of complete query results within memory budget in bytes,
+    # result is valid while version of its table is the same
+    budget: int
+    stats: QueryStats = field(default_factory=QueryStats)
+    entries: OrderedDict[Hashable, CachedResult] = field(default_factory=OrderedDict)
+    size: int = 0
+
+    def get(self, key: Hashable, version: int) -> CachedRows | None:
+        result = self.entries.get(key)
+        if result is not None and result.version != version:
+            self._remove(key)
+            result = None
+        if result is None:
+            self.stats.result_misses += 1
+            return None
+        self.stats.result_hits += 1
+        self.entries.move_to_end(key)
+        return result.rows
+
+    def put(self, key: Hashable, version: int, rows: CachedRows, size: int) -> None:
+        if key in self.entries:
+            self._remove(key)
+        if size > self.budget:
+            return
+        self.entries[key] = CachedResult(version, rows, size)
+        self.size += size
+        self._evict()
+
+    def resize(self, budget: int) -> None:
+        self.budget = budget
+        self._evict()
+
+    def _evict(self) -> None:
+        # least recently used results first
+        while self.size > self.budget:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        self.size -= self.entries.pop(key).size
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
@@ -0,0 +1,83 @@
+import glob
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+
+from . import types
+
+CHANGE_LOG_SUFFIX = '.changelog'
+# copy of database files made when the log is started, replicas replay the log on top of it
+BASE_SUFFIX = '.changelog.base'
+
+
+class ChangeOp(types.StrEnum):
+    CREATE_TABLE = 'create_table'
+    OVERRIDE_TABLE = 'override_table'
+    INSERT_ROW = 'insert_row'
+    INSERT_ROWS = 'insert_rows'
+    UPDATE_ROW = 'update_row'
+
+
+def _data_files(db_file: str) -> list[str]:
+    # main file and files of column and lsm tables, indexes and zone maps are rebuilt by replicas
+    patterns = ['.t*.c*', '.t*.r*', '.t*.lsm.json', '.t*.wal']
+    return [db_file] + sorted(path for it in patterns for path in glob.glob(f'{glob.escape(db_file)}{it}'))
+
+
+@dataclass
+class ChangeLog:
+    # append only json lines file of writes, position of entry is its byte offset
+    path: str
+
+    @staticmethod
+    def exists(db_file: str) -> bool:
+        return os.path.exists(f'{db_file}{CHANGE_LOG_SUFFIX}')
+
+    @classmethod
+    def start(cls, db_file: str, tables: list[types.MetaTable]) -> 'ChangeLog':
+        partitioned = [table.name for table in tables if table.partitions]
+        if partitioned:
+            # rows of partitions are written to their own files without log entries
+            raise ValueError(f'Change log does not support partitioned tables {partitioned}')
+        change_log = cls(f'{db_file}{CHANGE_LOG_SUFFIX}')
+        if not os.path.exists(change_log.path):
+            base_dir = f'{db_file}{BASE_SUFFIX}'
+            shutil.rmtree(base_dir, ignore_errors=True)
+            os.makedirs(base_dir)
+            for path in _data_files(db_file):
+                shutil.copyfile(path, os.path.join(base_dir, os.path.basename(path)))
+            with open(change_log.path, 'wb'):
+                pass
+        return change_log
+
+    @staticmethod
+    def copy_base(primary_db_file: str, db_file: str) -> None:
+        base_dir = f'{primary_db_file}{BASE_SUFFIX}'
+        if not os.path.isdir(base_dir):
+            raise ValueError(f'Database {primary_db_file} does not have change log')
+        prefix = os.path.basename(primary_db_file)
+        for name in os.listdir(base_dir):
+            shutil.copyfile(os.path.join(base_dir, name), f'{db_file}{name[len(prefix):]}')
+
+    def append(self, op: ChangeOp, payload: dict) -> None:
+        entry = json.dumps({'op': op, 'time': time.time(), **payload}, default=str)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(entry + '\n')
+
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def read(self, position: int, limit: int = 0) -> list[tuple[int, dict]]:
+        # [ (position after entry, entry), ... ], last line is skipped until it is written completely
+        entries: list[tuple[int, dict]] = []
+        with open(self.path, 'rb') as f:
+            f.seek(position)
+            while not limit or len(entries) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break
+                position += len(line)
+                entries.append((position, json.loads(line)))
+        return entries
@@ -0,0 +1,150 @@
+import os
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Generator
+
+from . import types
+from .stats import QueryStats
+
+INT_TYPECODE = 'q'
+OFFSET_TYPECODE = 'Q'
+ITEM_SIZE = 8
+# range of values of int columns
+INT_MIN = -(1 << 63)
+INT_MAX = (1 << 63) - 1
+
+
+@dataclass
+class ColumnStore:
+    base_path: str
+    keys: dict[str, types.DbType]
+    stats: QueryStats = field(default_factory=QueryStats)
+
+    def __post_init__(self):
+        self._checked = False
+        self._files = {
+            key: f'{self.base_path}.c{i}'
+            for i, key in enumerate(self.keys)
+        }
+
+    def _data_path(self, key: str) -> str:
+        return self._files[key]
+
+    def _offsets_path(self, key: str) -> str:
+        return f'{self._files[key]}.off'
+
+    def _paths(self, key: str) -> list[str]:
+        if self.keys[key] == types.DbType.INT:
+            return [self._data_path(key)]
+        return [self._data_path(key), self._offsets_path(key)]
+
+    def _open(self, path: str, mode: str):
+        self.stats.file_opens += 1
+        return open(path, mode)
+
+    def _read_range(self, path: str, start: int, size: int) -> bytes:
+        if size <= 0:
+            return b''
+        with self._open(path, 'rb') as f:
+            self.stats.seeks += 1
+            f.seek(start)
+            data = f.read(size)
+        self.stats.bytes_read += len(data)
+        return data
+
+    def _append(self, path: str, data: bytes) -> None:
+        with self._open(path, 'ab') as f:
+            f.write(data)
+        self.stats.bytes_written += len(data)
+
+    @staticmethod
+    def _size(path: str) -> int:
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _str_end_offsets(self, key: str, start: int, stop: int) -> array:
+        offsets = array(OFFSET_TYPECODE)
+        offsets.frombytes(self._read_range(self._offsets_path(key), start * ITEM_SIZE, (stop - start) * ITEM_SIZE))
+        return offsets
+
+    def truncate(self, rows_count: int) -> None:
+        # drop values of rows which were appended but not committed to table heads
+        for key, type_v in self.keys.items():
+            if type_v == types.DbType.INT:
+                sizes = {self._data_path(key): rows_count * ITEM_SIZE}
+            else:
+                end = self._str_end_offsets(key, rows_count - 1, rows_count)[0] if rows_count else 0
+                sizes = {self._offsets_path(key): rows_count * ITEM_SIZE, self._data_path(key): end}
+            for path, size in sizes.items():
+                if self._size(path) > size:
+                    os.truncate(path, size)
+        self._checked = True
+
+    def append(self, rows_data: list[dict], rows_count: int) -> None:
+        if not self._checked:
+            self.truncate(rows_count)
+        # all columns are packed before the first write, so a bad value does not leave other columns longer
+        packed: list[tuple[str, bytes]] = []
+        for key, type_v in self.keys.items():
+            if type_v == types.DbType.INT:
+                packed.append((self._data_path(key), array(INT_TYPECODE, [it[key] for it in rows_data]).tobytes()))
+                continue
+            end = self._str_end_offsets(key, rows_count - 1, rows_count)[0] if rows_count else 0
+            encoded = [it[key].encode('utf-8') for it in rows_data]
+            ends = array(OFFSET_TYPECODE)
+            for value in encoded:
+                end += len(value)
+                ends.append(end)
+            packed.append((self._data_path(key), b''.join(encoded)))
+            packed.append((self._offsets_path(key), ends.tobytes()))
+        try:
+            for path, data in packed:
+                self._append(path, data)
+        except BaseException:
+            self.truncate(rows_count)
+            raise
+
+    def read_column(self, key: str, start: int, stop: int) -> list[Any]:
+        if stop <= start:
+            return []
+        if self.keys[key] == types.DbType.INT:
+            values = array(INT_TYPECODE)
+            values.frombytes(self._read_range(self._data_path(key), start * ITEM_SIZE, (stop - start) * ITEM_SIZE))
+            return values.tolist()
+        if start:
+            ends = self._str_end_offsets(key, start - 1, stop)
+            begin = ends[0]
+            ends = ends[1:]
+        else:
+            ends = self._str_end_offsets(key, start, stop)
+            begin = 0
+        data = self._read_range(self._data_path(key), begin, ends[-1] - begin)
+        values = []
+        prev = 0
+        for end in ends:
+            end -= begin
+            values.append(data[prev:end].decode('utf-8'))
+            prev = end
+        return values
+
+    def read_columns(self, keys: list[str], start: int, stop: int) -> dict[str, list[Any]]:
+        return {key: self.read_column(key, start, stop) for key in keys}
+
+    def read_row(self, position: int) -> dict:
+        return {key: self.read_column(key, position, position + 1)[0] for key in self.keys}
+
+    def iter_blocks(
+        self,
+        keys: list[str],
+        start: int,
+        stop: int,
+        block_size: int,
+    ) -> Generator[tuple[int, int, dict[str, list[Any]]], None, None]:
+        for block_start in range(start, stop, block_size):
+            block_stop = min(block_start + block_size, stop)
+            yield block_start, block_stop, self.read_columns(keys, block_start, block_stop)
+
+    def remove(self) -> None:
+        for key in self.keys:
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
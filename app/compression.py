@@ -0,0 +1,63 @@
+import lzma
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+from . import types
+from .stats import QueryStats
+
+
+def compress(codec: types.Compression, data: bytes, level: int | None = None) -> bytes:
+    if codec == types.Compression.ZLIB:
+        return zlib.compress(data, -1 if level is None else level)
+    return lzma.compress(data, preset=level)
+
+
+def decompress(codec: types.Compression, data: bytes) -> bytes:
+    if codec == types.Compression.ZLIB:
+        return zlib.decompress(data)
+    return lzma.decompress(data)
+
+
+def validate_level(codec: types.Compression, level: int | None) -> None:
+    if level is None:
+        return
+    if codec == types.Compression.ZLIB and not -1 <= level <= 9:
+        raise ValueError('zlib compression level must be in range -1..9')
+    if codec == types.Compression.LZMA and not 0 <= level <= 9:
+        raise ValueError('lzma compression level must be in range 0..9')
+
+
+@dataclass
+class BlockCache:
+    capacity: int
+    stats: QueryStats = field(default_factory=QueryStats)
+    # { block_offset: [ row data, ... ] }
+    blocks: OrderedDict[int, list[Any]] = field(default_factory=OrderedDict)
+
+    def __post_init__(self):
+        # shared by scans of index build threads
+        self.lock = threading.Lock()
+
+    def get(self, offset: int) -> list[Any] | None:
+        with self.lock:
+            rows = self.blocks.get(offset)
+            if rows is None:
+                self.stats.cache_misses += 1
+                return None
+            self.stats.cache_hits += 1
+            self.blocks.move_to_end(offset)
+            return rows
+
+    def put(self, offset: int, rows: list[Any]) -> None:
+        with self.lock:
+            self.blocks[offset] = rows
+            self.blocks.move_to_end(offset)
+            while len(self.blocks) > self.capacity:
+                self.blocks.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.blocks.clear()
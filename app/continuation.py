@@ -0,0 +1,75 @@
+import base64
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from typing import Callable, Generic, Iterator, TypeVar
+
+from . import types
+
+T = TypeVar('T')
+
+
+def row_digest(data: dict) -> str:
+    return hashlib.md5(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def query_fingerprint(table_name: str, filter_: types.Filter) -> str:
+    query = json.dumps({'table': table_name, 'filter': filter_}, sort_keys=True, default=str)
+    return hashlib.md5(query.encode('utf-8')).hexdigest()[:16]
+
+
+@dataclass
+class Continuation:
+    table_id: int
+    # last returned row, its position in table order and data digest to check that row did not change
+    ref: int
+    position: int
+    digest: str
+    fingerprint: str
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(json.dumps(asdict(self)).encode('utf-8')).decode('utf-8').rstrip('=')
+
+    @classmethod
+    def decode(cls, token: str) -> 'Continuation':
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            return cls(**data)
+        except Exception:
+            raise ValueError(f'Incorrect continuation token {token}')
+
+
+class ResumableIterator(Generic[T]):
+    # query rows iterator which keeps continuation token of the last returned row
+    def __init__(
+        self,
+        rows: Iterator[tuple[int, int, types.RowRecord]],
+        table_id: int,
+        # None for queries which cannot be resumed
+        fingerprint: str | None,
+        convert: Callable[[types.RowRecord], T],
+    ):
+        self._rows = rows
+        self._table_id = table_id
+        self._fingerprint = fingerprint
+        self._convert = convert
+        self._last: tuple[int, int, dict] | None = None
+
+    def __iter__(self) -> 'ResumableIterator[T]':
+        return self
+
+    def __next__(self) -> T:
+        ref, position, meta_row = next(self._rows)
+        self._last = (ref, position, meta_row.data)
+        return self._convert(meta_row)
+
+    @property
+    def token(self) -> str | None:
+        if self._last is None or self._fingerprint is None:
+            return None
+        ref, position, data = self._last
+        return Continuation(self._table_id, ref, position, row_digest(data), self._fingerprint).encode()
+
+    def close(self) -> None:
+        if hasattr(self._rows, 'close'):
+            self._rows.close()
@@ -1,40 +1,118 @@
+import functools
+import json
 import os
 import pathlib
+import struct
+import threading
+import time
 import traceback
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from io import BufferedRandom, BufferedReader
-from typing import Any, Type, TypeVar
+from itertools import islice
+from typing import Any, Callable, Generator, Type, TypeVar
 
 from pydantic import BaseModel
 
 from . import exc, types
+from .changelog import ChangeLog, ChangeOp
+from .columnar import INT_MAX, INT_MIN, ColumnStore
+from .compression import BlockCache, compress, decompress
+from .lsm import LsmStore
+from .mvcc import ScanPosition, Snapshot, VersionStore
+from .prefetch import RecordPrefetcher
+from .stats import QueryStats
+from .zonemap import TableZones
 
 T = TypeVar('T', bound=BaseModel)
+# table, [ (old_ref, new_ref, data), ... ]
+RowMoveHook = Callable[[types.MetaTable, list[tuple[int, int, dict]]], None]
+
+
+def _log_change(op: ChangeOp, payload: Callable[..., dict]):
+    # only outermost writes are logged, nested writes are repeated when the entry is replayed
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self: 'DatabaseCursor', *args, **kwargs):
+            entry = payload(*args, **kwargs) if self.change_log is not None and not self._change_depth else None
+            self._change_depth += 1
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                self._change_depth -= 1
+            if entry is not None:
+                self.change_log.append(op, entry)
+            return result
+        return wrapper
+    return decorator
 
 
 @dataclass
 class DatabaseCursor:
     db_file: str
+    stats: QueryStats = field(default_factory=QueryStats)
+    # cursor of fan out workers reads rows written by another process and does not use zone maps
+    read_only: bool = False
     _DB_PREFIX: str = "key-values-database"
     _INT_SIZE: int = 64
     _META_BUFFER_SIZE: int = 512
+    _HEADS_INITIAL_CAPACITY: int = 16
+    _ZONE_BLOCK_SIZE: int = 1024
+    _COMPRESSED_BLOCK_ROWS: int = 256
+    _BLOCK_CACHE_SIZE: int = 32
+    # refs of rows inside compressed block are negative: -((block_offset << bits) | slot) - 1
+    _BLOCK_SLOT_BITS: int = 9
+    # json digits of the largest offset, next_row_offset of staged row grows from 0 when the next row is linked
+    _OFFSET_DIGITS: int = len(str(2 ** 64 - 1))
+    # rows of batched reads closer than the gap are read with one request
+    _COALESCE_GAP: int = 64 * 1024
+    _COALESCE_ROWS: int = 128
+    # rows of lsm table memtable before it is flushed to sorted run, runs count which starts compaction
+    _LSM_MEMTABLE_ROWS: int = 4096
+    _LSM_COMPACTION_RUNS: int = 4
+    # first_row_offset, last_row_offset, rows_count
+    _HEADS_STRUCT = struct.Struct('>QQQ')
 
     def __post_init__(self):
         self._DB_PREFIX_SIZE = len(self._DB_PREFIX.encode("utf-8"))
         self.db_file_path = pathlib.Path(self.db_file)
         if not self.db_file_path.parent.exists():
             os.makedirs(str(self.db_file_path.parent))
+        self.tables: dict[str, tuple[types.MetaTable, int]] = dict()
+        self.tables_by_id: dict[int, types.MetaTable] = dict()
+        self._persisted_schemas: dict[int, dict] = dict()
+        self.column_stores: dict[int, ColumnStore] = dict()
+        self.lsm_stores: dict[int, LsmStore] = dict()
+        self.zone_maps: dict[int, TableZones] = dict()
+        # saved zone maps file is removed on the first write after load or save, it is stale after crash
+        self._zone_maps_dirty = True
+        self.block_cache = BlockCache(self._BLOCK_CACHE_SIZE, self.stats)
+        # { table_id: [ (offset, data), ... ] } rows of compressed tables not packed into block yet
+        self._open_rows: dict[int, list[tuple[int, dict]]] = dict()
+        self.row_move_hooks: list[RowMoveHook] = []
+        # taken by writes and by background index builds between chunks of rows
+        self.lock = threading.RLock()
+        # writes are appended to change log for replicas when it is started
+        self.change_log: ChangeLog | None = None
+        self._change_depth = 0
         if not self.db_file_path.exists():
+            if self.read_only:
+                raise ValueError(f'Database {self.db_file} does not exist')
             with open(self.db_file_path, "wb"):
                 pass
             self.db_meta = types.MetaDB(created=datetime.now(), updated=datetime.now())
             self.write_db_meta(self.db_meta)
+            self._create_catalog()
         else:
             self.db_meta = self.read_db_meta()
+            if not self.db_meta.has_catalog():
+                self._migrate_legacy_tables()
 
-        self.tables = dict()
+        self.versions = VersionStore(commit_seq=self.db_meta.commit_seq)
         self.update_all_tables_dict()
+        if not self.read_only:
+            self.load_lsm_stores()
+            self.load_zone_maps()
 
     def _encode_str(self, s: str) -> bytes:
         return s.encode("utf-8")
@@ -42,55 +120,83 @@ class DatabaseCursor:
     def _decode_str(self, s: bytes) -> str:
         return s.decode("utf-8")
 
-    def _encode_meta(self, meta: BaseModel) -> tuple[bytes, int]:
+    def _encode_meta(self, meta: BaseModel | types.RowRecord) -> tuple[bytes, int]:
         b = self._encode_str(meta.json())
         return b, len(b)
 
     def _decode_meta(self, s: bytes, cls: Type[T]) -> T:
-        return cls.parse_raw(self._decode_str(s))
+        start = time.perf_counter()
+        meta = cls.parse_raw(self._decode_str(s))
+        self.stats.decode_time += time.perf_counter() - start
+        self.stats.records_decoded += 1
+        return meta
+
+    def _open(self, mode: str) -> BufferedRandom | BufferedReader:
+        self.stats.file_opens += 1
+        if mode != 'rb' and not self._zone_maps_dirty:
+            self._mark_zone_maps_dirty()
+        return open(self.db_file_path, mode)
+
+    def _seek(self, f: BufferedReader | BufferedRandom, offset: int) -> None:
+        self.stats.seeks += 1
+        f.seek(offset)
+
+    def _read(self, f: BufferedReader | BufferedRandom, size: int) -> bytes:
+        data = f.read(size)
+        self.stats.bytes_read += len(data)
+        return data
+
+    def _write(self, f: BufferedRandom, data: bytes) -> None:
+        self.stats.bytes_written += len(data)
+        f.write(data)
 
     def _read_meta_size(self, f: BufferedReader | BufferedRandom) -> int:
-        return int.from_bytes(f.read(self._INT_SIZE), byteorder="big", signed=False)
+        return int.from_bytes(self._read(f, self._INT_SIZE), byteorder="big", signed=False)
 
     def _write_meta_size(self, f: BufferedRandom, size: int) -> None:
-        f.write(size.to_bytes(self._INT_SIZE, byteorder="big", signed=False))
+        self._write(f, size.to_bytes(self._INT_SIZE, byteorder="big", signed=False))
 
     def _write_buffer(self, f: BufferedRandom) -> None:
-        f.write(b'\x00' * self._META_BUFFER_SIZE)
+        self._write(f, b'\x00' * self._META_BUFFER_SIZE)
+
+    def _pack_meta(self, meta: BaseModel | types.RowRecord) -> bytes:
+        meta_bytes, meta_size = self._encode_meta(meta)
+        record = meta_size.to_bytes(self._INT_SIZE, byteorder="big", signed=False) + meta_bytes
+        return record.ljust(self._META_BUFFER_SIZE, b'\x00')
 
     def _get_current_offset(self) -> int:
         return os.path.getsize(self.db_file_path)
 
     def _write_meta(
         self,
-        meta: BaseModel,
+        meta: BaseModel | types.RowRecord,
         offset: int = 0,
         file: BufferedRandom | None = None,
         use_buffer: bool = False
     ) -> None:
-        f = file or open(self.db_file_path, "r+b")
-        f.seek(offset)
+        f = file or self._open("r+b")
+        self._seek(f, offset)
         meta_bytes, meta_size = self._encode_meta(meta)
         if use_buffer:
             self._write_buffer(f)
-            f.seek(offset)
+            self._seek(f, offset)
         self._write_meta_size(f, meta_size)
-        f.write(meta_bytes)
+        self._write(f, meta_bytes)
         if not file:
             f.close()
 
     def _read_meta(self, meta_cls: Type[T], offset: int = 0, file: BufferedReader | None = None) -> T:
-        f = file or open(self.db_file_path, "rb")
-        f.seek(offset)
-        data = self._decode_meta(f.read(self._read_meta_size(f)), meta_cls)
+        f = file or self._open("rb")
+        self._seek(f, offset)
+        data = self._decode_meta(self._read(f, self._read_meta_size(f)), meta_cls)
         if not file:
             f.close()
         return data
 
     def read_db_meta(self) -> types.MetaDB:
-        with open(self.db_file_path, "rb") as f:
+        with self._open("rb") as f:
             try:
-                prefix = self._decode_str(f.read(self._DB_PREFIX_SIZE))
+                prefix = self._decode_str(self._read(f, self._DB_PREFIX_SIZE))
                 if prefix != self._DB_PREFIX:
                     raise exc.IncorrectDatabase()
                 return self._read_meta(types.MetaDB, offset=self._DB_PREFIX_SIZE, file=f)
@@ -98,117 +204,336 @@ class DatabaseCursor:
                 raise exc.IncorrectDatabase()
 
     def write_db_meta(self, meta: types.MetaDB) -> None:
-        with open(self.db_file_path, "r+b") as f:
-            f.write(self._encode_str(self._DB_PREFIX))
+        with self._open("r+b") as f:
+            self._write(f, self._encode_str(self._DB_PREFIX))
             self._write_meta(meta, offset=self._DB_PREFIX_SIZE, file=f, use_buffer=True)
 
     def update_db_meta(self, meta: types.MetaDB) -> None:
         self.write_db_meta(meta)
         self.db_meta = self.read_db_meta()
 
-    def read_table_meta(self, offset: int) -> types.MetaTable:
-        return self._read_meta(types.MetaTable, offset=offset)
+    def _heads_position(self, table_id: int) -> int:
+        return (table_id - 1) * self._HEADS_STRUCT.size
 
-    def read_all_tables(self) -> list[tuple[types.MetaTable, int]]:
+    def _create_catalog(self) -> None:
+        self.catalog = types.MetaCatalog()
+        self._grow_heads()
+        self._write_catalog()
+
+    def _grow_heads(self) -> None:
+        capacity = max(self._HEADS_INITIAL_CAPACITY, self.catalog.heads_capacity * 2)
+        heads = b''
+        if self.catalog.heads_capacity:
+            with self._open("rb") as f:
+                self._seek(f, self.catalog.heads_offset)
+                heads = self._read(f, self.catalog.heads_capacity * self._HEADS_STRUCT.size)
+        offset = self._get_current_offset()
+        with self._open("r+b") as f:
+            self._seek(f, offset)
+            self._write(f, heads.ljust(capacity * self._HEADS_STRUCT.size, b'\x00'))
+        self.catalog.heads_offset = offset
+        self.catalog.heads_capacity = capacity
+
+    def _write_table_heads(self, table: types.MetaTable) -> None:
+        with self._open("r+b") as f:
+            self._seek(f, self.catalog.heads_offset + self._heads_position(table.id))
+            self._write(f, self._HEADS_STRUCT.pack(table.first_row_offset, table.last_row_offset, table.rows_count))
+
+    @staticmethod
+    def _table_schema(table: types.MetaTable) -> dict:
+        return table.dict(exclude=types.TABLE_HEADS_FIELDS)
+
+    def _write_catalog(self) -> None:
+        self.catalog.tables = sorted(self.tables_by_id.values(), key=lambda it: it.id)
+        catalog_bytes = self._encode_str(
+            self.catalog.json(exclude={'tables': {'__all__': types.TABLE_HEADS_FIELDS}})
+        )
+        offset = self._get_current_offset()
+        with self._open("r+b") as f:
+            self._seek(f, offset)
+            self._write_meta_size(f, len(catalog_bytes))
+            self._write(f, catalog_bytes)
+        self._persisted_schemas = {
+            table.id: self._table_schema(table)
+            for table in self.catalog.tables
+        }
+        updated = self.db_meta.copy()
+        updated.catalog_offset = offset
+        updated.first_table_offset = 0
+        updated.updated = datetime.now()
+        self.update_db_meta(updated)
+
+    def _migrate_legacy_tables(self) -> None:
+        legacy_tables = []
         offset = self.db_meta.first_table_offset
-        results = []
         while offset:
-            table = self.read_table_meta(offset)
-            results.append((table, offset))
-            offset = table.next_table_offset
-        return results
+            legacy_table = self._read_meta(types.LegacyMetaTable, offset=offset)
+            legacy_tables.append(legacy_table)
+            offset = legacy_table.next_table_offset
+
+        self.catalog = types.MetaCatalog()
+        self._grow_heads()
+        for legacy_table in legacy_tables:
+            table = types.MetaTable(**legacy_table.dict(include=set(types.MetaTable.__fields__) - {'id'}))
+            offset = table.first_row_offset
+            while offset:
+                table.rows_count += 1
+                offset = self.read_row_meta(offset).next_row_offset
+            self.write_table_meta(table)
+        if not legacy_tables:
+            self._write_catalog()
+
+    def read_catalog(self) -> types.MetaCatalog:
+        with self._open("rb") as f:
+            catalog = self._read_meta(types.MetaCatalog, offset=self.db_meta.catalog_offset, file=f)
+            self._seek(f, catalog.heads_offset)
+            heads = self._read(f, catalog.heads_capacity * self._HEADS_STRUCT.size)
+        for table in catalog.tables:
+            table.first_row_offset, table.last_row_offset, table.rows_count = self._HEADS_STRUCT.unpack_from(
+                heads, self._heads_position(table.id)
+            )
+        return catalog
+
+    def read_all_tables(self) -> list[tuple[types.MetaTable, int]]:
+        return [(table, table.id) for table in self.read_catalog().tables]
 
     def read_all_tables_dict(self) -> dict[str, tuple[types.MetaTable, int]]:
-        return {table.name: (table, offset) for table, offset in self.read_all_tables()}
+        return {table.name: (table, table_id) for table, table_id in self.read_all_tables()}
 
     def update_all_tables_dict(self) -> None:
-        self.tables = self.read_all_tables_dict()
+        self.catalog = self.read_catalog()
+        self.tables = {table.name: (table, table.id) for table in self.catalog.tables}
+        self.tables_by_id = {table.id: table for table in self.catalog.tables}
+        self._persisted_schemas = {
+            table.id: self._table_schema(table)
+            for table in self.catalog.tables
+        }
+
+    def get_all_cached_tables(self) -> list[types.MetaTable]:
+        return sorted(self.tables_by_id.values(), key=lambda it: it.id)
+
+    def _read_record(self, offset: int) -> dict:
+        with self._open("rb") as f:
+            self._seek(f, offset)
+            raw = self._read(f, self._read_meta_size(f))
+        return self._decode_record(raw)
+
+    def _decode_record(self, raw: bytes) -> dict:
+        start = time.perf_counter()
+        record = json.loads(raw)
+        self.stats.decode_time += time.perf_counter() - start
+        self.stats.records_decoded += 1
+        return record
 
-    def read_row_meta(self, offset: int) -> types.MetaRow:
-        return self._read_meta(types.MetaRow, offset=offset)
+    def read_row_meta(self, offset: int) -> types.RowRecord:
+        return types.RowRecord.from_dict(self._read_record(offset))
 
-    def read_next_row_meta(self, row: types.MetaRow) -> types.MetaRow | None:
+    def read_next_row_meta(self, row: types.RowRecord) -> types.RowRecord | None:
         if not row.has_next():
             return None
         return self.read_row_meta(offset=row.next_row_offset)
 
+    def read_chain_item(self, offset: int) -> types.RowRecord | types.MetaBlock:
+        return self._chain_item_from_record(self._read_record(offset))
+
+    @staticmethod
+    def _chain_item_from_record(record: dict) -> types.RowRecord | types.MetaBlock:
+        if 'codec' in record:
+            return types.MetaBlock.parse_obj(record)
+        return types.RowRecord.from_dict(record)
+
+    def _encode_block_ref(self, block_offset: int, slot: int) -> int:
+        return -((block_offset << self._BLOCK_SLOT_BITS) | slot) - 1
+
+    def _decode_block_ref(self, ref: int) -> tuple[int, int]:
+        value = -ref - 1
+        return value >> self._BLOCK_SLOT_BITS, value & ((1 << self._BLOCK_SLOT_BITS) - 1)
+
+    def read_block(
+        self,
+        offset: int,
+        block: types.MetaBlock | None = None,
+        payload: bytes | None = None,
+    ) -> tuple[types.MetaBlock, list[dict]]:
+        if block is None:
+            block = self._read_meta(types.MetaBlock, offset=offset)
+        rows_data = self.block_cache.get(offset)
+        if rows_data is None:
+            if payload is None:
+                with self._open("rb") as f:
+                    self._seek(f, offset + self._META_BUFFER_SIZE)
+                    payload = self._read(f, block.payload_size)
+            start = time.perf_counter()
+            rows_data = json.loads(decompress(block.codec, payload))
+            self.stats.decode_time += time.perf_counter() - start
+            self.block_cache.put(offset, rows_data)
+        return block, rows_data
+
+    def _write_block(self, table: types.MetaTable, rows_data: list[dict], prev_offset: int) -> int:
+        payload = compress(table.compression, self._encode_str(json.dumps(rows_data)), table.compression_level)
+        block = types.MetaBlock(
+            codec=table.compression,
+            count=len(rows_data),
+            payload_size=len(payload),
+            prev_row_offset=prev_offset,
+        )
+        offset = self._get_current_offset()
+        with self._open("r+b") as f:
+            self._seek(f, offset)
+            self._write(f, self._pack_meta(block) + payload)
+        self.block_cache.put(offset, rows_data)
+        if prev_offset:
+            self._set_chain_next(table.name, prev_offset, offset)
+        return offset
+
+    def _set_chain_next(self, table_name: str, offset: int, next_offset: int) -> None:
+        item = self.read_chain_item(offset)
+        item.next_row_offset = next_offset
+        if isinstance(item, types.MetaBlock):
+            # block header is padded, payload starts after the buffer
+            self._write_meta(item, offset, use_buffer=True)
+        else:
+            self.override_row_meta(table_name, item, offset)
+
+    def _set_chain_prev(self, table_name: str, offset: int, prev_offset: int) -> None:
+        item = self.read_chain_item(offset)
+        item.prev_row_offset = prev_offset
+        if isinstance(item, types.MetaBlock):
+            self._write_meta(item, offset, use_buffer=True)
+        else:
+            self.override_row_meta(table_name, item, offset)
+
+    def _move_rows(self, table: types.MetaTable, moves: list[tuple[int, int, dict]]) -> None:
+        moves_dict = {old_ref: new_ref for old_ref, new_ref, _ in moves}
+        if zones := self.zone_maps.get(table.id):
+            zones.relocate(moves_dict)
+        self.versions.move(table.id, moves_dict)
+        for hook in self.row_move_hooks:
+            hook(table, moves)
+
+    def begin_snapshot(self) -> Snapshot:
+        return self.versions.begin()
+
+    def release_snapshot(self, snapshot: Snapshot) -> None:
+        self.versions.release(snapshot)
+
+    def save_commit_seq(self) -> None:
+        if self.db_meta.commit_seq == self.versions.commit_seq:
+            return
+        updated = self.db_meta.copy()
+        updated.commit_seq = self.versions.commit_seq
+        self.update_db_meta(updated)
+
     def get_table_by_name(self, table_name: str) -> types.MetaTable:
         try:
             return self.tables[table_name][0]
         except KeyError:
             raise ValueError('Table not found')
 
+    def get_table_by_id(self, table_id: int) -> types.MetaTable:
+        try:
+            return self.tables_by_id[table_id]
+        except KeyError:
+            raise ValueError('Incorrect Table Id')
+
     def has_table(self, name: str) -> bool:
         return name in self.tables
 
-    def update_table_dict(self, table: types.MetaTable, offset: int | None = None) -> None:
-        if not self.has_table(table.name):
-            if not offset:
-                raise ValueError('Table does not cached yet, offset required')
-            self.tables[table.name] = (table, offset)
-        self.tables[table.name] = (table, offset or self.tables[table.name][1])
-
-    def get_cached_table_by_offset(self, offset: int) -> types.MetaTable:
-        for table, t_offset in self.tables.values():
-            if t_offset == offset:
-                return table
-        raise ValueError('Incorrect Table Offset')
+    def update_table_dict(self, table: types.MetaTable, table_id: int | None = None) -> None:
+        table_id = table_id or table.id
+        if not table_id:
+            raise ValueError('Table does not cached yet, id required')
+        old_table = self.tables_by_id.get(table_id)
+        if old_table is not None and old_table.name != table.name:
+            del self.tables[old_table.name]
+        table.id = table_id
+        self.tables[table.name] = (table, table_id)
+        self.tables_by_id[table_id] = table
 
+    @_log_change(ChangeOp.OVERRIDE_TABLE, lambda table, override_table: {
+        'table': json.loads(table.json()), 'name': override_table,
+    })
     def override_table_meta(self, table: types.MetaTable, override_table: str):
-        old_meta, offset = self.tables[override_table]
+        if not self.has_table(override_table):
+            raise ValueError('Table not found')
+        old_meta, table_id = self.tables[override_table]
         if table.name != old_meta.name and self.has_table(table.name):
             raise ValueError('Table name need to be unique')
         if len(table.keys) == 0:
             raise ValueError('Table cannot has empty keys')
-        _, table_meta_size = self._encode_meta(table)
-        if table_meta_size < self._META_BUFFER_SIZE:
-            self._write_meta(table, self.tables[table.name][1], use_buffer=True)
-            self.update_table_dict(table)
-            return
+        self.update_table_dict(table, table_id)
+        if self._table_schema(table) != self._persisted_schemas.get(table_id):
+            self._write_catalog()
+        self._write_table_heads(table)
 
-        offset = self._get_current_offset()
-        self._write_meta(table, offset, use_buffer=True)
-        self.update_table_dict(table, offset)
-        if old_meta.has_prev():
-            prev_table = self.read_table_meta(old_meta.prev_table_offset)
-            updated = prev_table.copy()
-            updated.next_table_offset = offset
-            self.override_table_meta(updated, prev_table.name)
-
-        if old_meta.has_next():
-            next_table = self.read_table_meta(old_meta.next_table_offset)
-            updated = next_table.copy()
-            updated.prev_table_offset = offset
-            self.override_table_meta(updated, next_table.name)
-
-        if not old_meta.has_prev():
-            updated = self.db_meta.copy()
-            updated.first_table_offset = offset
-            self.update_db_meta(updated)
+    def update_table_heads(self, table: types.MetaTable) -> None:
+        if not table.id or self.tables_by_id.get(table.id) is None:
+            raise ValueError('Table not found')
+        self.update_table_dict(table)
+        self._write_table_heads(table)
 
+    @_log_change(ChangeOp.CREATE_TABLE, lambda table: {'table': json.loads(table.json())})
     def write_table_meta(self, table: types.MetaTable):
         if self.has_table(table.name):
             raise ValueError('Table name need to be unique')
         if len(table.keys) == 0:
             raise ValueError('Table cannot have empty keys')
-        offset = self._get_current_offset()
-        self._write_meta(table, offset, use_buffer=True)
-        self.update_table_dict(table, offset)
-
-        if self.db_meta.last_table_offset:
-            last_table = self.get_cached_table_by_offset(self.db_meta.last_table_offset)
-            last_table_updated = last_table.copy()
-            last_table_updated.next_table_offset = offset
-            self.override_table_meta(last_table_updated, last_table.name)
-            updated = self.db_meta.copy()
-            updated.last_table_offset = offset
-            self.update_db_meta(updated)
-
-        if not self.db_meta.first_table_offset:
-            updated = self.db_meta.copy()
-            updated.first_table_offset = offset
-            updated.last_table_offset = offset
-            self.update_db_meta(updated)
+        table_id = self.catalog.next_table_id
+        if table_id > self.catalog.heads_capacity:
+            self._grow_heads()
+        self.catalog.next_table_id += 1
+        self.update_table_dict(table, table_id)
+        self._write_table_heads(table)
+        self._write_catalog()
+        if table.engine == types.TableEngine.ROW and not table.rows_count:
+            self.zone_maps[table_id] = TableZones(self._ZONE_BLOCK_SIZE)
+
+    @property
+    def zone_maps_file(self) -> str:
+        return f'{self.db_file}.zones.json'
+
+    def get_zone_maps(self, table: types.MetaTable) -> TableZones | None:
+        zones = self.zone_maps.get(table.id)
+        if zones is None or zones.rows_count != table.rows_count:
+            return None
+        return zones
+
+    def invalidate_zone_maps(self, table: types.MetaTable) -> None:
+        self.zone_maps.pop(table.id, None)
+
+    def build_zone_maps(self, table: types.MetaTable) -> TableZones:
+        zones = TableZones(self._ZONE_BLOCK_SIZE)
+        for offset, meta_row in self.iter_table_rows(table):
+            zones.add(table.keys, offset, meta_row.data)
+        self.zone_maps[table.id] = zones
+        return zones
+
+    def _mark_zone_maps_dirty(self) -> None:
+        if os.path.exists(self.zone_maps_file):
+            os.remove(self.zone_maps_file)
+        self._zone_maps_dirty = True
+
+    def save_zone_maps(self) -> None:
+        with open(self.zone_maps_file, 'w') as f:
+            json.dump({table_id: zones.dump() for table_id, zones in self.zone_maps.items()}, f)
+        self._zone_maps_dirty = False
+
+    def load_zone_maps(self) -> None:
+        try:
+            with open(self.zone_maps_file, 'r') as f:
+                saved = json.load(f)
+            self._zone_maps_dirty = False
+        except (OSError, ValueError):
+            saved = {}
+        self.zone_maps = {}
+        for table in self.get_all_cached_tables():
+            if table.engine != types.TableEngine.ROW:
+                continue
+            data = saved.get(str(table.id))
+            if data is not None and data['rows_count'] == table.rows_count:
+                self.zone_maps[table.id] = TableZones.load(data)
+            else:
+                self.build_zone_maps(table)
 
     @staticmethod
     def convert_db_type_value(table: types.MetaTable, key: str, value: Any) -> Any:
@@ -217,7 +542,20 @@ class DatabaseCursor:
         except Exception:
             raise ValueError(f'Value {value} is not compatible with table {table.name} key {key}')
 
-    def preprocess_row_data(self, table: types.MetaTable, row: types.MetaRow) -> types.MetaRow:
+    @staticmethod
+    def _check_column_ints(table: types.MetaTable, data: dict) -> None:
+        # int columns are stored as 64 bit integers
+        if table.engine != types.TableEngine.COLUMN:
+            return
+        for key, type_v in table.keys.items():
+            if type_v == types.DbType.INT and not INT_MIN <= data[key] <= INT_MAX:
+                raise ValueError(f'Value {data[key]} is out of 64 bit range of table {table.name} key {key}')
+
+    def preprocess_row_data(
+        self,
+        table: types.MetaTable,
+        row: types.MetaRow | types.RowRecord,
+    ) -> types.RowRecord:
         if row.data.keys() != table.keys.keys():
             raise ValueError(f'Row data {row.data} is not compatible with table schema {table.keys}')
         try:
@@ -228,14 +566,336 @@ class DatabaseCursor:
         except Exception:
             traceback.print_exc()
             raise ValueError(f'Row data {row.data} is not compatible with table schema {table.keys}')
-        row_copy = row.copy()
-        row_copy.data = data
-        return row_copy
+        self._check_column_ints(table, data)
+        return types.RowRecord(data, row.next_row_offset, row.prev_row_offset)
+
+    def convert_rows_data(self, table: types.MetaTable, rows_data: list[dict]) -> list[types.RowRecord]:
+        converters = [
+            (key, types.DB_TYPES_CONVERTERS[type_v])
+            for key, type_v in table.keys.items()
+        ]
+        rows = []
+        for data in rows_data:
+            if data.keys() != table.keys.keys():
+                raise ValueError(f'Row data {data} is not compatible with table schema {table.keys}')
+            try:
+                converted = {key: converter(data[key]) for key, converter in converters}
+            except Exception:
+                for key, value in data.items():
+                    self.convert_db_type_value(table, key, value)
+                raise
+            self._check_column_ints(table, converted)
+            rows.append(types.RowRecord(data=converted))
+        return rows
+
+    def get_column_store(self, table: types.MetaTable) -> ColumnStore:
+        if table.engine != types.TableEngine.COLUMN:
+            raise ValueError(f'Table {table.name} is not a column table')
+        if table.id not in self.column_stores:
+            self.column_stores[table.id] = ColumnStore(f'{self.db_file}.t{table.id}', table.keys, self.stats)
+        return self.column_stores[table.id]
+
+    def write_column_rows(self, table: types.MetaTable, rows: list[types.RowRecord]) -> list[int]:
+        store = self.get_column_store(table)
+        store.append([row.data for row in rows], table.rows_count)
+        # row ids of column tables are positions starting from 1
+        row_ids = list(range(table.rows_count + 1, table.rows_count + len(rows) + 1))
+        updated_table = table.copy()
+        updated_table.rows_count += len(rows)
+        self.update_table_heads(updated_table)
+        self.versions.record_inserts(table.id, row_ids)
+        return row_ids
+
+    def get_lsm_store(self, table: types.MetaTable) -> LsmStore:
+        if table.engine != types.TableEngine.LSM:
+            raise ValueError(f'Table {table.name} is not a lsm table')
+        if table.id not in self.lsm_stores:
+            self.lsm_stores[table.id] = LsmStore(
+                f'{self.db_file}.t{table.id}', table.primary_key, self.stats,
+                self._LSM_MEMTABLE_ROWS, self._LSM_COMPACTION_RUNS,
+            )
+        return self.lsm_stores[table.id]
+
+    def load_lsm_stores(self) -> None:
+        for table in self.get_all_cached_tables():
+            if table.engine != types.TableEngine.LSM:
+                continue
+            # rows of write ahead log replayed on open are not counted in table heads yet
+            rows_count = self.get_lsm_store(table).rows_count
+            if rows_count != table.rows_count:
+                updated_table = table.copy()
+                updated_table.rows_count = rows_count
+                self.update_table_heads(updated_table)
+
+    def write_lsm_rows(self, table: types.MetaTable, rows: list[types.RowRecord]) -> list[int]:
+        self.get_lsm_store(table).put([row.data for row in rows])
+        # row ids of lsm tables are insert positions, rows are read by primary key or merged scan
+        row_ids = list(range(table.rows_count + 1, table.rows_count + len(rows) + 1))
+        updated_table = table.copy()
+        updated_table.rows_count += len(rows)
+        self.update_table_heads(updated_table)
+        # scans take memtable and runs at start, so inserts do not have undo versions
+        self.versions.record_inserts(table.id, [])
+        return row_ids
+
+    def _start_prefetch(self, start_ref: int, depth: int) -> RecordPrefetcher:
+        self.stats.file_opens += 1
+        return RecordPrefetcher(
+            str(self.db_file_path), start_ref, depth, self._INT_SIZE, self._META_BUFFER_SIZE,
+            lambda offset: offset in self.block_cache.blocks,
+        )
+
+    def _read_prefetched(
+        self,
+        prefetcher: RecordPrefetcher,
+        offset: int,
+    ) -> tuple[types.RowRecord | types.MetaBlock, bytes | None] | None:
+        record = prefetcher.get()
+        if record is None or record.offset != offset:
+            return None
+        self.stats.seeks += 1
+        self.stats.bytes_read += self._INT_SIZE + len(record.raw)
+        if record.payload is not None:
+            self.stats.seeks += 1
+            self.stats.bytes_read += len(record.payload)
+        return self._chain_item_from_record(self._decode_record(record.raw)), record.payload
+
+    def iter_table_rows(
+        self,
+        table: types.MetaTable,
+        start_ref: int | None = None,
+        block_size: int = 4096,
+        snapshot: Snapshot | None = None,
+        # depth of read ahead queue of background reader thread, 0 reads rows in place
+        prefetch: int = 0,
+    ) -> Generator[tuple[int, types.RowRecord], None, None]:
+        if table.engine == types.TableEngine.COLUMN:
+            # column tables are append only, rows count of table meta is consistent snapshot
+            start = start_ref - 1 if start_ref else 0
+            keys = list(table.keys)
+            store = self.get_column_store(table)
+            for block_start, block_stop, columns in store.iter_blocks(keys, start, table.rows_count, block_size):
+                for i in range(block_stop - block_start):
+                    yield block_start + i + 1, types.RowRecord(data={key: columns[key][i] for key in keys})
+            return
+        if table.engine == types.TableEngine.LSM:
+            start = start_ref - 1 if start_ref else 0
+            for i, data in enumerate(islice(self.get_lsm_store(table).iter_rows(), start, None), start):
+                yield i + 1, types.RowRecord(data=data)
+            return
+        position = ScanPosition(table.id, [table.first_row_offset if start_ref is None else start_ref])
+        if snapshot is not None:
+            snapshot.positions.append(position)
+        prefetcher = None
+        # prefetched chain is valid until the next write
+        prefetch_seq = self.versions.commit_seq
+        try:
+            while position.refs[0]:
+                ref = position.refs[0]
+                block = None
+                payload = None
+                prefetched = None
+                if prefetch and ref > 0:
+                    # scan may start inside compressed block, reader starts from the next chain item
+                    prefetcher = self._start_prefetch(ref, prefetch)
+                    prefetch = 0
+                if prefetcher is not None and ref > 0 and self.versions.commit_seq == prefetch_seq:
+                    prefetched = self._read_prefetched(prefetcher, ref)
+                if prefetched is None and prefetcher is not None:
+                    prefetcher.close()
+                    prefetcher = None
+                if ref < 0:
+                    block_offset, slot = self._decode_block_ref(ref)
+                else:
+                    item, payload = prefetched or (self.read_chain_item(ref), None)
+                    if isinstance(item, types.RowRecord):
+                        # next ref is stored before yield, so it is remapped if the row moves meanwhile
+                        position.refs[0] = item.next_row_offset
+                        if snapshot is None:
+                            yield ref, item
+                        elif (data := self.versions.visible_data(snapshot, table.id, ref, item.data)) is not None:
+                            yield ref, item if data is item.data else types.RowRecord(data=data)
+                        continue
+                    block_offset, slot, block = ref, 0, item
+                block, rows_data = self.read_block(block_offset, block, payload)
+                position.refs[0] = block.next_row_offset
+                for i in range(slot, block.count):
+                    ref = self._encode_block_ref(block_offset, i)
+                    data = rows_data[i]
+                    if snapshot is not None:
+                        data = self.versions.visible_data(snapshot, table.id, ref, data)
+                    if data is not None:
+                        yield ref, types.RowRecord(data=data)
+        finally:
+            if prefetcher is not None:
+                prefetcher.close()
+            if snapshot is not None:
+                snapshot.positions.remove(position)
+
+    def iter_table_rows_reverse(
+        self,
+        table: types.MetaTable,
+        block_size: int = 4096,
+        snapshot: Snapshot | None = None,
+    ) -> Generator[tuple[int, types.RowRecord], None, None]:
+        if table.engine == types.TableEngine.LSM:
+            raise ValueError(f'Rows of lsm table {table.name} are read only in order of primary key')
+        if table.engine == types.TableEngine.COLUMN:
+            keys = list(table.keys)
+            store = self.get_column_store(table)
+            for stop in range(table.rows_count, 0, -block_size):
+                start = max(0, stop - block_size)
+                columns = store.read_columns(keys, start, stop)
+                for i in range(stop - start - 1, -1, -1):
+                    yield start + i + 1, types.RowRecord(data={key: columns[key][i] for key in keys})
+            return
+        position = ScanPosition(table.id, [table.last_row_offset])
+        if snapshot is not None:
+            snapshot.positions.append(position)
+        try:
+            while position.refs[0]:
+                ref = position.refs[0]
+                block = None
+                if ref < 0:
+                    block_offset, slot = self._decode_block_ref(ref)
+                else:
+                    item = self.read_chain_item(ref)
+                    if isinstance(item, types.RowRecord):
+                        position.refs[0] = item.prev_row_offset
+                        data = item.data
+                        if snapshot is not None:
+                            data = self.versions.visible_data(snapshot, table.id, ref, data)
+                        if data is not None:
+                            yield ref, item if data is item.data else types.RowRecord(data=data)
+                        continue
+                    block_offset, slot, block = ref, item.count - 1, item
+                block, rows_data = self.read_block(block_offset, block)
+                position.refs[0] = block.prev_row_offset
+                for i in range(slot, -1, -1):
+                    ref = self._encode_block_ref(block_offset, i)
+                    data = rows_data[i]
+                    if snapshot is not None:
+                        data = self.versions.visible_data(snapshot, table.id, ref, data)
+                    if data is not None:
+                        yield ref, types.RowRecord(data=data)
+        finally:
+            if snapshot is not None:
+                snapshot.positions.remove(position)
+
+    def iter_snapshot_rows(
+        self,
+        table: types.MetaTable,
+        refs: list[int],
+        snapshot: Snapshot,
+    ) -> Generator[tuple[int, types.RowRecord], None, None]:
+        position = ScanPosition(table.id, list(reversed(refs)))
+        snapshot.positions.append(position)
+        try:
+            while position.refs:
+                ref = position.refs.pop()
+                meta_row = self.read_table_row(table, ref)
+                data = self.versions.visible_data(snapshot, table.id, ref, meta_row.data)
+                if data is not None:
+                    yield ref, meta_row if data is meta_row.data else types.RowRecord(data=data)
+        finally:
+            snapshot.positions.remove(position)
+
+    def read_table_row(self, table: types.MetaTable, ref: int) -> types.RowRecord:
+        if table.engine == types.TableEngine.LSM:
+            raise ValueError(f'Rows of lsm table {table.name} are read by primary key')
+        if table.engine == types.TableEngine.COLUMN:
+            if not 0 < ref <= table.rows_count:
+                raise ValueError(f'Incorrect row id {ref} for table {table.name}')
+            return types.RowRecord(data=self.get_column_store(table).read_row(ref - 1))
+        if ref < 0:
+            block_offset, slot = self._decode_block_ref(ref)
+            _, rows_data = self.read_block(block_offset)
+            return types.RowRecord(data=rows_data[slot])
+        return self.read_row_meta(ref)
+
+    @staticmethod
+    def _coalesce(refs: list[int], gap: int) -> list[list[int]]:
+        runs: list[list[int]] = []
+        for ref in refs:
+            if runs and ref - runs[-1][-1] <= gap:
+                runs[-1].append(ref)
+            else:
+                runs.append([ref])
+        return runs
+
+    def _read_records(self, offsets: list[int]) -> dict[int, dict]:
+        records: dict[int, dict] = {}
+        if not offsets:
+            return records
+        with self._open("rb") as f:
+            for run in self._coalesce(offsets, self._COALESCE_GAP):
+                self._seek(f, run[0])
+                buffer = self._read(f, run[-1] - run[0] + self._META_BUFFER_SIZE)
+                for offset in run:
+                    start = offset - run[0] + self._INT_SIZE
+                    size = int.from_bytes(buffer[start - self._INT_SIZE:start], byteorder="big", signed=False)
+                    raw = buffer[start:start + size]
+                    if len(raw) < size:
+                        # record is longer than the buffer at the end of the run
+                        self._seek(f, offset + self._INT_SIZE)
+                        raw = self._read(f, size)
+                    records[offset] = self._decode_record(raw)
+        return records
 
-    def override_row_meta(self, table_name: str, row: types.MetaRow, override_row_offset: int) -> None:
+    def read_table_rows(self, table: types.MetaTable, refs: list[int]) -> dict[int, types.RowRecord]:
+        # batched point reads, refs are read in file order and near rows share one request
+        refs = sorted(set(refs))
+        if table.engine == types.TableEngine.LSM:
+            raise ValueError(f'Rows of lsm table {table.name} are read by primary key')
+        if table.engine == types.TableEngine.COLUMN:
+            if refs and not (0 < refs[0] and refs[-1] <= table.rows_count):
+                raise ValueError(f'Incorrect row id for table {table.name}')
+            store = self.get_column_store(table)
+            keys = list(table.keys)
+            rows = {}
+            for run in self._coalesce(refs, self._COALESCE_ROWS):
+                columns = store.read_columns(keys, run[0] - 1, run[-1])
+                for ref in run:
+                    rows[ref] = types.RowRecord(data={key: columns[key][ref - run[0]] for key in keys})
+            return rows
+        blocks: dict[int, list[tuple[int, int]]] = {}
+        for ref in refs:
+            if ref < 0:
+                block_offset, slot = self._decode_block_ref(ref)
+                blocks.setdefault(block_offset, []).append((ref, slot))
+        rows = {
+            offset: types.RowRecord.from_dict(record)
+            for offset, record in self._read_records([ref for ref in refs if ref >= 0]).items()
+        }
+        for block_offset in sorted(blocks):
+            _, rows_data = self.read_block(block_offset)
+            for ref, slot in blocks[block_offset]:
+                rows[ref] = types.RowRecord(data=rows_data[slot])
+        return rows
+
+    @_log_change(ChangeOp.UPDATE_ROW, lambda table_name, row, override_row_offset: {
+        'table': table_name, 'ref': override_row_offset, 'data': row.data,
+    })
+    def override_row_meta(
+        self,
+        table_name: str,
+        row: types.MetaRow | types.RowRecord,
+        override_row_offset: int,
+    ) -> None:
         table = self.get_table_by_name(table_name)
+        if table.engine == types.TableEngine.COLUMN:
+            raise ValueError(f'Rows of column table {table_name} are append only')
+        if table.engine == types.TableEngine.LSM:
+            raise ValueError(f'Rows of lsm table {table_name} are append only')
+        if override_row_offset < 0:
+            raise ValueError(f'Rows of compressed blocks in table {table_name} are read only')
         row = self.preprocess_row_data(table, row)
         override_row = self.read_row_meta(override_row_offset)
+        if override_row.data != row.data:
+            # zone maps cannot drop old values, they are rebuilt on next open
+            self.invalidate_zone_maps(table)
+            self.versions.record_update(table.id, override_row_offset, override_row.data)
+            self._update_open_row(table, override_row_offset, override_row_offset, row.data)
 
         _, row_meta_size = self._encode_meta(row)
         if row_meta_size < self._META_BUFFER_SIZE:
@@ -244,45 +904,207 @@ class DatabaseCursor:
 
         offset = self._get_current_offset()
         self._write_meta(row, offset, use_buffer=True)
+        self._update_open_row(table, override_row_offset, offset, row.data)
+        self._move_rows(table, [(override_row_offset, offset, row.data)])
         if override_row.has_prev():
-            prev_row = self.read_row_meta(override_row.prev_row_offset)
-            updated = prev_row.copy()
-            updated.next_row_offset = offset
-            self.override_row_meta(table_name, updated, override_row.prev_row_offset)
+            self._set_chain_next(table_name, override_row.prev_row_offset, offset)
 
         if override_row.has_next():
-            next_row = self.read_row_meta(override_row.next_row_offset)
-            updated = next_row.copy()
-            updated.prev_row_offset = offset
-            self.override_row_meta(table_name, updated, override_row.next_row_offset)
-
-        if table.first_row_offset == override_row_offset:
-            updated_table = table.copy()
-            updated_table.first_row_offset = offset
-            self.override_table_meta(updated_table, updated_table.name)
+            self._set_chain_prev(table_name, override_row.next_row_offset, offset)
 
-        if table.last_row_offset == override_row_offset:
-            updated_table = table.copy()
-            updated_table.last_row_offset = offset
-            self.override_table_meta(updated_table, updated_table.name)
+        if table.first_row_offset == override_row_offset or table.last_row_offset == override_row_offset:
+            updated_table = self.get_table_by_name(table_name).copy()
+            if table.first_row_offset == override_row_offset:
+                updated_table.first_row_offset = offset
+            if table.last_row_offset == override_row_offset:
+                updated_table.last_row_offset = offset
+            self.update_table_heads(updated_table)
 
-    def write_row_meta(self, table_name: str, row: types.MetaRow) -> tuple[types.MetaRow, int]:
+    @_log_change(ChangeOp.INSERT_ROW, lambda table_name, row: {'table': table_name, 'data': row.data})
+    def write_row_meta(
+        self,
+        table_name: str,
+        row: types.MetaRow | types.RowRecord,
+    ) -> tuple[types.RowRecord, int]:
         table = self.get_table_by_name(table_name)
         row = self.preprocess_row_data(table, row)
-        row.next_row_offset = 0
+        if table.engine == types.TableEngine.COLUMN:
+            return row, self.write_column_rows(table, [row])[0]
+        if table.engine == types.TableEngine.LSM:
+            return row, self.write_lsm_rows(table, [row])[0]
+        if table.compression:
+            offset, moves = self._write_compressed_row(table, row)
+            return row, moves.get(offset, offset)
         offset = self._get_current_offset()
+        self._append_row(table, row, offset)
+        return row, offset
 
+    def _append_row(self, table: types.MetaTable, row: types.RowRecord, offset: int) -> None:
+        row.prev_row_offset = table.last_row_offset
+        row.next_row_offset = 0
+        # row is written before linking, so relocation of the last row cannot take its place
+        self._write_meta(row, offset, use_buffer=True)
         if table.last_row_offset:
-            row.prev_row_offset = table.last_row_offset
-            last_row = self.read_row_meta(table.last_row_offset)
-            last_row.next_row_offset = offset
-            self.override_row_meta(table_name, last_row, table.last_row_offset)
+            self._set_chain_next(table.name, table.last_row_offset, offset)
 
-        self._write_meta(row, offset, use_buffer=True)
-        updated_table = table.copy()
-        if not table.first_row_offset:
+        updated_table = self.get_table_by_name(table.name).copy()
+        if not updated_table.first_row_offset:
             updated_table.first_row_offset = offset
         updated_table.last_row_offset = offset
-        self.override_table_meta(updated_table, updated_table.name)
+        updated_table.rows_count += 1
+        self.update_table_heads(updated_table)
+        self.versions.record_inserts(table.id, [offset])
+        if zones := self.zone_maps.get(table.id):
+            zones.add(table.keys, offset, row.data)
 
-        return row, offset
+    def _get_open_rows(self, table: types.MetaTable) -> list[tuple[int, dict]]:
+        if table.id not in self._open_rows:
+            open_rows = []
+            offset = table.last_row_offset
+            while offset:
+                item = self.read_chain_item(offset)
+                if isinstance(item, types.MetaBlock):
+                    break
+                open_rows.append((offset, item.data))
+                offset = item.prev_row_offset
+            open_rows.reverse()
+            self._open_rows[table.id] = open_rows
+        return self._open_rows[table.id]
+
+    def _update_open_row(self, table: types.MetaTable, old_offset: int, offset: int, data: dict) -> None:
+        open_rows = self._open_rows.get(table.id)
+        if not open_rows:
+            return
+        for i in range(len(open_rows) - 1, -1, -1):
+            if open_rows[i][0] == old_offset:
+                open_rows[i] = (offset, data)
+                return
+
+    def _get_staging_table(self, table: types.MetaTable) -> types.MetaTable:
+        if table.staging_offset:
+            return table
+        offset = self._get_current_offset()
+        with self._open("r+b") as f:
+            self._seek(f, offset)
+            self._write(f, b'\x00' * self._META_BUFFER_SIZE * self._COMPRESSED_BLOCK_ROWS)
+        updated_table = table.copy()
+        updated_table.staging_offset = offset
+        self.override_table_meta(updated_table, table.name)
+        return updated_table
+
+    def _write_compressed_row(self, table: types.MetaTable, row: types.RowRecord) -> tuple[int, dict[int, int]]:
+        table = self._get_staging_table(table)
+        open_rows = self._get_open_rows(table)
+        row.prev_row_offset = table.last_row_offset
+        _, row_meta_size = self._encode_meta(row)
+        # staging slots are reused after every block, too large rows go to the end of file
+        if self._INT_SIZE + row_meta_size + self._OFFSET_DIGITS < self._META_BUFFER_SIZE:
+            offset = table.staging_offset + len(open_rows) * self._META_BUFFER_SIZE
+        else:
+            offset = self._get_current_offset()
+        self._append_row(table, row, offset)
+        open_rows.append((offset, row.data))
+        if len(open_rows) < self._COMPRESSED_BLOCK_ROWS:
+            return offset, {}
+        return offset, self._seal_open_rows(self.get_table_by_name(table.name))
+
+    def _seal_open_rows(self, table: types.MetaTable) -> dict[int, int]:
+        open_rows = self._get_open_rows(table)
+        first_offset = open_rows[0][0]
+        prev_offset = self.read_row_meta(first_offset).prev_row_offset
+        block_offset = self._write_block(table, [data for _, data in open_rows], prev_offset)
+
+        updated_table = self.get_table_by_name(table.name).copy()
+        if updated_table.first_row_offset == first_offset:
+            updated_table.first_row_offset = block_offset
+        updated_table.last_row_offset = block_offset
+        self.update_table_heads(updated_table)
+        self._open_rows[table.id] = []
+        moves = [
+            (offset, self._encode_block_ref(block_offset, i), data)
+            for i, (offset, data) in enumerate(open_rows)
+        ]
+        self._move_rows(updated_table, moves)
+        return {old_ref: new_ref for old_ref, new_ref, _ in moves}
+
+    def _write_compressed_rows(self, table: types.MetaTable, rows: list[types.RowRecord]) -> list[int]:
+        refs = []
+        i = 0
+        while i < len(rows):
+            table = self.get_table_by_name(table.name)
+            if len(rows) - i >= self._COMPRESSED_BLOCK_ROWS and not self._get_open_rows(table):
+                chunk = rows[i:i + self._COMPRESSED_BLOCK_ROWS]
+                block_offset = self._write_block(table, [row.data for row in chunk], table.last_row_offset)
+                updated_table = self.get_table_by_name(table.name).copy()
+                if not updated_table.first_row_offset:
+                    updated_table.first_row_offset = block_offset
+                updated_table.last_row_offset = block_offset
+                updated_table.rows_count += len(chunk)
+                self.update_table_heads(updated_table)
+                zones = self.zone_maps.get(table.id)
+                for slot, row in enumerate(chunk):
+                    refs.append(self._encode_block_ref(block_offset, slot))
+                    if zones:
+                        zones.add(table.keys, refs[-1], row.data)
+                self.versions.record_inserts(table.id, refs[-len(chunk):])
+                i += len(chunk)
+                continue
+            offset, moves = self._write_compressed_row(table, rows[i])
+            refs.append(offset)
+            if moves:
+                # only rows of the sealed block can move, slots are reused afterwards
+                for j in range(max(0, len(refs) - self._COMPRESSED_BLOCK_ROWS), len(refs)):
+                    refs[j] = moves.get(refs[j], refs[j])
+            i += 1
+        return refs
+
+    @_log_change(ChangeOp.INSERT_ROWS, lambda table_name, rows: {
+        'table': table_name, 'rows': [row.data for row in rows],
+    })
+    def write_rows_meta(self, table_name: str, rows: list[types.MetaRow | types.RowRecord]) -> list[int]:
+        table = self.get_table_by_name(table_name)
+        if not rows:
+            return []
+        if table.engine == types.TableEngine.COLUMN:
+            return self.write_column_rows(table, rows)
+        if table.engine == types.TableEngine.LSM:
+            return self.write_lsm_rows(table, rows)
+        if table.compression:
+            return self._write_compressed_rows(table, rows)
+        start_offset = self._get_current_offset()
+        offsets = []
+        records = []
+        offset = start_offset
+        prev_offset = table.last_row_offset
+        for i, row in enumerate(rows):
+            row.prev_row_offset = prev_offset
+            row.next_row_offset = 0
+            while True:
+                record = self._pack_meta(row)
+                next_offset = offset + len(record) if i < len(rows) - 1 else 0
+                if row.next_row_offset == next_offset:
+                    break
+                row.next_row_offset = next_offset
+            offsets.append(offset)
+            records.append(record)
+            prev_offset = offset
+            offset += len(record)
+
+        with self._open("r+b") as f:
+            self._seek(f, start_offset)
+            self._write(f, b''.join(records))
+
+        if table.last_row_offset:
+            self._set_chain_next(table_name, table.last_row_offset, start_offset)
+
+        updated_table = self.get_table_by_name(table_name).copy()
+        if not updated_table.first_row_offset:
+            updated_table.first_row_offset = start_offset
+        updated_table.last_row_offset = offsets[-1]
+        updated_table.rows_count += len(offsets)
+        self.update_table_heads(updated_table)
+        self.versions.record_inserts(table.id, offsets)
+        if zones := self.zone_maps.get(table.id):
+            for offset, row in zip(offsets, rows):
+                zones.add(table.keys, offset, row.data)
+        return offsets
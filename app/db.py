@@ -1,25 +1,143 @@
-from dataclasses import dataclass
-from typing import Generator
+import heapq
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import AbstractContextManager
+from dataclasses import dataclass, field
+from itertools import islice
+from operator import itemgetter
+from typing import (Any, Callable, Generator, Iterable, Iterator, Sequence,
+                    TypeVar)
 
 from . import types
+from .aggregate import Aggregation, Aggregator
+from .cache import ResultCache, estimate_size, normalize_filter
+from .changelog import ChangeLog
+from .compression import validate_level
+from .continuation import (Continuation, ResumableIterator, query_fingerprint,
+                           row_digest)
 from .cursor import DatabaseCursor
 from .indexer import Indexer
+from .mvcc import Snapshot
+from .stats import QueryStats, StatsHook, collect
+from .transfer import FileFormat, batched, write_records
+from .zonemap import TableZones
+
+T = TypeVar('T')
+
+
+def _scan_partition(
+    db_file: str,
+    table_name: str,
+    filter_: types.Filter,
+    start_ref: int | None,
+    skip: int,
+    limit: int | None,
+) -> tuple[list[dict], QueryStats]:
+    # runs in worker process with own read only cursor of partition file, scans one segment of its rows
+    cursor = DatabaseCursor(db_file, read_only=True)
+    meta_table = cursor.get_table_by_name(table_name)
+    query_stats = cursor.stats
+    rows = []
+    for _, meta_row in islice(cursor.iter_table_rows(meta_table, start_ref), skip, limit):
+        query_stats.rows_scanned += 1
+        if not Database.is_row_fit_filter(meta_row, filter_):
+            query_stats.rows_filtered += 1
+            continue
+        query_stats.rows_returned += 1
+        rows.append(meta_row.data)
+    return rows, query_stats
+
+
+def _read_partition_rows(db_file: str, table_name: str, refs: list[int]) -> tuple[list[dict], QueryStats]:
+    cursor = DatabaseCursor(db_file, read_only=True)
+    meta_rows = cursor.read_table_rows(cursor.get_table_by_name(table_name), refs)
+    cursor.stats.rows_scanned += len(meta_rows)
+    cursor.stats.rows_returned += len(meta_rows)
+    return [meta_rows[ref].data for ref in refs if ref in meta_rows], cursor.stats
 
 
 @dataclass
 class Database:
     db_file: str
+    stats_hooks: list[StatsHook] = field(default_factory=list)
+    # partitions share statistics of the database which owns them
+    query_stats: QueryStats | None = None
+    # partitions of read only database are opened without creating or changing their files
+    read_only_cursor: bool = False
+    COLUMN_BLOCK_SIZE: int = 4096
+    INDEX_BUILD_WORKERS: int = 4
+    # outer rows probed in right table index at once
+    JOIN_BATCH_SIZE: int = 1000
+    # memory budget of query results cache in bytes, 0 disables cache
+    RESULT_CACHE_SIZE: int = 0
+    # writes are logged for replicas, log is kept once it is started
+    CHANGE_LOG: bool = False
+    # replicas change their copy only by change log entries
+    READ_ONLY: bool = False
+    # worker processes of scans over partitions of partitioned tables
+    PARTITION_WORKERS: int = 4
+    # index selects over several partitions read rows in worker processes from this amount of rows
+    PARTITION_POOL_MIN_ROWS: int = 1000
+    # refs read by one task of worker process, scan tasks are segments of partition zone maps
+    PARTITION_CHUNK_ROWS: int = 1024
 
     def __post_init__(self):
-        self.cursor = DatabaseCursor(self.db_file)
+        self.cursor = DatabaseCursor(
+            self.db_file, stats=self.query_stats or QueryStats(), read_only=self.read_only_cursor,
+        )
+        # { table_id: [ partition database, ... ] } opened on first use
+        self.partitions: dict[int, list[Database]] = {}
+        # worker processes of partition scans, started by the first scan
+        self.pool: ProcessPoolExecutor | None = None
         self.indexer = Indexer(cursor=self.cursor)
+        self.result_cache = ResultCache(self.RESULT_CACHE_SIZE, self.cursor.stats)
+        if self.READ_ONLY and self.CHANGE_LOG:
+            raise ValueError('Read only database cannot write change log')
         try:
             self.indexer.load()
         except Exception:
             print('Load indexes failed. Build indexes')
-            for table in self.cursor.read_all_tables():
-                self.indexer.build_for_table(table[0].name)
+            tables = [it[0].name for it in self.cursor.read_all_tables()]
+            # tables are built in parallel, reads of one table overlap with indexing of another
+            with ThreadPoolExecutor(max_workers=self.INDEX_BUILD_WORKERS) as executor:
+                list(executor.map(self.indexer.build_for_table, tables))
             print('Indexes created')
+        if self.CHANGE_LOG or (ChangeLog.exists(self.db_file) and not self.READ_ONLY):
+            self.cursor.change_log = ChangeLog.start(self.db_file, self.cursor.get_all_cached_tables())
+
+    def _check_writable(self) -> None:
+        if self.READ_ONLY:
+            raise ValueError(f'Database {self.db_file} is opened read only')
+
+    def save(self) -> None:
+        self.indexer.save()
+        for store in self.cursor.lsm_stores.values():
+            store.wait()
+        self.cursor.save_commit_seq()
+        # zone maps are saved after the last write of database file
+        self.cursor.save_zone_maps()
+        # pool is started again by the next scan
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+        if self.READ_ONLY:
+            return
+        for partitions in self.partitions.values():
+            for partition in partitions:
+                partition.save()
+
+    @property
+    def stats(self) -> QueryStats:
+        return self.cursor.stats
+
+    def reset_stats(self) -> None:
+        self.cursor.stats.reset()
+
+    def add_stats_hook(self, hook: StatsHook) -> None:
+        self.stats_hooks.append(hook)
+
+    def collect_stats(self, name: str) -> AbstractContextManager[QueryStats]:
+        return collect(self.cursor.stats, name, self.stats_hooks)
 
     @staticmethod
     def _meta_table_to_table(meta_table: types.MetaTable) -> types.Table:
@@ -27,11 +145,19 @@ class Database:
             name=meta_table.name,
             keys=meta_table.keys,
             indexes=meta_table.indexes,
+            disk_indexes=meta_table.disk_indexes,
+            primary_key=meta_table.primary_key,
+            partition_key=meta_table.partition_key,
+            partitions=meta_table.partitions,
+            engine=meta_table.engine,
+            compression=meta_table.compression,
+            compression_level=meta_table.compression_level,
         )
 
     @staticmethod
-    def _meta_row_to_row(meta_row: types.MetaRow) -> types.Row:
-        return types.Row(
+    def _meta_row_to_row(meta_row: types.RowRecord) -> types.Row:
+        # row data is already validated by table schema on write
+        return types.Row.construct(
             data=meta_row.data,
         )
 
@@ -46,35 +172,221 @@ class Database:
         return self._meta_table_to_table(meta_table)
 
     def get_tables_iterator(self) -> Generator[types.Table, None, None]:
-        if not self.cursor.db_meta.has_tables():
-            return
-        meta_table = self.cursor.read_table_meta(
-            self.cursor.db_meta.first_table_offset
-        )
-        yield self._meta_table_to_table(meta_table)
-        while meta_table.has_next():
-            meta_table = self.cursor.read_table_meta(meta_table.next_table_offset)
+        for meta_table in self.cursor.get_all_cached_tables():
             yield self._meta_table_to_table(meta_table)
 
     def create_table(self, table: types.TableCreate) -> None:
+        self._check_writable()
+        if table.compression:
+            if table.engine != types.TableEngine.ROW:
+                raise ValueError('Compression is supported only for row tables')
+            validate_level(table.compression, table.compression_level)
+        elif table.compression_level is not None:
+            raise ValueError('Compression level requires compression')
+        if table.primary_key is not None and table.primary_key not in table.keys:
+            raise ValueError(f'Primary key {table.primary_key} does not found in table {table.name} keys')
+        if table.partitions or table.partition_key is not None:
+            self._validate_partitions(table)
+            # writes of partitions are not logged, replicas would not have their rows
+            if self.cursor.change_log is not None:
+                raise ValueError('Partitioned tables are not supported with change log')
         meta_table = types.MetaTable(
             name=table.name,
             keys=table.keys,
-            indexes=[]
+            # primary key uniqueness is checked through its index, lsm tables are sorted by it instead
+            indexes=[table.primary_key] if table.primary_key and table.engine != types.TableEngine.LSM else [],
+            primary_key=table.primary_key,
+            partition_key=table.partition_key,
+            partitions=table.partitions,
+            engine=table.engine,
+            compression=table.compression,
+            compression_level=table.compression_level,
         )
         self.cursor.write_table_meta(meta_table)
         self.indexer.build_for_table(table.name)
+        if meta_table.partitions:
+            partition_table = table.copy(update={'partition_key': None, 'partitions': 0})
+            for partition in self._get_partitions(self.cursor.get_table_by_name(table.name)):
+                partition.create_table(partition_table)
+
+    @staticmethod
+    def _validate_partitions(table: types.TableCreate) -> None:
+        if table.partition_key not in table.keys:
+            raise ValueError(f'Partition key {table.partition_key} does not found in table {table.name} keys')
+        if table.partitions <= 0:
+            raise ValueError(f'Partitioned table {table.name} requires positive number of partitions')
+        if table.engine != types.TableEngine.ROW:
+            raise ValueError('Partitions are supported only for row tables')
+        # uniqueness is checked inside of one partition
+        if table.primary_key is not None and table.primary_key != table.partition_key:
+            raise ValueError('Primary key of partitioned table has to be its partition key')
+
+    def _partition_file(self, meta_table: types.MetaTable, number: int) -> str:
+        return f'{self.db_file}.t{meta_table.id}.p{number}'
+
+    def _get_partitions(self, meta_table: types.MetaTable) -> list['Database']:
+        partitions = self.partitions.get(meta_table.id)
+        if partitions is None:
+            partitions = [
+                Database(
+                    db_file=self._partition_file(meta_table, number),
+                    query_stats=self.cursor.stats,
+                    INDEX_BUILD_WORKERS=self.INDEX_BUILD_WORKERS,
+                    READ_ONLY=self.READ_ONLY,
+                    read_only_cursor=self.READ_ONLY,
+                )
+                for number in range(meta_table.partitions)
+            ]
+            self.partitions[meta_table.id] = partitions
+        return partitions
+
+    @staticmethod
+    def _partition_of(meta_table: types.MetaTable, value: Any) -> int:
+        # hash does not depend on process, rows of value are found by any process
+        return Indexer.disk_hash(value) % meta_table.partitions
 
-    def create_table_index(self, table_name: str, index_key: str) -> None:
-        table = self.cursor.get_table_by_name(table_name)
-        if index_key not in table.keys:
-            raise ValueError(f'Key {index_key} does not found in table {table_name}')
-        if index_key in table.indexes:
-            raise ValueError(f'Index for key {index_key} already exists in table {table_name}')
-        table_copy = table.copy()
-        table_copy.indexes.append(index_key)
-        self.cursor.override_table_meta(table_copy, override_table=table_name)
-        self.indexer.build_for_table_key(table_name, index_key)
+    def _target_partitions(self, meta_table: types.MetaTable, filter_: types.Filter) -> list[int]:
+        # partitions which can have rows of converted filter
+        parts = filter_ if isinstance(filter_, list) else [filter_]
+        key = meta_table.partition_key
+        if not parts or any(key not in part for part in parts):
+            return list(range(meta_table.partitions))
+        targets = set()
+        for part in parts:
+            values = part[key] if isinstance(part[key], list) else [part[key]]
+            targets.update(self._partition_of(meta_table, value) for value in values)
+        return sorted(targets)
+
+    def _sync_partition_rows(self, meta_table: types.MetaTable) -> None:
+        # rows count of partitioned table is kept for planning and generators
+        with self.cursor.lock:
+            updated_table = self.cursor.get_table_by_name(meta_table.name).copy()
+            updated_table.rows_count = sum(
+                partition.cursor.get_table_by_name(meta_table.name).rows_count
+                for partition in self._get_partitions(meta_table)
+            )
+            self.cursor.update_table_heads(updated_table)
+
+    def _fan_out(
+        self,
+        worker: Callable[..., tuple[list[dict], QueryStats]],
+        tasks: list[tuple],
+    ) -> Generator[list[dict], None, None]:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.PARTITION_WORKERS)
+        # results are taken in order of tasks, only a few chunks are waiting in memory
+        remaining = iter(tasks)
+        running = deque(self.pool.submit(worker, *task) for task in islice(remaining, self.PARTITION_WORKERS * 2))
+        try:
+            while running:
+                rows, query_stats = running.popleft().result()
+                for task in islice(remaining, 1):
+                    running.append(self.pool.submit(worker, *task))
+                self.cursor.stats.add(query_stats)
+                yield rows
+        finally:
+            for future in running:
+                future.cancel()
+
+    def _iter_partition_rows(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+        prefetch: int = 0,
+    ) -> Generator[tuple[int, int, types.RowRecord], None, None]:
+        # rows come partition by partition, refs of partitions are not exposed
+        partitions = self._get_partitions(meta_table)
+        targets = self._target_partitions(meta_table, filter_)
+        position = 0
+        if len(targets) == 1:
+            partition = partitions[targets[0]]
+            partition_meta = partition.cursor.get_table_by_name(meta_table.name)
+            for _, _, meta_row in partition._iter_meta_rows(partition_meta, filter_, None, prefetch):
+                yield 0, position, meta_row
+                position += 1
+            return
+        tasks = []
+        for number in targets:
+            partition = partitions[number]
+            partition_meta = partition.cursor.get_table_by_name(meta_table.name)
+            zones = partition.cursor.get_zone_maps(partition_meta)
+            tasks.extend(
+                (partition.db_file, meta_table.name, filter_, start_ref, skip, limit)
+                for start_ref, _, skip, limit in partition._get_scan_segments(partition_meta, filter_, zones, None)
+            )
+        if not tasks:
+            return
+        for rows in self._fan_out(_scan_partition, tasks):
+            for data in rows:
+                yield 0, position, types.RowRecord(data)
+                position += 1
+
+    def _iter_partition_index_rows(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+    ) -> Iterator[types.RowRecord]:
+        filter_copy = self.convert_filter(meta_table, filter_)
+        self.indexer.get_filter_keys_for_indexes(meta_table, filter_copy)
+        partitions = self._get_partitions(meta_table)
+        targets = [partitions[it] for it in self._target_partitions(meta_table, filter_copy)]
+        keys = self.get_filter_keys(filter_copy)
+        if not all(partition.indexer.is_ready(meta_table.name, keys) for partition in targets):
+            return (meta_row for _, _, meta_row in self._iter_partition_rows(meta_table, filter_copy))
+        if len(targets) > 1:
+            refs = [
+                sorted(partition.indexer.get_filter_indexes_offsets(
+                    partition.cursor.get_table_by_name(meta_table.name), filter_copy,
+                ))
+                for partition in targets
+            ]
+            if sum(len(it) for it in refs) >= self.PARTITION_POOL_MIN_ROWS:
+                tasks = [
+                    (partition.db_file, meta_table.name, it[start:start + self.PARTITION_CHUNK_ROWS])
+                    for partition, it in zip(targets, refs)
+                    for start in range(0, len(it), self.PARTITION_CHUNK_ROWS)
+                ]
+                return (types.RowRecord(data) for rows in self._fan_out(_read_partition_rows, tasks) for data in rows)
+        return (
+            meta_row
+            for partition in targets
+            for meta_row in partition.indexer.get_rows_iterator_use_indexes(meta_table.name, filter_copy)
+        )
+
+    def create_table_index(self, table_name: str, index_key: str, on_disk: bool = False) -> None:
+        self.create_table_indexes(table_name, [index_key], on_disk)
+
+    def create_table_indexes(
+        self,
+        table_name: str,
+        index_keys: list[str],
+        on_disk: bool = False,
+        # index selects scan the table until the build is finished
+        background: bool = False,
+    ) -> None:
+        self._check_writable()
+        with self.cursor.lock:
+            table = self.cursor.get_table_by_name(table_name)
+            if table.engine == types.TableEngine.LSM:
+                raise ValueError(f'Rows of lsm table {table_name} are indexed only by primary key')
+            if len(set(index_keys)) != len(index_keys):
+                raise ValueError(f'Index keys {index_keys} are repeated')
+            for index_key in index_keys:
+                if index_key not in table.keys:
+                    raise ValueError(f'Key {index_key} does not found in table {table_name}')
+                if index_key in table.indexes:
+                    raise ValueError(f'Index for key {index_key} already exists in table {table_name}')
+            table_copy = table.copy(deep=True)
+            table_copy.indexes.extend(index_keys)
+            if on_disk:
+                table_copy.disk_indexes.extend(index_keys)
+            self.cursor.override_table_meta(table_copy, override_table=table_name)
+            if table.partitions:
+                for partition in self._get_partitions(table):
+                    partition.create_table_indexes(table_name, index_keys, on_disk, background)
+                return
+            # all keys are built in one scan
+            self.indexer.build_for_table_keys(table_name, index_keys, background)
 
     def convert_filter_part(
         self, table: types.MetaTable, filter_part: types.FilterPart,
@@ -102,8 +414,41 @@ class Database:
         else:
             return self.convert_filter_part(meta_table, filter_)
 
+    @staticmethod
+    def get_filter_keys(filter_: types.Filter) -> list[str]:
+        parts = filter_ if isinstance(filter_, list) else [filter_]
+        return list(dict.fromkeys(key for part in parts for key in part))
+
+    @staticmethod
+    def filter_column_part(
+        columns: dict[str, list], size: int, filter_part: types.FilterPart,
+    ) -> list[bool]:
+        mask = [True] * size
+        for key, val in filter_part.items():
+            column = columns[key]
+            if isinstance(val, list):
+                values = set(val)
+                mask = [m and v in values for m, v in zip(mask, column)]
+            else:
+                mask = [m and v == val for m, v in zip(mask, column)]
+        return mask
+
+    def filter_columns(
+        self, columns: dict[str, list], size: int, filter_: types.Filter,
+    ) -> list[int]:
+        if len(filter_) == 0:
+            return list(range(size))
+        if isinstance(filter_, list):
+            mask = [False] * size
+            for part in filter_:
+                mask = [m or p for m, p in zip(mask, self.filter_column_part(columns, size, part))]
+        else:
+            mask = self.filter_column_part(columns, size, filter_)
+        return [i for i, m in enumerate(mask) if m]
+
+    @staticmethod
     def is_row_fit_filter_val(
-        self, meta_row: types.MetaRow, key: str, val: types.FilterValue
+        meta_row: types.RowRecord, key: str, val: types.FilterValue
     ) -> bool:
         if isinstance(val, list):
             for v in val:
@@ -113,51 +458,698 @@ class Database:
         else:
             return meta_row.data[key] == val
 
+    @staticmethod
     def is_row_fit_filter_part(
-        self, meta_row: types.MetaRow, filter_part: types.FilterPart,
+        meta_row: types.RowRecord, filter_part: types.FilterPart,
     ) -> bool:
         for key, val in filter_part.items():
-            if not self.is_row_fit_filter_val(meta_row, key, val):
+            if not Database.is_row_fit_filter_val(meta_row, key, val):
                 return False
         return True
 
+    @staticmethod
     def is_row_fit_filter(
-        self, meta_row: types.MetaRow, filter_: types.Filter,
+        meta_row: types.RowRecord, filter_: types.Filter,
     ) -> bool:
         if len(filter_) == 0:
             return True
         if isinstance(filter_, list):
             for part in filter_:
-                if self.is_row_fit_filter_part(meta_row, part):
+                if Database.is_row_fit_filter_part(meta_row, part):
                     return True
             return False
-        return self.is_row_fit_filter_part(meta_row, filter_)
+        return Database.is_row_fit_filter_part(meta_row, filter_)
 
-    def get_rows_iterator(
+    def _get_meta_rows_iterator(
         self,
         table_name: str,
         filter_: types.Filter | None = None,
-    ) -> Generator[types.Row, None, None]:
+    ) -> Generator[types.RowRecord, None, None]:
         meta_table = self.cursor.get_table_by_name(table_name)
         filter_copy = self.convert_filter(meta_table, filter_ or dict())
-        offset = meta_table.first_row_offset
-        while offset:
-            meta_row = self.cursor.read_row_meta(offset)
-            offset = meta_row.next_row_offset
-            if not self.is_row_fit_filter(meta_row, filter_copy):
+        for _, _, meta_row in self._iter_query_rows(meta_table, filter_copy):
+            yield meta_row
+
+    def _iter_query_rows(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+        prefetch: int = 0,
+    ) -> Iterator[tuple[int, int, types.RowRecord]]:
+        # complete scan results are cached until the next change of table rows
+        if not self.result_cache.budget or meta_table.partitions:
+            return self._iter_meta_rows(meta_table, filter_, None, prefetch)
+        key = (meta_table.id, normalize_filter(filter_))
+        version = self.cursor.versions.table_versions.get(meta_table.id, 0)
+        cached = self.result_cache.get(key, version)
+        if cached is None:
+            return self._fill_result_cache(meta_table, key, version, prefetch, filter_)
+        return self._iter_cached_rows(cached)
+
+    def _iter_cached_rows(
+        self,
+        cached: list[tuple[int, int, dict]],
+    ) -> Generator[tuple[int, int, types.RowRecord], None, None]:
+        query_stats = self.cursor.stats
+        for ref, position, data in cached:
+            query_stats.rows_returned += 1
+            yield ref, position, types.RowRecord(data=dict(data))
+
+    def _fill_result_cache(
+        self,
+        meta_table: types.MetaTable,
+        key: tuple[int, str],
+        version: int,
+        prefetch: int,
+        filter_: types.Filter,
+    ) -> Generator[tuple[int, int, types.RowRecord], None, None]:
+        rows: list[tuple[int, int, dict]] | None = []
+        size = 0
+        for ref, position, meta_row in self._iter_meta_rows(meta_table, filter_, None, prefetch):
+            if rows is not None:
+                rows.append((ref, position, dict(meta_row.data)))
+                size += estimate_size(meta_row.data)
+                if size > self.result_cache.budget:
+                    # result does not fit the cache, stop collecting it
+                    rows = None
+            yield ref, position, meta_row
+        if rows is not None and self.cursor.versions.table_versions.get(meta_table.id, 0) == version:
+            self.result_cache.put(key, version, rows, size)
+
+    def _iter_meta_rows(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+        after: Continuation | None = None,
+        prefetch: int = 0,
+    ) -> Generator[tuple[int, int, types.RowRecord], None, None]:
+        start_position = after.position + 1 if after else 0
+        if meta_table.partitions:
+            yield from self._iter_partition_rows(meta_table, filter_, prefetch)
+            return
+        if meta_table.engine == types.TableEngine.COLUMN:
+            yield from self._iter_column_meta_rows(meta_table, filter_, start_position)
+            return
+        if meta_table.engine == types.TableEngine.LSM:
+            yield from self._iter_lsm_meta_rows(meta_table, filter_)
+            return
+        zones = self.cursor.get_zone_maps(meta_table) if filter_ or after else None
+        # rows inserted or changed after the query start are not visible to it
+        snapshot = self.cursor.begin_snapshot()
+        try:
+            for start_ref, position, skip, limit in self._get_scan_segments(meta_table, filter_, zones, after):
+                yield from self._scan_meta_rows(
+                    meta_table, start_ref, position, skip, filter_, snapshot, limit, prefetch,
+                )
+        finally:
+            self.cursor.release_snapshot(snapshot)
+
+    def _iter_meta_rows_reverse(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+    ) -> Generator[tuple[int, int, types.RowRecord], None, None]:
+        query_stats = self.cursor.stats
+        snapshot = self.cursor.begin_snapshot()
+        position = meta_table.rows_count
+        try:
+            for ref, meta_row in self.cursor.iter_table_rows_reverse(meta_table, snapshot=snapshot):
+                position -= 1
+                query_stats.rows_scanned += 1
+                if not self.is_row_fit_filter(meta_row, filter_):
+                    query_stats.rows_filtered += 1
+                    continue
+                query_stats.rows_returned += 1
+                yield ref, position, meta_row
+        finally:
+            self.cursor.release_snapshot(snapshot)
+
+    def _is_resumable_ref(self, meta_table: types.MetaTable, after: Continuation) -> bool:
+        # staging slots of compressed tables are reused, so only refs of sealed rows are stable
+        if after.ref >= 0 and meta_table.compression:
+            return False
+        try:
+            meta_row = self.cursor.read_table_row(meta_table, after.ref)
+        except Exception:
+            return False
+        return row_digest(meta_row.data) == after.digest
+
+    def _get_scan_segments(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+        zones: TableZones | None,
+        after: Continuation | None,
+    ) -> list[tuple[int | None, int, int, int | None]]:
+        # [ (start ref, position of start ref, rows to skip, rows limit), ... ]
+        start_position = after.position + 1 if after else 0
+        resume_ref = after is not None and self._is_resumable_ref(meta_table, after)
+        if zones is None:
+            if resume_ref:
+                return [(after.ref, after.position, 1, None)]
+            return [(None, 0, start_position, None)]
+        segments = []
+        position = 0
+        for zone in list(zones.zones):
+            zone_position = position
+            position += zone.count
+            if position <= start_position:
+                continue
+            if filter_ and not zone.may_match(filter_):
+                self.cursor.stats.blocks_skipped += 1
+                continue
+            if zone_position >= start_position:
+                segments.append((zone.first_offset, zone_position, 0, zone.count))
+            elif resume_ref:
+                segments.append((after.ref, after.position, 1, position - after.position))
+            else:
+                segments.append((zone.first_offset, zone_position, start_position - zone_position, zone.count))
+        return segments
+
+    def _scan_meta_rows(
+        self,
+        meta_table: types.MetaTable,
+        start_ref: int | None,
+        position: int,
+        skip: int,
+        filter_: types.Filter,
+        snapshot: Snapshot,
+        limit: int | None = None,
+        prefetch: int = 0,
+    ) -> Generator[tuple[int, int, types.RowRecord], None, None]:
+        query_stats = self.cursor.stats
+        table_rows = self.cursor.iter_table_rows(meta_table, start_ref, snapshot=snapshot, prefetch=prefetch)
+        position += skip
+        try:
+            for ref, meta_row in islice(table_rows, skip, limit):
+                position += 1
+                query_stats.rows_scanned += 1
+                if not self.is_row_fit_filter(meta_row, filter_):
+                    query_stats.rows_filtered += 1
+                    continue
+                query_stats.rows_returned += 1
+                yield ref, position - 1, meta_row
+        finally:
+            # stops read ahead thread of limited segment
+            table_rows.close()
+
+    def _iter_column_blocks(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+        keys: list[str],
+        start_position: int = 0,
+    ) -> Generator[tuple[dict[str, list], int, Sequence[int]], None, None]:
+        query_stats = self.cursor.stats
+        store = self.cursor.get_column_store(meta_table)
+        filter_keys = self.get_filter_keys(filter_)
+        other_keys = [key for key in keys if key not in filter_keys]
+        for start, stop, columns in store.iter_blocks(
+            filter_keys, start_position, meta_table.rows_count, self.COLUMN_BLOCK_SIZE,
+        ):
+            size = stop - start
+            positions = self.filter_columns(columns, size, filter_)
+            query_stats.rows_scanned += size
+            query_stats.rows_filtered += size - len(positions)
+            query_stats.rows_returned += len(positions)
+            if not positions:
+                continue
+            columns.update(store.read_columns(other_keys, start, stop))
+            if len(positions) == size:
+                yield {key: columns[key] for key in keys}, size, range(start, stop)
+            else:
+                yield (
+                    {key: [columns[key][i] for i in positions] for key in keys},
+                    len(positions),
+                    [start + i for i in positions],
+                )
+
+    def _iter_column_meta_rows(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+        start_position: int = 0,
+    ) -> Generator[tuple[int, int, types.RowRecord], None, None]:
+        keys = list(meta_table.keys)
+        for columns, size, positions in self._iter_column_blocks(meta_table, filter_, keys, start_position):
+            for i, position in enumerate(positions):
+                yield position + 1, position, types.RowRecord(data={key: columns[key][i] for key in keys})
+
+    @staticmethod
+    def _get_primary_key_values(meta_table: types.MetaTable, filter_: types.Filter) -> list[Any] | None:
+        # values of primary key if every part of filter pins it, rows are read by point gets then
+        parts = filter_ if isinstance(filter_, list) else [filter_]
+        if not parts or any(meta_table.primary_key not in part for part in parts):
+            return None
+        values = []
+        for part in parts:
+            val = part[meta_table.primary_key]
+            values.extend(val if isinstance(val, list) else [val])
+        return sorted(set(values))
+
+    def _iter_lsm_meta_rows(
+        self,
+        meta_table: types.MetaTable,
+        filter_: types.Filter,
+    ) -> Generator[tuple[int, int, types.RowRecord], None, None]:
+        query_stats = self.cursor.stats
+        store = self.cursor.get_lsm_store(meta_table)
+        values = self._get_primary_key_values(meta_table, filter_) if meta_table.primary_key else None
+        if values is None:
+            rows_data = store.iter_rows()
+        else:
+            rows_data = (data for data in map(store.get, values) if data is not None)
+        # positions are not stable, lsm scans cannot be resumed
+        for position, data in enumerate(rows_data):
+            meta_row = types.RowRecord(data=data)
+            query_stats.rows_scanned += 1
+            if not self.is_row_fit_filter(meta_row, filter_):
+                query_stats.rows_filtered += 1
                 continue
-            yield self._meta_row_to_row(meta_row)
+            query_stats.rows_returned += 1
+            yield position + 1, position, meta_row
+
+    def _iter_lsm_index_rows(self, meta_table: types.MetaTable, filter_: types.Filter) -> Iterator[types.RowRecord]:
+        # primary key is the only index of lsm table
+        for key in self.get_filter_keys(filter_):
+            if key != meta_table.primary_key:
+                raise ValueError(f'Index for key {key} does not present in table {meta_table.name}')
+        filter_copy = self.convert_filter(meta_table, filter_)
+        return (meta_row for _, _, meta_row in self._iter_meta_rows(meta_table, filter_copy))
+
+    def _get_resumable_iterator(
+        self,
+        table_name: str,
+        filter_: types.Filter | None,
+        after: str | None,
+        convert: Callable[[types.RowRecord], T],
+        reverse: bool = False,
+        prefetch: int = 0,
+    ) -> ResumableIterator[T]:
+        meta_table = self.cursor.get_table_by_name(table_name)
+        filter_copy = self.convert_filter(meta_table, filter_ or dict())
+        if meta_table.partitions:
+            if after or reverse:
+                raise ValueError('Continuation token and reverse order are not supported for partitioned table')
+            rows = self._iter_partition_rows(meta_table, filter_copy, prefetch)
+            return ResumableIterator(rows, meta_table.id, None, convert)
+        if meta_table.engine == types.TableEngine.LSM:
+            if after or reverse:
+                raise ValueError('Continuation token and reverse order are not supported for lsm table')
+            rows = self._iter_query_rows(meta_table, filter_copy, prefetch)
+            return ResumableIterator(rows, meta_table.id, None, convert)
+        if reverse:
+            if after:
+                raise ValueError('Continuation token is not supported for reverse select')
+            rows = self._iter_meta_rows_reverse(meta_table, filter_copy)
+            return ResumableIterator(rows, meta_table.id, None, convert)
+        fingerprint = query_fingerprint(meta_table.name, filter_copy)
+        continuation = None
+        if after:
+            continuation = Continuation.decode(after)
+            if continuation.table_id != meta_table.id or continuation.fingerprint != fingerprint:
+                raise ValueError('Continuation token does not match the query')
+        if continuation is None:
+            rows = self._iter_query_rows(meta_table, filter_copy, prefetch)
+        else:
+            rows = self._iter_meta_rows(meta_table, filter_copy, continuation, prefetch)
+        return ResumableIterator(rows, meta_table.id, fingerprint, convert)
+
+    def get_rows_iterator(
+        self,
+        table_name: str,
+        filter_: types.Filter | None = None,
+        after: str | None = None,
+        reverse: bool = False,
+        prefetch: int = 0,
+    ) -> ResumableIterator[types.Row]:
+        return self._get_resumable_iterator(table_name, filter_, after, self._meta_row_to_row, reverse, prefetch)
+
+    def get_sorted_rows_data(
+        self,
+        table_name: str,
+        order_by: str,
+        desc: bool = False,
+        limit: int = 0,
+        filter_: types.Filter | None = None,
+    ) -> list[dict]:
+        meta_table = self.cursor.get_table_by_name(table_name)
+        if order_by not in meta_table.keys:
+            raise ValueError(f'Key {order_by} does not found in table {table_name}')
+        filter_copy = self.convert_filter(meta_table, filter_ or dict())
+        # indexes are hash based and cannot give sorted order, rows are streamed into bounded heap
+        rows = (meta_row.data for _, _, meta_row in self._iter_query_rows(meta_table, filter_copy))
+        key = itemgetter(order_by)
+        if limit:
+            return heapq.nlargest(limit, rows, key) if desc else heapq.nsmallest(limit, rows, key)
+        return sorted(rows, key=key, reverse=desc)
+
+    def get_sorted_rows(
+        self,
+        table_name: str,
+        order_by: str,
+        desc: bool = False,
+        limit: int = 0,
+        filter_: types.Filter | None = None,
+    ) -> list[types.Row]:
+        return [
+            types.Row.construct(data=data)
+            for data in self.get_sorted_rows_data(table_name, order_by, desc, limit, filter_)
+        ]
 
     def get_rows_iterator_use_indexes(
         self,
         table_name: str,
         filter_: types.Filter,
-    ) -> Generator[types.Row, None, None]:
-        for meta_row in self.indexer.get_rows_iterator_use_indexes(table_name, filter_):
-            yield self._meta_row_to_row(meta_row)
+    ) -> Iterator[types.Row]:
+        meta_table = self.cursor.get_table_by_name(table_name)
+        if meta_table.partitions:
+            return (self._meta_row_to_row(it) for it in self._iter_partition_index_rows(meta_table, filter_))
+        if meta_table.engine == types.TableEngine.LSM:
+            return (self._meta_row_to_row(it) for it in self._iter_lsm_index_rows(meta_table, filter_))
+        if not self.indexer.is_ready(table_name, self.get_filter_keys(filter_)):
+            return self.get_rows_iterator(table_name, filter_)
+        return (
+            self._meta_row_to_row(meta_row)
+            for meta_row in self.indexer.get_rows_iterator_use_indexes(table_name, filter_)
+        )
+
+    def get_rows_data_iterator(
+        self,
+        table_name: str,
+        filter_: types.Filter | None = None,
+        use_index: bool = False,
+        after: str | None = None,
+        reverse: bool = False,
+        prefetch: int = 0,
+    ) -> Iterator[dict]:
+        if not use_index:
+            return self._get_resumable_iterator(
+                table_name, filter_, after, lambda meta_row: meta_row.data, reverse, prefetch,
+            )
+        if after or reverse:
+            raise ValueError('Continuation token and reverse order are not supported for select using index')
+        meta_table = self.cursor.get_table_by_name(table_name)
+        if meta_table.partitions:
+            return (meta_row.data for meta_row in self._iter_partition_index_rows(meta_table, filter_ or dict()))
+        if meta_table.engine == types.TableEngine.LSM:
+            return (meta_row.data for meta_row in self._iter_lsm_index_rows(meta_table, filter_ or dict()))
+        if not self.indexer.is_ready(table_name, self.get_filter_keys(filter_ or dict())):
+            return self._get_resumable_iterator(table_name, filter_, None, lambda meta_row: meta_row.data)
+        return (meta_row.data for meta_row in self.indexer.get_rows_iterator_use_indexes(table_name, filter_ or dict()))
+
+    def join(
+        self,
+        left_table: str,
+        right_table: str,
+        on: tuple[str, str],
+        left_filter: types.Filter | None = None,
+        right_filter: types.Filter | None = None,
+    ) -> Iterator[tuple[types.Row, types.Row]]:
+        left_meta = self.cursor.get_table_by_name(left_table)
+        right_meta = self.cursor.get_table_by_name(right_table)
+        left_key, right_key = on
+        for meta_table, key in [(left_meta, left_key), (right_meta, right_key)]:
+            if key not in meta_table.keys:
+                raise ValueError(f'Key {key} does not found in table {meta_table.name}')
+        if left_meta.keys[left_key] != right_meta.keys[right_key]:
+            raise ValueError(f'Join keys {left_key} and {right_key} have different types')
+        # filters are applied to each table before rows are joined
+        left_filter_copy = self.convert_filter(left_meta, left_filter or dict())
+        right_filter_copy = self.convert_filter(right_meta, right_filter or dict())
+        # rows of partitioned table are not in index of this database
+        right_indexed = right_key in right_meta.indexes and not right_meta.partitions
+        if right_indexed and self.indexer.is_ready(right_meta.name, [right_key]):
+            pairs = self._index_join(left_meta, right_meta, left_key, right_key, left_filter_copy, right_filter_copy)
+        else:
+            pairs = self._hash_join(left_meta, right_meta, left_key, right_key, left_filter_copy, right_filter_copy)
+        return ((self._meta_row_to_row(left), self._meta_row_to_row(right)) for left, right in pairs)
+
+    def _index_join(
+        self,
+        left_meta: types.MetaTable,
+        right_meta: types.MetaTable,
+        left_key: str,
+        right_key: str,
+        left_filter: types.Filter,
+        right_filter: types.Filter,
+    ) -> Generator[tuple[types.RowRecord, types.RowRecord], None, None]:
+        query_stats = self.cursor.stats
+        left_rows = (meta_row for _, _, meta_row in self._iter_meta_rows(left_meta, left_filter))
+        for batch in batched(left_rows, self.JOIN_BATCH_SIZE):
+            values = list(dict.fromkeys(meta_row.data[left_key] for meta_row in batch))
+            postings = self.indexer.get_offsets_for_values(right_meta, right_key, values)
+            right_rows = self.cursor.read_table_rows(right_meta, [ref for refs in postings.values() for ref in refs])
+            query_stats.rows_scanned += len(right_rows)
+            matches: dict[Any, list[types.RowRecord]] = {}
+            for value, refs in postings.items():
+                rows = [right_rows[ref] for ref in refs if right_rows[ref].data[right_key] == value]
+                matches[value] = [it for it in rows if self.is_row_fit_filter(it, right_filter)]
+                query_stats.rows_filtered += len(rows) - len(matches[value])
+            for meta_row in batch:
+                for right_row in matches[meta_row.data[left_key]]:
+                    yield meta_row, right_row
+
+    def _hash_join(
+        self,
+        left_meta: types.MetaTable,
+        right_meta: types.MetaTable,
+        left_key: str,
+        right_key: str,
+        left_filter: types.Filter,
+        right_filter: types.Filter,
+    ) -> Generator[tuple[types.RowRecord, types.RowRecord], None, None]:
+        # smaller table is kept in memory, rows of the other one are streamed
+        build_left = left_meta.rows_count < right_meta.rows_count
+        sides = [(left_meta, left_key, left_filter), (right_meta, right_key, right_filter)]
+        (build_meta, build_key, build_filter), (probe_meta, probe_key, probe_filter) = \
+            sides if build_left else sides[::-1]
+        built: dict[Any, list[types.RowRecord]] = {}
+        for _, _, meta_row in self._iter_meta_rows(build_meta, build_filter):
+            built.setdefault(meta_row.data[build_key], []).append(meta_row)
+        for _, _, meta_row in self._iter_meta_rows(probe_meta, probe_filter):
+            for match in built.get(meta_row.data[probe_key], []):
+                yield (match, meta_row) if build_left else (meta_row, match)
+
+    def export_rows(
+        self,
+        table_name: str,
+        path: str,
+        filter_: types.Filter | None = None,
+        use_index: bool = False,
+        limit: int = 0,
+        format_: FileFormat | None = None,
+        compress: bool | None = None,
+    ) -> int:
+        meta_table = self.cursor.get_table_by_name(table_name)
+        if use_index and not filter_:
+            raise ValueError('Filter cannot be empty for select using index')
+        rows_data = self.get_rows_data_iterator(table_name, filter_, use_index)
+        if limit:
+            rows_data = islice(rows_data, limit)
+        return write_records(path, list(meta_table.keys), rows_data, format_, compress)
+
+    @staticmethod
+    def _get_primary_key(meta_table: types.MetaTable) -> str:
+        if meta_table.primary_key is None:
+            raise ValueError(f'Table {meta_table.name} does not have primary key')
+        return meta_table.primary_key
+
+    def _get_by_primary_key(self, meta_table: types.MetaTable, value: Any) -> types.RowRecord | None:
+        primary_key = self._get_primary_key(meta_table)
+        query_stats = self.cursor.stats
+        if meta_table.engine == types.TableEngine.LSM:
+            data = self.cursor.get_lsm_store(meta_table).get(value)
+            query_stats.rows_scanned += 1
+            if data is None:
+                return None
+            query_stats.rows_returned += 1
+            return types.RowRecord(data=data)
+        for offset in self.indexer.get_offsets_for(meta_table, primary_key, value):
+            meta_row = self.cursor.read_table_row(meta_table, offset)
+            query_stats.rows_scanned += 1
+            # equal hashes of different values are not duplicates
+            if meta_row.data[primary_key] == value:
+                query_stats.rows_returned += 1
+                return meta_row
+        return None
+
+    def get(self, table_name: str, key: Any) -> types.Row | None:
+        meta_table = self.cursor.get_table_by_name(table_name)
+        value = self.cursor.convert_db_type_value(meta_table, self._get_primary_key(meta_table), key)
+        if meta_table.partitions:
+            return self._get_partitions(meta_table)[self._partition_of(meta_table, value)].get(table_name, value)
+        meta_row = self._get_by_primary_key(meta_table, value)
+        return None if meta_row is None else self._meta_row_to_row(meta_row)
+
+    def get_many(self, table_name: str, key: str | None, values: list[Any]) -> list[list[types.Row]]:
+        # rows for every value in request order, key is primary key if not set
+        meta_table = self.cursor.get_table_by_name(table_name)
+        key = key or self._get_primary_key(meta_table)
+        if key not in meta_table.keys:
+            raise ValueError(f'Key {key} does not found in table {table_name}')
+        converted = [self.cursor.convert_db_type_value(meta_table, key, it) for it in values]
+        if meta_table.partitions:
+            return self._get_many_partitioned(meta_table, key, converted)
+        if meta_table.engine == types.TableEngine.LSM:
+            found = {
+                meta_row.data[key]: [self._meta_row_to_row(meta_row)]
+                for meta_row in self._iter_lsm_index_rows(meta_table, {key: list(dict.fromkeys(converted))})
+            }
+            return [list(found.get(value, [])) for value in converted]
+        if not self.indexer.is_ready(table_name, [key]):
+            rows_by_value: dict[Any, list[types.Row]] = {}
+            for _, _, meta_row in self._iter_meta_rows(meta_table, {key: list(dict.fromkeys(converted))}):
+                rows_by_value.setdefault(meta_row.data[key], []).append(self._meta_row_to_row(meta_row))
+            return [rows_by_value.get(value, []) for value in converted]
+        postings = self.indexer.get_offsets_for_values(meta_table, key, list(dict.fromkeys(converted)))
+        meta_rows = self.cursor.read_table_rows(meta_table, [ref for refs in postings.values() for ref in refs])
+        query_stats = self.cursor.stats
+        query_stats.rows_scanned += len(meta_rows)
+        result = []
+        for value in converted:
+            rows = [
+                self._meta_row_to_row(meta_rows[ref])
+                for ref in postings[value]
+                if meta_rows[ref].data[key] == value
+            ]
+            query_stats.rows_returned += len(rows)
+            result.append(rows)
+        return result
+
+    def _get_many_partitioned(
+        self,
+        meta_table: types.MetaTable,
+        key: str,
+        values: list[Any],
+    ) -> list[list[types.Row]]:
+        partitions = self._get_partitions(meta_table)
+        unique = list(dict.fromkeys(values))
+        # values of partition key are asked only in their partitions
+        groups: dict[int, list[Any]] = {}
+        for value in unique:
+            numbers = [self._partition_of(meta_table, value)] if key == meta_table.partition_key \
+                else range(len(partitions))
+            for number in numbers:
+                groups.setdefault(number, []).append(value)
+        found: dict[Any, list[types.Row]] = {value: [] for value in unique}
+        for number, group in groups.items():
+            for value, rows in zip(group, partitions[number].get_many(meta_table.name, key, group)):
+                found[value].extend(rows)
+        return [list(found[value]) for value in values]
+
+    def _check_primary_keys(
+        self,
+        meta_table: types.MetaTable,
+        meta_rows: list[types.RowRecord],
+        seen: set[Any],
+    ) -> None:
+        if meta_table.primary_key is None:
+            return
+        for meta_row in meta_rows:
+            value = meta_row.data[meta_table.primary_key]
+            if value in seen or self._get_by_primary_key(meta_table, value) is not None:
+                raise ValueError(f'Duplicate primary key {value} in table {meta_table.name}')
+            seen.add(value)
 
     def insert_row(self, table_name: str, row: types.Row) -> None:
+        self._check_writable()
+        meta_table = self.cursor.get_table_by_name(table_name)
+        if meta_table.partitions:
+            # only partition of the row is locked
+            meta_row = self.cursor.preprocess_row_data(meta_table, types.RowRecord(row.data))
+            partition = self._get_partitions(meta_table)[
+                self._partition_of(meta_table, meta_row.data[meta_table.partition_key])
+            ]
+            partition.insert_row(table_name, types.Row.construct(data=meta_row.data))
+            self._sync_partition_rows(meta_table)
+            return
+        with self.cursor.lock:
+            meta_table = self.cursor.get_table_by_name(table_name)
+            meta_row = types.RowRecord(row.data)
+            if meta_table.primary_key is not None:
+                meta_row = self.cursor.preprocess_row_data(meta_table, meta_row)
+                self._check_primary_keys(meta_table, [meta_row], set())
+            meta_row, offset = self.cursor.write_row_meta(table_name, meta_row)
+            self.indexer.add_item(meta_table, meta_row, offset)
+
+    def import_rows(self, table_name: str, rows_data: Iterable[dict], batch_size: int = 1000) -> int:
+        self._check_writable()
         meta_table = self.cursor.get_table_by_name(table_name)
-        meta_row = types.MetaRow(data=row.data)
-        meta_row, offset = self.cursor.write_row_meta(table_name, meta_row)
-        self.indexer.add_item(meta_table, meta_row, offset)
+        if meta_table.partitions:
+            return self._import_partitioned_rows(meta_table, rows_data, batch_size)
+        first_offset = 0
+        amount = 0
+        # primary keys of imported rows, index is built after import
+        seen_keys: set[Any] = set()
+
+        def track_first_offset(moved_table: types.MetaTable, moves: list[tuple[int, int, dict]]) -> None:
+            nonlocal first_offset
+            if moved_table.id != meta_table.id:
+                return
+            for old_offset, offset, _ in moves:
+                if old_offset == first_offset:
+                    first_offset = offset
+
+        with self.cursor.lock:
+            self.cursor.row_move_hooks.append(track_first_offset)
+            try:
+                for batch in batched(rows_data, batch_size):
+                    meta_rows = self.cursor.convert_rows_data(meta_table, batch)
+                    self._check_primary_keys(meta_table, meta_rows, seen_keys)
+                    offsets = self.cursor.write_rows_meta(table_name, meta_rows)
+                    first_offset = first_offset or offsets[0]
+                    amount += len(offsets)
+            finally:
+                self.cursor.row_move_hooks.remove(track_first_offset)
+                if amount:
+                    self.indexer.build_for_table(table_name, start_offset=first_offset)
+        return amount
+
+    def _import_partitioned_rows(self, meta_table: types.MetaTable, rows_data: Iterable[dict], batch_size: int) -> int:
+        partitions = self._get_partitions(meta_table)
+        amount = 0
+        try:
+            for batch in batched(rows_data, batch_size):
+                by_partition: dict[int, list[dict]] = {}
+                for meta_row in self.cursor.convert_rows_data(meta_table, batch):
+                    number = self._partition_of(meta_table, meta_row.data[meta_table.partition_key])
+                    by_partition.setdefault(number, []).append(meta_row.data)
+                for number, partition_rows in by_partition.items():
+                    amount += partitions[number].import_rows(meta_table.name, partition_rows, batch_size)
+        finally:
+            self._sync_partition_rows(meta_table)
+        return amount
+
+    def aggregate(
+        self,
+        table_name: str,
+        aggregations: list[Aggregation],
+        group_by: list[str] | None = None,
+        filter_: types.Filter | None = None,
+        use_numpy: bool | None = None,
+    ) -> list[dict]:
+        meta_table = self.cursor.get_table_by_name(table_name)
+        aggregator = Aggregator(aggregations, group_by or [], meta_table.keys)
+        if use_numpy is not None:
+            aggregator.use_numpy = use_numpy
+        keys = aggregator.keys
+        if meta_table.engine == types.TableEngine.COLUMN:
+            filter_copy = self.convert_filter(meta_table, filter_ or dict())
+            for columns, size, _ in self._iter_column_blocks(meta_table, filter_copy, keys):
+                aggregator.add_block(columns, size)
+            return aggregator.result()
+
+        columns: dict[str, list] = {key: [] for key in keys}
+        size = 0
+        for meta_row in self._get_meta_rows_iterator(table_name, filter_):
+            data = meta_row.data
+            for key in keys:
+                columns[key].append(data[key])
+            size += 1
+            if size == self.COLUMN_BLOCK_SIZE:
+                aggregator.add_block(columns, size)
+                columns = {key: [] for key in keys}
+                size = 0
+        aggregator.add_block(columns, size)
+        return aggregator.result()
@@ -0,0 +1,247 @@
+import os
+import struct
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from .stats import QueryStats
+
+_PAGE_SIZE = 4096
+# local_depth, entries count, next overflow page, last overflow page (primary page only)
+_PAGE_HEADER = struct.Struct('>BHQQ')
+# value hash, row ref
+_ENTRY = struct.Struct('>Qq')
+_PAGE_CAPACITY = (_PAGE_SIZE - _PAGE_HEADER.size) // _ENTRY.size
+# global_depth, dirty flag, pages count
+_DIR_HEADER = struct.Struct('>BBQ')
+_DIR_ENTRY = struct.Struct('>Q')
+_MAX_DEPTH = 20
+
+
+@dataclass
+class HashIndex:
+    # extendible hashing: directory of 2 ** global_depth bucket pages addressed by low bits of value hash,
+    # bucket pages split on overflow, equal hashes which cannot be split go to overflow pages
+    path: str
+    cache_pages: int = 256
+    stats: QueryStats = field(default_factory=QueryStats)
+
+    def __post_init__(self):
+        self.dir_path = f'{self.path}.dir'
+        self.pages: OrderedDict[int, bytearray] = OrderedDict()
+        self.dirty_pages: set[int] = set()
+        self.valid = False
+        if not os.path.exists(self.path) or not os.path.exists(self.dir_path):
+            self.clear()
+            # rows may exist without index, index has to be built
+            self.valid = False
+            return
+        with open(self.dir_path, 'rb') as f:
+            self.stats.file_opens += 1
+            data = f.read()
+        self.stats.bytes_read += len(data)
+        self.global_depth, dirty, self.pages_count = _DIR_HEADER.unpack_from(data)
+        self.directory = [it[0] for it in _DIR_ENTRY.iter_unpack(data[_DIR_HEADER.size:])]
+        self.dirty = bool(dirty)
+        self.valid = not self.dirty and len(self.directory) == 1 << self.global_depth
+
+    def clear(self) -> None:
+        self.pages.clear()
+        self.dirty_pages.clear()
+        self.global_depth = 0
+        # page 0 is reserved so 0 means no page
+        self.pages_count = 1
+        self.directory = [self._new_page(0)]
+        with open(self.path, 'wb'):
+            pass
+        self.dirty = False
+        self._write_directory(dirty=True)
+        self.valid = True
+
+    def _write_directory(self, dirty: bool) -> None:
+        data = _DIR_HEADER.pack(self.global_depth, int(dirty), self.pages_count) + b''.join(
+            _DIR_ENTRY.pack(it) for it in self.directory
+        )
+        with open(self.dir_path, 'wb') as f:
+            self.stats.file_opens += 1
+            self.stats.bytes_written += len(data)
+            f.write(data)
+        self.dirty = dirty
+
+    def _write_directory_entries(self, positions: list[int]) -> None:
+        with open(self.dir_path, 'r+b') as f:
+            self.stats.file_opens += 1
+            for position in positions:
+                self.stats.seeks += 1
+                f.seek(_DIR_HEADER.size + position * _DIR_ENTRY.size)
+                self.stats.bytes_written += _DIR_ENTRY.size
+                f.write(_DIR_ENTRY.pack(self.directory[position]))
+
+    def _mark_dirty(self) -> None:
+        if not self.dirty:
+            self._write_directory(dirty=True)
+
+    def _write_pages(self, page_numbers: list[int]) -> None:
+        if not page_numbers:
+            return
+        with open(self.path, 'r+b') as f:
+            self.stats.file_opens += 1
+            for page_no in sorted(page_numbers):
+                self.stats.seeks += 1
+                f.seek(page_no * _PAGE_SIZE)
+                self.stats.bytes_written += _PAGE_SIZE
+                f.write(self.pages[page_no])
+        self.dirty_pages.difference_update(page_numbers)
+
+    def _cache_page(self, page_no: int, page: bytearray) -> None:
+        self.pages[page_no] = page
+        self.pages.move_to_end(page_no)
+        while len(self.pages) > self.cache_pages:
+            evicted = next(iter(self.pages))
+            if evicted in self.dirty_pages:
+                self._write_pages([evicted])
+            del self.pages[evicted]
+
+    def _read_page(self, page_no: int) -> bytearray:
+        page = self.pages.get(page_no)
+        if page is not None:
+            self.stats.cache_hits += 1
+            self.pages.move_to_end(page_no)
+            return page
+        self.stats.cache_misses += 1
+        with open(self.path, 'rb') as f:
+            self.stats.file_opens += 1
+            self.stats.seeks += 1
+            f.seek(page_no * _PAGE_SIZE)
+            page = bytearray(f.read(_PAGE_SIZE))
+        self.stats.bytes_read += len(page)
+        self._cache_page(page_no, page)
+        return page
+
+    def _new_page(self, local_depth: int) -> int:
+        page_no = self.pages_count
+        self.pages_count += 1
+        page = bytearray(_PAGE_SIZE)
+        _PAGE_HEADER.pack_into(page, 0, local_depth, 0, 0, 0)
+        self.dirty_pages.add(page_no)
+        self._cache_page(page_no, page)
+        return page_no
+
+    def _set_header(self, page_no: int, *header: int) -> None:
+        _PAGE_HEADER.pack_into(self._read_page(page_no), 0, *header)
+        self.dirty_pages.add(page_no)
+
+    def _chain(self, page_no: int) -> list[int]:
+        chain = []
+        while page_no:
+            chain.append(page_no)
+            page_no = _PAGE_HEADER.unpack_from(self._read_page(page_no))[2]
+        return chain
+
+    def _entries(self, page_no: int) -> list[tuple[int, int]]:
+        page = self._read_page(page_no)
+        count = _PAGE_HEADER.unpack_from(page)[1]
+        return list(_ENTRY.iter_unpack(page[_PAGE_HEADER.size:_PAGE_HEADER.size + count * _ENTRY.size]))
+
+    def _write_chain(self, local_depth: int, entries: list[tuple[int, int]], chain: list[int]) -> int:
+        chunks = [entries[i:i + _PAGE_CAPACITY] for i in range(0, len(entries), _PAGE_CAPACITY)] or [[]]
+        chain = chain[:len(chunks)]
+        while len(chain) < len(chunks):
+            chain.append(self._new_page(local_depth))
+        for i, (page_no, chunk) in enumerate(zip(chain, chunks)):
+            page = self._read_page(page_no)
+            next_page = chain[i + 1] if i + 1 < len(chain) else 0
+            last_page = chain[-1] if i == 0 and len(chain) > 1 else 0
+            _PAGE_HEADER.pack_into(page, 0, local_depth, len(chunk), next_page, last_page)
+            for j, entry in enumerate(chunk):
+                _ENTRY.pack_into(page, _PAGE_HEADER.size + j * _ENTRY.size, *entry)
+            self.dirty_pages.add(page_no)
+        return chain[0]
+
+    def _split(self, page_no: int, local_depth: int) -> None:
+        if local_depth == self.global_depth:
+            self.directory = self.directory + self.directory
+            self.global_depth += 1
+            self._write_directory(dirty=True)
+        chain = self._chain(page_no)
+        entries = [entry for it in chain for entry in self._entries(it)]
+        bit = 1 << local_depth
+        self._write_chain(local_depth + 1, [it for it in entries if not it[0] & bit], chain)
+        new_page_no = self._write_chain(local_depth + 1, [it for it in entries if it[0] & bit], [])
+        positions = [
+            i for i, it in enumerate(self.directory)
+            if it == page_no and i & bit
+        ]
+        for i in positions:
+            self.directory[i] = new_page_no
+        if not self.dirty:
+            self._write_directory(dirty=True)
+        else:
+            self._write_directory_entries(positions)
+
+    def _bucket(self, hash_v: int) -> int:
+        return self.directory[hash_v & ((1 << self.global_depth) - 1)]
+
+    def add(self, hash_v: int, ref: int) -> None:
+        self._mark_dirty()
+        while True:
+            page_no = self._bucket(hash_v)
+            local_depth, count, next_page, last_page = _PAGE_HEADER.unpack_from(self._read_page(page_no))
+            tail_no = last_page or page_no
+            tail = self._read_page(tail_no)
+            tail_count = _PAGE_HEADER.unpack_from(tail)[1]
+            if tail_count < _PAGE_CAPACITY:
+                _ENTRY.pack_into(tail, _PAGE_HEADER.size + tail_count * _ENTRY.size, hash_v, ref)
+                tail_header = list(_PAGE_HEADER.unpack_from(tail))
+                tail_header[1] += 1
+                _PAGE_HEADER.pack_into(tail, 0, *tail_header)
+                self.dirty_pages.add(tail_no)
+                return
+            # lowest bit which separates bucket hashes, splits below it cannot move any entry
+            diff = 0
+            for it_hash, _ in self._entries(page_no):
+                diff |= it_hash ^ hash_v
+            if not diff or (diff & -diff).bit_length() > _MAX_DEPTH:
+                overflow_no = self._new_page(local_depth)
+                tail_header = list(_PAGE_HEADER.unpack_from(self._read_page(tail_no)))
+                tail_header[2] = overflow_no
+                self._set_header(tail_no, *tail_header)
+                primary_header = list(_PAGE_HEADER.unpack_from(self._read_page(page_no)))
+                primary_header[3] = overflow_no
+                self._set_header(page_no, *primary_header)
+                continue
+            self._split(page_no, local_depth)
+
+    def get(self, hash_v: int) -> list[int]:
+        return [
+            ref
+            for page_no in self._chain(self._bucket(hash_v))
+            for it_hash, ref in self._entries(page_no)
+            if it_hash == hash_v
+        ]
+
+    def replace(self, hash_v: int, old_ref: int, ref: int) -> None:
+        self.replace_many({hash_v: {old_ref: ref}})
+
+    def replace_many(self, refs: dict[int, dict[int, int]]) -> None:
+        # { value hash: { old ref: ref } }, chain of each bucket is scanned once
+        for bucket_no in {self._bucket(hash_v) for hash_v in refs}:
+            for page_no in self._chain(bucket_no):
+                for i, (hash_v, old_ref) in enumerate(self._entries(page_no)):
+                    ref = refs.get(hash_v, {}).get(old_ref)
+                    if ref is None:
+                        continue
+                    self._mark_dirty()
+                    _ENTRY.pack_into(self._read_page(page_no), _PAGE_HEADER.size + i * _ENTRY.size, hash_v, ref)
+                    self.dirty_pages.add(page_no)
+
+    def flush(self) -> None:
+        self._write_pages([it for it in self.dirty_pages if it in self.pages])
+        if self.dirty:
+            self._write_directory(dirty=False)
+
+    def remove(self) -> None:
+        self.pages.clear()
+        self.dirty_pages.clear()
+        for path in [self.path, self.dir_path]:
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,11 +1,14 @@
 import hashlib
 import json
+import threading
 from dataclasses import dataclass, field
-from itertools import chain
-from typing import Any, Generator
+from itertools import chain, islice
+from typing import Any, Generator, Iterable
 
 from . import types
 from .cursor import DatabaseCursor
+from .hashindex import HashIndex
+from .mvcc import Snapshot
 
 
 @dataclass
@@ -13,6 +16,20 @@ class Indexer:
     cursor: DatabaseCursor
     # { table_name: { key: { hash: [ offset, ... ] } } }
     index_dict: dict[str, dict[str, dict[str, list[int]]]] = field(default_factory=dict)
+    # hot bucket pages kept in memory for every on disk index
+    cache_pages: int = 256
+    # rows indexed by background build between releases of cursor lock
+    build_chunk_rows: int = 1024
+
+    def __post_init__(self):
+        self.cursor.row_move_hooks.append(self.move_rows)
+        # { (table_id, key): HashIndex }
+        self.hash_indexes: dict[tuple[int, str], HashIndex] = {}
+        # { table_name: { key, ... } } indexes which are being built in background
+        self.pending: dict[str, set[str]] = {}
+        # { table_name: { key: error } } failed background builds, their keys are dropped from table indexes
+        self.errors: dict[str, dict[str, str]] = {}
+        self.builds: list[threading.Thread] = []
 
     @staticmethod
     def get_md_5_bytes_hash(bytes):
@@ -23,7 +40,33 @@ class Indexer:
     def hash(it: Any):
         return Indexer.get_md_5_bytes_hash(str(it).encode('utf-8'))
 
-    def _add_val(self, meta_table: types.MetaTable, key: str, meta_row: types.MetaRow, row_offset: int):
+    @staticmethod
+    def disk_hash(it: Any) -> int:
+        return int(Indexer.hash(it)[:16], 16)
+
+    def _open_hash_index(self, meta_table: types.MetaTable, key: str) -> HashIndex:
+        index_key = (meta_table.id, key)
+        if index_key not in self.hash_indexes:
+            path = f'{self.cursor.db_file}.t{meta_table.id}.i{list(meta_table.keys).index(key)}'
+            self.hash_indexes[index_key] = HashIndex(path, self.cache_pages, self.cursor.stats)
+        return self.hash_indexes[index_key]
+
+    def get_hash_index(self, meta_table: types.MetaTable, key: str) -> HashIndex:
+        hash_index = self._open_hash_index(meta_table, key)
+        if not hash_index.valid:
+            # index was not flushed after last changes
+            self._build(meta_table, [key])
+        return hash_index
+
+    def _add_val(self, meta_table: types.MetaTable, key: str, meta_row: types.RowRecord, row_offset: int):
+        if key in meta_table.disk_indexes:
+            hash_index = self._open_hash_index(meta_table, key)
+            if not hash_index.valid:
+                # rebuild reads the row which is already written, it must not be added twice
+                self._build(meta_table, [key])
+                return
+            hash_index.add(self.disk_hash(meta_row.data[key]), row_offset)
+            return
         if meta_table.name not in self.index_dict:
             self.index_dict[meta_table.name] = {}
         if key not in self.index_dict[meta_table.name]:
@@ -34,38 +77,174 @@ class Indexer:
         if row_offset not in self.index_dict[meta_table.name][key][hash_v]:
             self.index_dict[meta_table.name][key][hash_v].append(row_offset)
 
-    def add_item(self, meta_table: types.MetaTable, meta_row: types.MetaRow, row_offset: int):
+    def add_item(self, meta_table: types.MetaTable, meta_row: types.RowRecord, row_offset: int):
         for key in meta_table.indexes:
             self._add_val(meta_table, key, meta_row, row_offset)
 
+    def move_rows(self, meta_table: types.MetaTable, moves: list[tuple[int, int, dict]]):
+        table_index = self.index_dict.get(meta_table.name, {})
+        for key in meta_table.indexes:
+            disk = key in meta_table.disk_indexes
+            hash_func = self.disk_hash if disk else self.hash
+            # { value hash: { old offset: offset } }, each posting list is rewritten once
+            remaps: dict[Any, dict[int, int]] = {}
+            for old_offset, offset, data in moves:
+                remaps.setdefault(hash_func(data[key]), {})[old_offset] = offset
+            if disk:
+                self.get_hash_index(meta_table, key).replace_many(remaps)
+                continue
+            key_index = table_index.get(key, {})
+            for hash_v, remap in remaps.items():
+                offsets = key_index.get(hash_v)
+                if offsets:
+                    offsets[:] = [remap.get(it, it) for it in offsets]
+
     def get_offsets_for(self, meta_table: types.MetaTable, key: str, value: Any):
+        if key in meta_table.disk_indexes:
+            offsets = self.get_hash_index(meta_table, key).get(self.disk_hash(value))
+            self.cursor.stats.index_postings += len(offsets)
+            return offsets
         if key not in self.index_dict[meta_table.name]:
             raise ValueError(f'Index for key {key} in table {meta_table.name} does not exists')
         hash_v = self.hash(value)
-        return self.index_dict[meta_table.name][key].get(hash_v, [])
+        offsets = self.index_dict[meta_table.name][key].get(hash_v, [])
+        self.cursor.stats.index_postings += len(offsets)
+        return offsets
+
+    def get_offsets_for_values(self, meta_table: types.MetaTable, key: str, values: list[Any]) -> dict[Any, list[int]]:
+        if key not in meta_table.indexes:
+            raise ValueError(f'Index for key {key} does not present in table {meta_table.name}')
+        if key in meta_table.disk_indexes:
+            hash_index = self.get_hash_index(meta_table, key)
+            hashes = {value: self.disk_hash(value) for value in values}
+            # values of the same bucket are probed one after another while its page is cached
+            postings = {
+                value: hash_index.get(hash_v)
+                for value, hash_v in sorted(hashes.items(), key=lambda it: it[1] & ((1 << hash_index.global_depth) - 1))
+            }
+        else:
+            key_index = self.index_dict.get(meta_table.name, {}).get(key, {})
+            postings = {value: key_index.get(self.hash(value), []) for value in values}
+        self.cursor.stats.index_postings += sum(len(it) for it in postings.values())
+        return postings
 
-    def build_for_table(self, table_name: str):
+    def _build(self, meta_table: types.MetaTable, keys: list[str], start_offset: int | None = None):
+        if not keys:
+            return
+        table_index = self.index_dict.setdefault(meta_table.name, {})
+        disk_keys = [key for key in keys if key in meta_table.disk_indexes]
+        memory_keys = [key for key in keys if key not in meta_table.disk_indexes]
+        hash_indexes = [self._open_hash_index(meta_table, key) for key in disk_keys]
+        if start_offset is not None and not all(it.valid for it in hash_indexes):
+            self._build(meta_table, disk_keys)
+            hash_indexes = []
+            disk_keys = []
+        if start_offset is None:
+            for hash_index in hash_indexes:
+                hash_index.clear()
+        built: dict[str, dict[str, list[int]]] = {key: {} for key in memory_keys}
+        for offset, meta_row in self.cursor.iter_table_rows(meta_table, start_offset):
+            for key in memory_keys:
+                built[key].setdefault(self.hash(meta_row.data[key]), []).append(offset)
+            for key, hash_index in zip(disk_keys, hash_indexes):
+                hash_index.add(self.disk_hash(meta_row.data[key]), offset)
+        for key, postings in built.items():
+            key_index = table_index.setdefault(key, {})
+            for hash_v, offsets in postings.items():
+                key_index.setdefault(hash_v, []).extend(offsets)
+
+    def build_for_table(self, table_name: str, start_offset: int | None = None):
         meta_table = self.cursor.get_table_by_name(table_name)
-        offset = meta_table.first_row_offset
-        while offset:
-            meta_row = self.cursor.read_row_meta(offset)
-            self.add_item(meta_table, meta_row, offset)
-            offset = meta_row.next_row_offset
+        self.index_dict.setdefault(meta_table.name, {})
+        self._build(meta_table, meta_table.indexes, start_offset)
 
     def build_for_table_key(self, table_name: str, key: str):
+        self.build_for_table_keys(table_name, [key])
+
+    def build_for_table_keys(self, table_name: str, keys: list[str], background: bool = False):
         meta_table = self.cursor.get_table_by_name(table_name)
-        if key not in meta_table.keys:
-            raise ValueError(f'Key {key} does not present in table {table_name}')
-        offset = meta_table.first_row_offset
-        while offset:
-            meta_row = self.cursor.read_row_meta(offset)
-            self._add_val(meta_table, key, meta_row, offset)
-            offset = meta_row.next_row_offset
+        for key in keys:
+            if key not in meta_table.keys:
+                raise ValueError(f'Key {key} does not present in table {table_name}')
+        if not background:
+            self._build(meta_table, keys)
+            return
+        with self.cursor.lock:
+            # rows written after the snapshot are added by writes, older rows by build
+            table_index = self.index_dict.setdefault(meta_table.name, {})
+            for key in keys:
+                if key in meta_table.disk_indexes:
+                    self._open_hash_index(meta_table, key).clear()
+                else:
+                    table_index[key] = {}
+            self.pending.setdefault(meta_table.name, set()).update(keys)
+            snapshot = self.cursor.begin_snapshot()
+        build = threading.Thread(target=self._build_in_background, args=(meta_table, keys, snapshot), daemon=True)
+        self.builds.append(build)
+        build.start()
+
+    def _build_in_background(self, meta_table: types.MetaTable, keys: list[str], snapshot: Snapshot):
+        rows = None
+        error = None
+        try:
+            while True:
+                with self.cursor.lock:
+                    if rows is None:
+                        # first row may have moved into compressed block since the build started
+                        start_ref = None if meta_table.engine == types.TableEngine.COLUMN \
+                            else self.cursor.get_table_by_name(meta_table.name).first_row_offset
+                        rows = self.cursor.iter_table_rows(meta_table, start_ref, snapshot=snapshot)
+                    chunk = list(islice(rows, self.build_chunk_rows))
+                    for offset, meta_row in chunk:
+                        for key in keys:
+                            self._add_built(meta_table, key, meta_row, offset)
+                if not chunk:
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            with self.cursor.lock:
+                if rows is not None:
+                    rows.close()
+                self.cursor.release_snapshot(snapshot)
+                if error is not None:
+                    # partially built index would miss rows, selects scan the table without it
+                    self._drop_failed(meta_table.name, keys, error)
+                self.pending[meta_table.name].difference_update(keys)
+
+    def _drop_failed(self, table_name: str, keys: list[str], error: Exception) -> None:
+        table = self.cursor.get_table_by_name(table_name)
+        table_copy = table.copy(deep=True)
+        table_copy.indexes = [key for key in table.indexes if key not in keys]
+        table_copy.disk_indexes = [key for key in table.disk_indexes if key not in keys]
+        self.cursor.override_table_meta(table_copy, override_table=table_name)
+        for key in keys:
+            self.index_dict.get(table_name, {}).pop(key, None)
+            self.hash_indexes.pop((table.id, key), None)
+        self.errors.setdefault(table_name, {}).update({key: str(error) for key in keys})
+
+    def _add_built(self, meta_table: types.MetaTable, key: str, meta_row: types.RowRecord, row_offset: int):
+        # rows of build are not indexed yet, no need to check postings for duplicates
+        if key in meta_table.disk_indexes:
+            self._open_hash_index(meta_table, key).add(self.disk_hash(meta_row.data[key]), row_offset)
+        else:
+            self.index_dict[meta_table.name][key].setdefault(self.hash(meta_row.data[key]), []).append(row_offset)
+
+    def is_ready(self, table_name: str, keys: Iterable[str]) -> bool:
+        return not self.pending.get(table_name, set()).intersection(keys)
+
+    def wait(self):
+        for build in self.builds:
+            build.join()
+        self.builds.clear()
 
     def save(self):
+        self.wait()
         print('Saving index to file')
         with open(f'{self.cursor.db_file}.index.json', 'w') as f:
             json.dump(self.index_dict, f, indent=2)
+        for hash_index in self.hash_indexes.values():
+            hash_index.flush()
 
     def load(self):
         print('Loading index from file')
@@ -131,9 +310,14 @@ class Indexer:
         self,
         table_name: str,
         filter_: types.Filter,
-    ) -> Generator[types.MetaRow, None, None]:
+    ) -> Generator[types.RowRecord, None, None]:
         meta_table = self.cursor.get_table_by_name(table_name)
         offsets = self.get_filter_indexes_offsets(meta_table, filter_)
-        for offset in offsets:
-            meta_row = self.cursor.read_row_meta(offset)
-            yield meta_row
+        snapshot = self.cursor.begin_snapshot()
+        try:
+            for _, meta_row in self.cursor.iter_snapshot_rows(meta_table, list(offsets), snapshot):
+                self.cursor.stats.rows_scanned += 1
+                self.cursor.stats.rows_returned += 1
+                yield meta_row
+        finally:
+            self.cursor.release_snapshot(snapshot)
@@ -0,0 +1,241 @@
+import random
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import accumulate
+from typing import Any, Callable, Iterator
+
+from . import types
+from .db import Database
+
+DEFAULT_CARDINALITY = 1000
+DEFAULT_ZIPF_S = 1.1
+
+
+class Distribution(types.StrEnum):
+    UNIFORM = 'uniform'
+    ZIPF = 'zipf'
+    SEQUENTIAL = 'seq'
+    CARDINALITY = 'card'
+
+
+@dataclass(frozen=True)
+class KeyDistribution:
+    key: str
+    distribution: Distribution
+    # upper bound of uniform and zipf numbers, number of card values
+    cardinality: int | None = None
+    # zipf exponent
+    s: float = DEFAULT_ZIPF_S
+
+    @classmethod
+    def parse(cls, s: str) -> 'KeyDistribution':
+        key, _, spec = s.partition('=')
+        name, _, param = spec.partition(':')
+        try:
+            distribution = Distribution(name.strip().lower())
+        except ValueError:
+            raise ValueError(f'Unknown distribution {s}, use key={"|".join(Distribution.values())}[:param]')
+        key, param = key.strip(), param.strip()
+        if not key:
+            raise ValueError(f'Distribution {s} requires a key')
+        if not param:
+            return cls(key, distribution)
+        try:
+            if distribution == Distribution.ZIPF:
+                return cls(key, distribution, s=float(param))
+            cardinality = int(param)
+        except ValueError:
+            raise ValueError(f'Incorrect distribution parameter {s}')
+        if cardinality <= 0:
+            raise ValueError(f'Distribution {s} requires positive parameter')
+        return cls(key, distribution, cardinality)
+
+
+@dataclass
+class RowGenerator:
+    # rows of every batch depend only on seed and batch number, so generated rows do not
+    # depend on the number of worker processes
+    keys: dict[str, types.DbType]
+    distributions: dict[str, KeyDistribution] = field(default_factory=dict)
+    seed: int = 0
+    batch_size: int = 1000
+    # number of the first generated row for seq keys
+    first_row: int = 0
+
+    def __post_init__(self):
+        for key in self.distributions:
+            if key not in self.keys:
+                raise ValueError(f'Unknown distribution key {key}')
+        self._zipf_cdfs = {
+            key: list(accumulate(1 / (k ** it.s) for k in range(1, (it.cardinality or DEFAULT_CARDINALITY) + 1)))
+            for key, it in self.distributions.items()
+            if it.distribution == Distribution.ZIPF
+        }
+        # fixed set of values of card keys
+        self._values = {
+            key: self._random_values(key, it.cardinality or DEFAULT_CARDINALITY)
+            for key, it in self.distributions.items()
+            if it.distribution == Distribution.CARDINALITY
+        }
+
+    def _random_value(self, rnd: random.Random, key: str) -> Any:
+        if self.keys[key] == types.DbType.INT:
+            return rnd.randrange(DEFAULT_CARDINALITY)
+        return f'{rnd.getrandbits(64):016x}'
+
+    def _random_values(self, key: str, amount: int) -> list[Any]:
+        rnd = random.Random(f'{self.seed}-{key}')
+        if self.keys[key] == types.DbType.INT:
+            return rnd.sample(range(1 << 31), amount)
+        return [f'{rnd.getrandbits(64):016x}' for _ in range(amount)]
+
+    def _value(self, rnd: random.Random, key: str, row_number: int) -> Any:
+        spec = self.distributions.get(key)
+        if spec is None or spec.distribution == Distribution.UNIFORM and spec.cardinality is None:
+            return self._random_value(rnd, key)
+        if spec.distribution == Distribution.CARDINALITY:
+            values = self._values[key]
+            return values[rnd.randrange(len(values))]
+        if spec.distribution == Distribution.SEQUENTIAL:
+            number = self.first_row + row_number
+        elif spec.distribution == Distribution.ZIPF:
+            cdf = self._zipf_cdfs[key]
+            number = bisect_left(cdf, rnd.random() * cdf[-1])
+        else:
+            number = rnd.randrange(spec.cardinality)
+        return number if self.keys[key] == types.DbType.INT else f'{key}-{number}'
+
+    def batch(self, number: int, amount: int | None = None) -> list[dict]:
+        rnd = random.Random(f'{self.seed}-{number}')
+        start = number * self.batch_size
+        return [
+            {key: self._value(rnd, key, row_number) for key in self.keys}
+            for row_number in range(start, start + (amount or self.batch_size))
+        ]
+
+    def _batch_sizes(self, amount: int) -> list[int]:
+        return [min(self.batch_size, amount - start) for start in range(0, amount, self.batch_size)]
+
+    def iter_batches(self, amount: int) -> Iterator[list[dict]]:
+        # batches are generated one by one, only one of them is kept in memory
+        for number, size in enumerate(self._batch_sizes(amount)):
+            yield self.batch(number, size)
+
+    def batches(self, amount: int, workers: int = 1) -> list[list[dict]]:
+        sizes = self._batch_sizes(amount)
+        if workers <= 1:
+            return list(self.iter_batches(amount))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.batch, range(len(sizes)), sizes))
+
+
+def table_generator(
+    database: Database,
+    table_name: str,
+    distributions: list[KeyDistribution] | None = None,
+    seed: int = 0,
+    batch_size: int = 1000,
+) -> RowGenerator:
+    meta_table = database.cursor.get_table_by_name(table_name)
+    by_key = {it.key: it for it in distributions or []}
+    primary_key = meta_table.primary_key
+    if primary_key is not None and primary_key not in by_key:
+        # new unique keys after existing rows
+        by_key[primary_key] = KeyDistribution(primary_key, Distribution.SEQUENTIAL)
+    return RowGenerator(meta_table.keys, by_key, seed, batch_size, meta_table.rows_count)
+
+
+def percentile(values: list[float], p: float) -> float:
+    # nearest rank of sorted values
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+@dataclass
+class LoadReport:
+    elapsed: float = 0.0
+    rows_written: int = 0
+    # { operation: [ latency seconds, ... ] }
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+
+    def add(self, operation: str, latency: float) -> None:
+        self.latencies.setdefault(operation, []).append(latency)
+
+    @property
+    def ops(self) -> int:
+        return sum(len(it) for it in self.latencies.values())
+
+    def format(self) -> str:
+        lines = [
+            f'{"elapsed":<16} {self.elapsed:.6f}',
+            f'{"rows_written":<16} {self.rows_written}',
+            f'{"ops/sec":<16} {self.ops / self.elapsed if self.elapsed else 0:.1f}',
+            f'{"rows/sec":<16} {self.rows_written / self.elapsed if self.elapsed else 0:.1f}',
+        ]
+        for operation, values in self.latencies.items():
+            values = sorted(values)
+            lines.append(
+                f'{operation:<16} ops={len(values)} '
+                + ' '.join(f'p{p}={percentile(values, p) * 1000:.3f}ms' for p in (50, 95, 99))
+                + f' max={values[-1] * 1000:.3f}ms'
+            )
+        return '\n'.join(lines)
+
+
+def _read_operation(database: Database, meta_table: types.MetaTable) -> tuple[str, Callable[[dict], Any]]:
+    if meta_table.primary_key is not None:
+        key = meta_table.primary_key
+        return 'get', lambda data: database.get(meta_table.name, data[key])
+    if meta_table.indexes:
+        key = meta_table.indexes[0]
+        return 'mget', lambda data: database.get_many(meta_table.name, key, [data[key]])
+    key = list(meta_table.keys)[0]
+    return 'select', lambda data: next(iter(database.get_rows_iterator(meta_table.name, {key: data[key]})), None)
+
+
+def run_load(
+    database: Database,
+    table_name: str,
+    amount: int,
+    generator: RowGenerator,
+    workers: int = 1,
+    read_ratio: float = 0.0,
+) -> LoadReport:
+    # rows are generated before the clock starts, only database operations are measured
+    meta_table = database.cursor.get_table_by_name(table_name)
+    if not 0 <= read_ratio < 1:
+        raise ValueError(f'Read ratio {read_ratio} is out of [0, 1) range')
+    batches = generator.batches(amount, workers)
+    report = LoadReport()
+    clock = time.perf_counter
+    start = clock()
+    if not read_ratio:
+        for batch in batches:
+            op_start = clock()
+            report.rows_written += database.import_rows(table_name, batch, len(batch))
+            report.add('import', clock() - op_start)
+        report.elapsed = clock() - start
+        return report
+
+    # single row writes mixed with reads of already written rows
+    rnd = random.Random(f'{generator.seed}-ops')
+    read_name, read = _read_operation(database, meta_table)
+    insert = partial(database.insert_row, table_name)
+    written: list[dict] = []
+    for data in (it for batch in batches for it in batch):
+        while written and rnd.random() < read_ratio:
+            target = written[rnd.randrange(len(written))]
+            op_start = clock()
+            read(target)
+            report.add(read_name, clock() - op_start)
+        op_start = clock()
+        insert(types.Row.construct(data=data))
+        report.add('insert', clock() - op_start)
+        report.rows_written += 1
+        written.append(data)
+    report.elapsed = clock() - start
+    return report
@@ -0,0 +1,296 @@
+import base64
+import hashlib
+import heapq
+import json
+import os
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from io import BufferedReader
+from operator import itemgetter
+from typing import Any, Iterable, Iterator
+
+from .stats import QueryStats
+
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+# every n-th row of sorted run is kept in its sparse index
+SPARSE_INDEX_INTERVAL = 64
+
+# (sort key, row data), sort key is primary key value or insert sequence number
+Entry = tuple[Any, dict]
+
+
+class BloomFilter:
+    def __init__(self, size: int, hashes: int = BLOOM_HASHES, bits: bytearray | None = None):
+        self.size = max(size, 8)
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+
+    @classmethod
+    def for_keys(cls, amount: int) -> 'BloomFilter':
+        return cls(amount * BLOOM_BITS_PER_KEY)
+
+    def _positions(self, key: Any) -> Iterator[int]:
+        # double hashing of one md5 digest, json keeps 1 and '1' different
+        digest = hashlib.md5(json.dumps(key).encode('utf-8')).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: Any) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: Any) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def dump(self) -> dict:
+        return {'size': self.size, 'hashes': self.hashes, 'bits': base64.b64encode(self.bits).decode('ascii')}
+
+    @classmethod
+    def load(cls, data: dict) -> 'BloomFilter':
+        return cls(data['size'], data['hashes'], bytearray(base64.b64decode(data['bits'])))
+
+
+@dataclass
+class SortedRun:
+    # immutable file of entries sorted by key, one json line per entry
+    path: str
+    rows: int
+    min_key: Any
+    max_key: Any
+    # [ [ key, offset of entry line ], ... ] of every SPARSE_INDEX_INTERVAL entry
+    sparse: list[list]
+    bloom: BloomFilter
+
+    @property
+    def meta_path(self) -> str:
+        return f'{self.path}.meta'
+
+    @classmethod
+    def write(cls, path: str, entries: Iterable[Entry], expected_rows: int, stats: QueryStats) -> 'SortedRun':
+        bloom = BloomFilter.for_keys(expected_rows)
+        sparse = []
+        rows = 0
+        offset = 0
+        min_key = max_key = None
+        with open(path, 'wb') as f:
+            stats.file_opens += 1
+            for key, data in entries:
+                if rows % SPARSE_INDEX_INTERVAL == 0:
+                    sparse.append([key, offset])
+                line = json.dumps([key, data]).encode('utf-8') + b'\n'
+                f.write(line)
+                offset += len(line)
+                bloom.add(key)
+                min_key = key if rows == 0 else min_key
+                max_key = key
+                rows += 1
+        run = cls(path, rows, min_key, max_key, sparse, bloom)
+        meta = {'rows': rows, 'min_key': min_key, 'max_key': max_key, 'sparse': sparse, 'bloom': bloom.dump()}
+        with open(run.meta_path, 'w') as f:
+            json.dump(meta, f)
+        stats.bytes_written += offset
+        return run
+
+    @classmethod
+    def load(cls, path: str) -> 'SortedRun':
+        with open(f'{path}.meta', 'r') as f:
+            meta = json.load(f)
+        bloom = BloomFilter.load(meta['bloom'])
+        return cls(path, meta['rows'], meta['min_key'], meta['max_key'], meta['sparse'], bloom)
+
+    def open(self, stats: QueryStats) -> BufferedReader:
+        stats.file_opens += 1
+        return open(self.path, 'rb')
+
+    @staticmethod
+    def iter_entries(f: BufferedReader, stats: QueryStats) -> Iterator[Entry]:
+        with f:
+            for line in f:
+                stats.bytes_read += len(line)
+                stats.records_decoded += 1
+                key, data = json.loads(line)
+                yield key, data
+
+    def get(self, key: Any, stats: QueryStats) -> dict | None:
+        if self.rows == 0 or key < self.min_key or key > self.max_key or key not in self.bloom:
+            stats.blocks_skipped += 1
+            return None
+        # sparse index gives the only part of run which can contain the key
+        i = bisect_right([it[0] for it in self.sparse], key) - 1
+        start = self.sparse[i][1]
+        stop = self.sparse[i + 1][1] if i + 1 < len(self.sparse) else None
+        with self.open(stats) as f:
+            stats.seeks += 1
+            f.seek(start)
+            raw = f.read(stop - start) if stop is not None else f.read()
+        stats.bytes_read += len(raw)
+        for line in raw.splitlines():
+            stats.records_decoded += 1
+            entry_key, data = json.loads(line)
+            if entry_key == key:
+                return data
+            if entry_key > key:
+                break
+        return None
+
+    def remove(self) -> None:
+        for path in [self.path, self.meta_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@dataclass
+class LsmStore:
+    # rows of lsm table: inserts are appended to write ahead log and kept in memtable,
+    # full memtable is flushed to sorted run file, runs are merged by background compaction
+    base_path: str
+    # sort key, rows are ordered by insert sequence without it
+    key: str | None
+    stats: QueryStats = field(default_factory=QueryStats)
+    memtable_rows: int = 4096
+    compaction_runs: int = 4
+
+    def __post_init__(self):
+        self.lock = threading.RLock()
+        self.memtable: dict[Any, dict] = {}
+        self.runs: list[SortedRun] = []
+        self.next_run = 0
+        self.next_seq = 0
+        self._compaction: threading.Thread | None = None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            self.runs = [SortedRun.load(self._run_path(it)) for it in manifest['runs']]
+            self.next_run = manifest['next_run']
+            self.next_seq = manifest['next_seq']
+        self._replay_wal()
+
+    @property
+    def manifest_path(self) -> str:
+        return f'{self.base_path}.lsm.json'
+
+    @property
+    def wal_path(self) -> str:
+        return f'{self.base_path}.wal'
+
+    def _run_path(self, number: int) -> str:
+        return f'{self.base_path}.r{number}'
+
+    @property
+    def rows_count(self) -> int:
+        return sum(run.rows for run in self.runs) + len(self.memtable)
+
+    def _replay_wal(self) -> None:
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # last write was not completed
+                    break
+                key, data = json.loads(line)
+                # entries of memtable flushed before the log was truncated are skipped
+                if self._get_from_runs(key) is None:
+                    self.memtable[key] = data
+                    if self.key is None:
+                        self.next_seq = max(self.next_seq, key + 1)
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            'runs': [int(run.path.rsplit('.r', 1)[1]) for run in self.runs],
+            'next_run': self.next_run,
+            'next_seq': self.next_seq,
+        }
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def put(self, rows: list[dict]) -> None:
+        with self.lock:
+            entries = []
+            for data in rows:
+                if self.key is None:
+                    entries.append((self.next_seq, data))
+                    self.next_seq += 1
+                else:
+                    entries.append((data[self.key], data))
+            # one sequential append for all rows
+            lines = b''.join(json.dumps(it).encode('utf-8') + b'\n' for it in entries)
+            with open(self.wal_path, 'ab') as f:
+                f.write(lines)
+            self.stats.file_opens += 1
+            self.stats.bytes_written += len(lines)
+            self.memtable.update(entries)
+            if len(self.memtable) >= self.memtable_rows:
+                self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            if not self.memtable:
+                return
+            entries = sorted(self.memtable.items(), key=itemgetter(0))
+            self.runs.append(SortedRun.write(self._run_path(self.next_run), entries, len(entries), self.stats))
+            self.next_run += 1
+            self._save_manifest()
+            with open(self.wal_path, 'wb'):
+                pass
+            self.memtable = {}
+            if len(self.runs) >= self.compaction_runs and self._compaction is None:
+                self._compaction = threading.Thread(target=self._compact_in_background, daemon=True)
+                self._compaction.start()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        finally:
+            with self.lock:
+                self._compaction = None
+
+    def compact(self) -> None:
+        # merges current runs into one, runs flushed meanwhile stay after it
+        with self.lock:
+            runs = list(self.runs)
+            if len(runs) < 2:
+                return
+            path = self._run_path(self.next_run)
+            self.next_run += 1
+            files = [run.open(self.stats) for run in runs]
+        entries = heapq.merge(*(SortedRun.iter_entries(f, self.stats) for f in files), key=itemgetter(0))
+        merged = SortedRun.write(path, entries, sum(run.rows for run in runs), self.stats)
+        with self.lock:
+            self.runs = [merged] + self.runs[len(runs):]
+            self._save_manifest()
+        # open scans keep reading removed files
+        for run in runs:
+            run.remove()
+
+    def wait(self) -> None:
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def _get_from_runs(self, key: Any) -> dict | None:
+        for run in reversed(self.runs):
+            data = run.get(key, self.stats)
+            if data is not None:
+                return data
+        return None
+
+    def get(self, key: Any) -> dict | None:
+        with self.lock:
+            data = self.memtable.get(key)
+            if data is not None:
+                return dict(data)
+            return self._get_from_runs(key)
+
+    def iter_rows(self) -> Iterator[dict]:
+        # memtable and runs are taken at start, rows inserted later are not visible
+        with self.lock:
+            memtable = sorted(((key, dict(data)) for key, data in self.memtable.items()), key=itemgetter(0))
+            files = [run.open(self.stats) for run in self.runs]
+        sources = [SortedRun.iter_entries(f, self.stats) for f in files] + [iter(memtable)]
+        return (data for _, data in heapq.merge(*sources, key=itemgetter(0)))
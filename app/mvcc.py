@@ -0,0 +1,86 @@
+from dataclasses import dataclass, field
+
+
+class ScanPosition:
+    __slots__ = ('table_id', 'refs')
+
+    def __init__(self, table_id: int, refs: list[int]):
+        self.table_id = table_id
+        # refs still to be read by scan, remapped when rows move
+        self.refs = refs
+
+
+@dataclass
+class Snapshot:
+    seq: int
+    positions: list[ScanPosition] = field(default_factory=list)
+
+
+@dataclass
+class VersionStore:
+    commit_seq: int = 0
+    snapshots: list[Snapshot] = field(default_factory=list)
+    # { table_id: { ref: [ (seq, data before change or None if inserted), ... ] } }
+    undo: dict[int, dict[int, list[tuple[int, dict | None]]]] = field(default_factory=dict)
+    # { table_id: number of changes } changed by every write or move of table rows
+    table_versions: dict[int, int] = field(default_factory=dict)
+
+    def _touch(self, table_id: int) -> None:
+        self.table_versions[table_id] = self.table_versions.get(table_id, 0) + 1
+
+    def begin(self) -> Snapshot:
+        snapshot = Snapshot(seq=self.commit_seq)
+        self.snapshots.append(snapshot)
+        return snapshot
+
+    def release(self, snapshot: Snapshot) -> None:
+        if snapshot not in self.snapshots:
+            return
+        self.snapshots.remove(snapshot)
+        if not self.snapshots:
+            self.undo.clear()
+            return
+        min_seq = min(it.seq for it in self.snapshots)
+        for table_undo in self.undo.values():
+            for ref in list(table_undo):
+                versions = [it for it in table_undo[ref] if it[0] > min_seq]
+                if versions:
+                    table_undo[ref] = versions
+                else:
+                    del table_undo[ref]
+
+    def record_inserts(self, table_id: int, refs: list[int]) -> None:
+        self.commit_seq += 1
+        self._touch(table_id)
+        if not self.snapshots:
+            return
+        table_undo = self.undo.setdefault(table_id, {})
+        for ref in refs:
+            table_undo.setdefault(ref, []).append((self.commit_seq, None))
+
+    def record_update(self, table_id: int, ref: int, data: dict) -> None:
+        self.commit_seq += 1
+        self._touch(table_id)
+        if not self.snapshots:
+            return
+        self.undo.setdefault(table_id, {}).setdefault(ref, []).append((self.commit_seq, data))
+
+    def move(self, table_id: int, moves: dict[int, int]) -> None:
+        self._touch(table_id)
+        table_undo = self.undo.get(table_id)
+        if table_undo:
+            for old_ref, ref in moves.items():
+                if old_ref in table_undo:
+                    table_undo[ref] = table_undo.pop(old_ref)
+        for snapshot in self.snapshots:
+            for position in snapshot.positions:
+                if position.table_id == table_id:
+                    position.refs = [moves.get(ref, ref) for ref in position.refs]
+
+    def visible_data(self, snapshot: Snapshot, table_id: int, ref: int, data: dict) -> dict | None:
+        versions = self.undo.get(table_id, {}).get(ref)
+        if versions:
+            for seq, old_data in versions:
+                if seq > snapshot.seq:
+                    return old_data
+        return data
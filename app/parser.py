@@ -1,14 +1,29 @@
 import argparse
 import random
 import shlex
-import uuid
-from dataclasses import dataclass
-from typing import Any, Callable
+from dataclasses import dataclass, field, replace
+from itertools import islice
+from typing import Callable
 
 from . import types
+from .aggregate import Aggregation
+from .continuation import ResumableIterator
 from .db import Database
-from .util import (check_positive, execution_time, valid_filter,
-                   valid_row_data, valid_table)
+from .loadgen import run_load, table_generator
+from .profiler import ProfileOptions, profile_call
+from .replica import Replica
+from .transfer import FileFormat, read_records
+from .util import (check_positive, execution_time, valid_aggregations,
+                   valid_distribution, valid_filter, valid_join_keys,
+                   valid_ratio, valid_row_data, valid_table)
+
+PROFILE_FLAG = '--profile'
+PROFILE_MEMORY_FLAG = '--profile-memory'
+
+
+class ProfileStateEnum(types.StrEnum):
+    ON = 'on'
+    OFF = 'off'
 
 
 class CommandsEnum(types.StrEnum):
@@ -16,45 +31,66 @@ class CommandsEnum(types.StrEnum):
     CREATE_INDEX = 'create-index'
     LIST_TABLES = 'list-tables'
     SELECT = 'select'
+    GET = 'get'
+    MGET = 'mget'
     INSERT = 'insert'
     INSERT_AUTO = 'insert-auto'
+    LOADGEN = 'loadgen'
+    IMPORT = 'import'
+    EXPORT = 'export'
+    STATS = 'stats'
+    PROFILE = 'profile'
+    AGGREGATE = 'aggregate'
+    JOIN = 'join'
+    REPLICA_STATUS = 'replica-status'
     HELP = 'help'
 
 
 @dataclass
 class Parser:
     database: Database
+    profile_options: ProfileOptions = field(default_factory=ProfileOptions)
+    # set when database is a replica of another one
+    replica: Replica | None = None
 
     def __post_init__(self):
         self.COMMANDS_PARSERS = {
             CommandsEnum.SELECT: self.create_select_parser(),
+            CommandsEnum.GET: self.create_get_parser(),
+            CommandsEnum.MGET: self.create_mget_parser(),
             CommandsEnum.CREATE_TABLE: self.create_create_table_parser(),
             CommandsEnum.CREATE_INDEX: self.create_create_index_parser(),
             CommandsEnum.LIST_TABLES: self.create_list_tables_parser(),
             CommandsEnum.INSERT: self.create_insert_parser(),
             CommandsEnum.INSERT_AUTO: self.create_insert_auto_parser(),
+            CommandsEnum.LOADGEN: self.create_loadgen_parser(),
+            CommandsEnum.IMPORT: self.create_import_parser(),
+            CommandsEnum.EXPORT: self.create_export_parser(),
+            CommandsEnum.STATS: self.create_stats_parser(),
+            CommandsEnum.PROFILE: self.create_profile_parser(),
+            CommandsEnum.AGGREGATE: self.create_aggregate_parser(),
+            CommandsEnum.JOIN: self.create_join_parser(),
+            CommandsEnum.REPLICA_STATUS: self.create_replica_status_parser(),
         }
         self.COMMANDS: dict[str, Callable[[list[str]], None]] = {
             CommandsEnum.HELP: self.help_cmd,
             CommandsEnum.SELECT: self.select_command,
+            CommandsEnum.GET: self.get_command,
+            CommandsEnum.MGET: self.mget_command,
             CommandsEnum.INSERT: self.insert_command,
             CommandsEnum.INSERT_AUTO: self.insert_auto_command,
+            CommandsEnum.LOADGEN: self.loadgen_command,
+            CommandsEnum.IMPORT: self.import_command,
+            CommandsEnum.EXPORT: self.export_command,
+            CommandsEnum.STATS: self.stats_command,
+            CommandsEnum.PROFILE: self.profile_command,
+            CommandsEnum.AGGREGATE: self.aggregate_command,
+            CommandsEnum.JOIN: self.join_command,
+            CommandsEnum.REPLICA_STATUS: self.replica_status_command,
             CommandsEnum.LIST_TABLES: self.list_tables_command,
             CommandsEnum.CREATE_TABLE: self.create_table_command,
             CommandsEnum.CREATE_INDEX: self.create_index_command,
         }
-        self.GENERATORS: dict[types.DbType, Callable[[], Any]] = {
-            types.DbType.INT: self._gen_int,
-            types.DbType.STR: self._gen_string,
-        }
-
-    @staticmethod
-    def _gen_string():
-        return str(uuid.uuid4())
-
-    @staticmethod
-    def _gen_int():
-        return int(random.random() * 1000)
 
     def create_select_parser(self) -> argparse.ArgumentParser:
         parser = argparse.ArgumentParser(prog=CommandsEnum.SELECT, exit_on_error=False)
@@ -76,17 +112,129 @@ class Parser:
             required=False,
             help=r'[{ key: val }, ... ] or { key: val, ... }'
         )
+        parser.add_argument(
+            '--after',
+            dest="after",
+            type=str,
+            required=False,
+            help='Continue select after row of continuation token printed by previous select'
+        )
+        parser.add_argument(
+            '--order-by',
+            dest="order_by",
+            type=str,
+            required=False,
+            help='Sort rows by key, with --limit only top rows are kept in memory'
+        )
+        parser.add_argument(
+            '--desc',
+            dest="desc",
+            action="store_true",
+            default=False,
+            help='Descending order, newest rows first without --order-by'
+        )
+        parser.add_argument(
+            '--prefetch',
+            dest="prefetch",
+            type=check_positive,
+            default=0,
+            help='Read up to N rows ahead in background thread while rows are filtered'
+        )
+        self._add_output_arguments(parser, required=False)
+        self._add_stats_argument(parser)
+        return parser
+
+    @staticmethod
+    def _add_stats_argument(parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            '--stats',
+            dest="stats",
+            action="store_true",
+            default=False,
+            help='Print I/O and decode statistics of the command'
+        )
+
+    @staticmethod
+    def _add_output_arguments(parser: argparse.ArgumentParser, required: bool) -> None:
+        parser.add_argument(
+            '--out', '-o',
+            dest="out",
+            type=str,
+            required=required,
+            help='Write rows to .jsonl or .csv file instead of printing'
+        )
+        parser.add_argument(
+            '--format',
+            dest="format_",
+            type=FileFormat,
+            choices=list(FileFormat),
+            default=None,
+            help='Output file format, detected by extension if not set'
+        )
+        parser.add_argument(
+            '--gzip',
+            dest="gzip",
+            action="store_true",
+            default=None,
+            help='Compress output file with gzip (default for .gz files)'
+        )
+
+    def create_get_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=CommandsEnum.GET, exit_on_error=False)
+        parser.add_argument('--table', '-t', dest="table", type=str, required=True, help='Table name')
+        parser.add_argument('key', type=str, help='Primary key value')
+        self._add_stats_argument(parser)
+        return parser
+
+    def create_mget_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=CommandsEnum.MGET, exit_on_error=False)
+        parser.add_argument('--table', '-t', dest="table", type=str, required=True, help='Table name')
+        parser.add_argument(
+            '--key', '-k',
+            dest="key",
+            type=str,
+            default=None,
+            help='Indexed table key, primary key by default'
+        )
+        parser.add_argument('values', type=str, nargs='+', help='Key values')
+        self._add_stats_argument(parser)
         return parser
 
     def create_create_table_parser(self) -> argparse.ArgumentParser:
         parser = argparse.ArgumentParser(prog=CommandsEnum.CREATE_TABLE, exit_on_error=False)
-        parser.add_argument('table', type=valid_table, help=r'{ name, keys: { key: type } }')
+        parser.add_argument(
+            'table',
+            type=valid_table,
+            help=(
+                r'{ name, keys: { key: type }, primary_key, partition_key, partitions, engine: row|column|lsm, '
+                'compression: zlib|lzma, compression_level }'
+            ),
+        )
         return parser
 
     def create_create_index_parser(self) -> argparse.ArgumentParser:
         parser = argparse.ArgumentParser(prog=CommandsEnum.CREATE_INDEX, exit_on_error=False)
         parser.add_argument('--table', '-t', dest="table", type=str, required=True, help='Table name')
-        parser.add_argument('--key', '-k', dest="key", type=str, required=True, help='Table key')
+        parser.add_argument(
+            '--key', '-k',
+            dest="keys",
+            type=str,
+            action="append",
+            required=True,
+            help='Table key, can be repeated to build indexes in one scan'
+        )
+        parser.add_argument(
+            '--disk',
+            dest="on_disk",
+            action="store_true",
+            help='Store index in on disk hash file with bounded memory'
+        )
+        parser.add_argument(
+            '--background',
+            dest="background",
+            action="store_true",
+            help='Build index in background thread, index selects scan table until it is ready'
+        )
         return parser
 
     def create_list_tables_parser(self) -> argparse.ArgumentParser:
@@ -103,6 +251,7 @@ class Parser:
             required=False,
             help=r'{ key: val, ... }'
         )
+        self._add_stats_argument(parser)
         return parser
 
     def create_insert_auto_parser(self) -> argparse.ArgumentParser:
@@ -111,6 +260,184 @@ class Parser:
         parser.add_argument('--amount', '-a', dest="amount", type=check_positive, default=0, help='Rows amount')
         return parser
 
+    def create_loadgen_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=CommandsEnum.LOADGEN, exit_on_error=False)
+        parser.add_argument('--table', '-t', dest="table", type=str, required=True, help='Table name')
+        parser.add_argument('--amount', '-a', dest="amount", type=check_positive, required=True, help='Rows amount')
+        parser.add_argument('--seed', dest="seed", type=int, default=0, help='Data generator seed')
+        parser.add_argument(
+            '--dist',
+            dest="distributions",
+            type=valid_distribution,
+            action="append",
+            default=[],
+            help='key=uniform[:max]|zipf[:s]|seq|card[:n], can be repeated, random values by default'
+        )
+        parser.add_argument(
+            '--batch-size', '-b',
+            dest="batch_size",
+            type=check_positive,
+            default=1000,
+            help='Rows generated and written per batch'
+        )
+        parser.add_argument(
+            '--workers', '-w',
+            dest="workers",
+            type=check_positive,
+            default=1,
+            help='Processes generating batches'
+        )
+        parser.add_argument(
+            '--read-ratio', '-r',
+            dest="read_ratio",
+            type=valid_ratio,
+            default=0.0,
+            help='Share of reads of written rows mixed with single row inserts, bulk import if 0'
+        )
+        return parser
+
+    def create_import_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=CommandsEnum.IMPORT, exit_on_error=False)
+        parser.add_argument('--table', '-t', dest="table", type=str, required=True, help='Table name')
+        parser.add_argument('--file', dest="file", type=str, required=True, help='Path to .jsonl or .csv file')
+        parser.add_argument(
+            '--format',
+            dest="format_",
+            type=FileFormat,
+            choices=list(FileFormat),
+            default=None,
+            help='File format, detected by extension if not set'
+        )
+        parser.add_argument(
+            '--batch-size', '-b',
+            dest="batch_size",
+            type=check_positive,
+            default=1000,
+            help='Rows written per batch'
+        )
+        return parser
+
+    def create_export_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=CommandsEnum.EXPORT, exit_on_error=False)
+        parser.add_argument('--table', '-t', dest="table", type=str, required=True, help='Table name')
+        parser.add_argument('--limit', '-l', dest="limit", type=check_positive, default=0, help='Rows limit')
+        parser.add_argument(
+            '--use-index', '-i',
+            dest="use_index",
+            action="store_true",
+            default=False,
+            help='Use indexes in select'
+        )
+        parser.add_argument(
+            '--filter', '-f',
+            dest="filter_",
+            type=valid_filter,
+            required=False,
+            help=r'[{ key: val }, ... ] or { key: val, ... }'
+        )
+        self._add_output_arguments(parser, required=True)
+        return parser
+
+    def create_stats_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=CommandsEnum.STATS, exit_on_error=False)
+        parser.add_argument(
+            '--reset',
+            dest="reset",
+            action="store_true",
+            default=False,
+            help='Reset statistics after printing'
+        )
+        return parser
+
+    def create_replica_status_parser(self) -> argparse.ArgumentParser:
+        return argparse.ArgumentParser(
+            prog=CommandsEnum.REPLICA_STATUS,
+            exit_on_error=False,
+            description='Applied change log position and lag of replica',
+        )
+
+    def create_profile_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(
+            prog=CommandsEnum.PROFILE,
+            exit_on_error=False,
+            epilog=f'Single command can be profiled with {PROFILE_FLAG} or {PROFILE_MEMORY_FLAG} option',
+        )
+        parser.add_argument(
+            'state',
+            type=ProfileStateEnum,
+            choices=list(ProfileStateEnum),
+            nargs='?',
+            help='Profile every command in session'
+        )
+        parser.add_argument(
+            '--memory',
+            dest="memory",
+            action="store_true",
+            default=False,
+            help='Trace memory allocations with tracemalloc'
+        )
+        parser.add_argument('--top', dest="top", type=check_positive, default=None, help='Summary size')
+        parser.add_argument('--dir', dest="out_dir", type=str, default=None, help='Directory for .prof files')
+        return parser
+
+    def create_aggregate_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=CommandsEnum.AGGREGATE, exit_on_error=False)
+        parser.add_argument('--table', '-t', dest="table", type=str, required=True, help='Table name')
+        parser.add_argument(
+            '--group-by', '-g',
+            dest="group_by",
+            type=str,
+            action="append",
+            default=[],
+            help='Group by key, can be repeated'
+        )
+        parser.add_argument(
+            '--agg', '-a',
+            dest="aggs",
+            type=valid_aggregations,
+            action="extend",
+            default=[],
+            help='Comma separated count|sum:key|min:key|max:key, count by default'
+        )
+        parser.add_argument(
+            '--filter', '-f',
+            dest="filter_",
+            type=valid_filter,
+            required=False,
+            help=r'[{ key: val }, ... ] or { key: val, ... }'
+        )
+        self._add_stats_argument(parser)
+        return parser
+
+    def create_join_parser(self) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=CommandsEnum.JOIN, exit_on_error=False)
+        parser.add_argument('--left', dest="left", type=str, required=True, help='Left table name')
+        parser.add_argument('--right', dest="right", type=str, required=True, help='Right table name')
+        parser.add_argument(
+            '--on',
+            dest="on",
+            type=valid_join_keys,
+            required=True,
+            help='left_key=right_key or key of both tables, right table index is used if exists'
+        )
+        parser.add_argument(
+            '--left-filter',
+            dest="left_filter",
+            type=valid_filter,
+            required=False,
+            help=r'Left table filter [{ key: val }, ... ] or { key: val, ... }'
+        )
+        parser.add_argument(
+            '--right-filter',
+            dest="right_filter",
+            type=valid_filter,
+            required=False,
+            help=r'Right table filter [{ key: val }, ... ] or { key: val, ... }'
+        )
+        parser.add_argument('--limit', '-l', dest="limit", type=check_positive, default=0, help='Rows limit')
+        self._add_stats_argument(parser)
+        return parser
+
     def help_cmd(self, args: list[str]):
         for parser in self.COMMANDS_PARSERS.values():
             print(parser.format_help())
@@ -136,8 +463,34 @@ class Parser:
             args = self.COMMANDS_PARSERS[CommandsEnum.CREATE_INDEX].parse_intermixed_args(args_list)
         except SystemExit:
             return
-        self.database.create_table_index(args.table, args.key)
-        print('INDEX CREATED')
+        self.database.create_table_indexes(args.table, args.keys, args.on_disk, args.background)
+        print('INDEX BUILD STARTED' if args.background else 'INDEX CREATED')
+
+    @execution_time
+    def get_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.GET].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        with self.database.collect_stats(CommandsEnum.GET) as query_stats:
+            row = self.database.get(args.table, args.key)
+        print('NOT FOUND' if row is None else row.dict())
+        if args.stats:
+            print(query_stats.format())
+
+    @execution_time
+    def mget_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.MGET].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        with self.database.collect_stats(CommandsEnum.MGET) as query_stats:
+            results = self.database.get_many(args.table, args.key, args.values)
+        for value, rows in zip(args.values, results):
+            print(f'{value}: {[row.data for row in rows] if rows else "NOT FOUND"}')
+        print('-'*8 + f' {sum(len(rows) for rows in results)} rows')
+        if args.stats:
+            print(query_stats.format())
 
     @execution_time
     def select_command(self, args_list: list[str]):
@@ -145,18 +498,33 @@ class Parser:
             args = self.COMMANDS_PARSERS[CommandsEnum.SELECT].parse_intermixed_args(args_list)
         except SystemExit:
             return
+        with self.database.collect_stats(CommandsEnum.SELECT) as query_stats:
+            self._select(args)
+        if args.stats:
+            print(query_stats.format())
+
+    def _select(self, args: argparse.Namespace) -> None:
+        if args.out:
+            self._export(args)
+            return
 
         i = 0
-        if args.use_index:
-            if len(args.filter_) == 0:
-                raise ValueError('Filter cannot be empty for select using index')
-            iterator = self.database.get_rows_iterator_use_indexes(args.table, args.filter_)
+        if args.use_index and len(args.filter_) == 0:
+            raise ValueError('Filter cannot be empty for select using index')
+        if args.order_by:
+            if args.use_index or args.after:
+                raise ValueError('Order by is not supported for select using index or continuation token')
+            iterator = iter(self.database.get_sorted_rows_data(
+                args.table, args.order_by, args.desc, args.limit, args.filter_,
+            ))
         else:
-            iterator = self.database.get_rows_iterator(args.table, args.filter_)
+            iterator = self.database.get_rows_data_iterator(
+                args.table, args.filter_, args.use_index, args.after, args.desc, args.prefetch,
+            )
         try:
-            for row in iterator:
+            for data in iterator:
                 if not args.counter:
-                    print(row.dict())
+                    print({'data': data})
                 i += 1
                 if i % 6 == 0 and not (args.all or args.counter):
                     input('--- Press to continue')
@@ -165,6 +533,8 @@ class Parser:
         except KeyboardInterrupt:
             pass
         print('-'*8 + f' select {i} items')
+        if args.limit and i >= args.limit and isinstance(iterator, ResumableIterator) and iterator.token:
+            print(f'next page: --after {iterator.token}')
 
     @execution_time
     def insert_command(self, args_list: list[str]):
@@ -172,8 +542,31 @@ class Parser:
             args = self.COMMANDS_PARSERS[CommandsEnum.INSERT].parse_intermixed_args(args_list)
         except SystemExit:
             return
-        self.database.insert_row(args.table, types.Row(data=args.data))
+        with self.database.collect_stats(CommandsEnum.INSERT) as query_stats:
+            self.database.insert_row(args.table, types.Row(data=args.data))
         print('INSERTED')
+        if args.stats:
+            print(query_stats.format())
+
+    def stats_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.STATS].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        print(self.database.stats.format())
+        if args.reset:
+            self.database.reset_stats()
+            print('STATS RESET')
+
+    def replica_status_command(self, args_list: list[str]):
+        try:
+            self.COMMANDS_PARSERS[CommandsEnum.REPLICA_STATUS].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        if self.replica is None:
+            print('NOT A REPLICA')
+            return
+        print(self.replica.status().format())
 
     @execution_time
     def insert_auto_command(self, args_list: list[str]):
@@ -181,18 +574,119 @@ class Parser:
             args = self.COMMANDS_PARSERS[CommandsEnum.INSERT_AUTO].parse_intermixed_args(args_list)
         except SystemExit:
             return
-        table = self.database.get_table_by_name(args.table)
-        i = 0
+        generator = table_generator(self.database, args.table, seed=random.getrandbits(32))
+        rows_count = self.database.cursor.get_table_by_name(args.table).rows_count
         try:
-            for i in range(args.amount):
-                data = {
-                    key: self.GENERATORS[type_v]()
-                    for key, type_v in table.keys.items()
-                }
-                self.database.insert_row(args.table, types.Row(data=data))
+            # batches are written as they are generated
+            for batch in generator.iter_batches(args.amount):
+                self.database.import_rows(args.table, batch, len(batch))
         except KeyboardInterrupt:
             pass
-        print(f'INSERTED {i+1}')
+        print(f'INSERTED {self.database.cursor.get_table_by_name(args.table).rows_count - rows_count}')
+
+    @execution_time
+    def loadgen_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.LOADGEN].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        generator = table_generator(self.database, args.table, args.distributions, args.seed, args.batch_size)
+        report = run_load(self.database, args.table, args.amount, generator, args.workers, args.read_ratio)
+        print(report.format())
+
+    @execution_time
+    def import_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.IMPORT].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        records = read_records(args.file, args.format_)
+        amount = self.database.import_rows(args.table, records, batch_size=args.batch_size)
+        print(f'IMPORTED {amount}')
+
+    def _export(self, args: argparse.Namespace) -> None:
+        amount = self.database.export_rows(
+            args.table,
+            args.out,
+            filter_=args.filter_,
+            use_index=args.use_index,
+            limit=args.limit,
+            format_=args.format_,
+            compress=args.gzip,
+        )
+        print(f'EXPORTED {amount} items to {args.out}')
+
+    @execution_time
+    def export_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.EXPORT].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        self._export(args)
+
+    def profile_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.PROFILE].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        if args.state is not None:
+            self.profile_options.enabled = args.state == ProfileStateEnum.ON
+            self.profile_options.memory = args.memory
+        if args.top is not None:
+            self.profile_options.top = args.top
+        if args.out_dir is not None:
+            self.profile_options.out_dir = args.out_dir
+        print(self.profile_options)
+
+    @execution_time
+    def aggregate_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.AGGREGATE].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        aggs = args.aggs or [Aggregation.parse('count')]
+        with self.database.collect_stats(CommandsEnum.AGGREGATE) as query_stats:
+            results = self.database.aggregate(args.table, aggs, args.group_by, args.filter_)
+        for result in results:
+            print(result)
+        print('-'*8 + f' {len(results)} groups')
+        if args.stats:
+            print(query_stats.format())
+
+    @execution_time
+    def join_command(self, args_list: list[str]):
+        try:
+            args = self.COMMANDS_PARSERS[CommandsEnum.JOIN].parse_intermixed_args(args_list)
+        except SystemExit:
+            return
+        i = 0
+        with self.database.collect_stats(CommandsEnum.JOIN) as query_stats:
+            pairs = self.database.join(args.left, args.right, args.on, args.left_filter, args.right_filter)
+            for left, right in islice(pairs, args.limit or None):
+                print({'left': left.data, 'right': right.data})
+                i += 1
+        print('-'*8 + f' join {i} items')
+        if args.stats:
+            print(query_stats.format())
+
+    @staticmethod
+    def pop_profile_args(args: list[str]) -> tuple[list[str], bool, bool]:
+        profile = PROFILE_FLAG in args
+        memory = PROFILE_MEMORY_FLAG in args
+        args = [it for it in args if it not in (PROFILE_FLAG, PROFILE_MEMORY_FLAG)]
+        return args, profile or memory, memory
+
+    def run_command(self, command: str, args: list[str]):
+        if command == CommandsEnum.PROFILE:
+            self.COMMANDS[command](args)
+            return
+        args, profile, memory = self.pop_profile_args(args)
+        if not (profile or self.profile_options.enabled):
+            self.COMMANDS[command](args)
+            return
+        options = replace(self.profile_options, memory=memory or self.profile_options.memory)
+        _, report = profile_call(command, options, self.COMMANDS[command], args)
+        print(report.format())
 
     @staticmethod
     def parse_command(msg: str) -> tuple[str, list[str]]:
@@ -207,7 +701,7 @@ class Parser:
         try:
             command, args = self.parse_command(msg)
             if command in self.COMMANDS:
-                self.COMMANDS[command](args)
+                self.run_command(command, args)
             else:
                 print('Command not found. Type help to get info about available commands')
         except Exception as e:
@@ -0,0 +1,93 @@
+import json
+import re
+import threading
+from dataclasses import dataclass
+from queue import Empty, Full, Queue
+from typing import Callable, Iterator
+
+# chain pointers are the last fields of row records, found without decoding row data
+_CHAIN_TAIL = re.compile(rb'"next_row_offset": (\d+), "prev_row_offset": \d+}$')
+_PUT_TIMEOUT = 0.05
+
+
+@dataclass
+class PrefetchedRecord:
+    offset: int
+    raw: bytes
+    # compressed rows following block header
+    payload: bytes | None = None
+
+
+class RecordPrefetcher:
+    # background thread reading raw chain records ahead of the scan into bounded queue,
+    # records are decoded by the consumer so file reads overlap with decoding and filtering
+    def __init__(
+        self,
+        path: str,
+        start_offset: int,
+        depth: int,
+        size_header: int,
+        buffer_size: int,
+        # blocks which are already decompressed in memory
+        is_cached: Callable[[int], bool],
+    ):
+        self._path = path
+        self._is_cached = is_cached
+        self._size_header = size_header
+        self._buffer_size = buffer_size
+        self._queue: Queue[PrefetchedRecord | None] = Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(start_offset,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item: PrefetchedRecord | None) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _read_chain(self, start_offset: int) -> Iterator[PrefetchedRecord]:
+        with open(self._path, 'rb') as f:
+            offset = start_offset
+            while offset > 0:
+                f.seek(offset)
+                raw = f.read(int.from_bytes(f.read(self._size_header), byteorder="big", signed=False))
+                if raw.startswith(b'{"codec"'):
+                    header = json.loads(raw)
+                    payload = None
+                    if not self._is_cached(offset):
+                        f.seek(offset + self._buffer_size)
+                        payload = f.read(header['payload_size'])
+                    yield PrefetchedRecord(offset, raw, payload)
+                    offset = header['next_row_offset']
+                    continue
+                match = _CHAIN_TAIL.search(raw)
+                if match is None:
+                    return
+                yield PrefetchedRecord(offset, raw)
+                offset = int(match.group(1))
+
+    def _run(self, start_offset: int) -> None:
+        try:
+            for record in self._read_chain(start_offset):
+                if not self._put(record):
+                    return
+        except Exception:
+            # consumer falls back to serial reads and gets the error there
+            pass
+        self._put(None)
+
+    def get(self) -> PrefetchedRecord | None:
+        while True:
+            try:
+                return self._queue.get(timeout=_PUT_TIMEOUT)
+            except Empty:
+                if not self._thread.is_alive() and self._queue.empty():
+                    return None
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,76 @@
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable
+
+
+@dataclass
+class ProfileOptions:
+    enabled: bool = False
+    memory: bool = False
+    top: int = 20
+    out_dir: str = '.'
+
+
+@dataclass
+class ProfileReport:
+    prof_file: str
+    functions: str
+    allocations: str | None = None
+
+    def format(self) -> str:
+        parts = [f'Profile saved to {self.prof_file}', self.functions]
+        if self.allocations is not None:
+            parts.append(self.allocations)
+        return '\n'.join(parts)
+
+
+def _format_functions(profile: cProfile.Profile, top: int) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    return stream.getvalue().strip()
+
+
+def _format_allocations(snapshot: tracemalloc.Snapshot, top: int) -> str:
+    lines = [f'Top {top} allocation sites:']
+    for stat in snapshot.statistics('lineno')[:top]:
+        lines.append(str(stat))
+    return '\n'.join(lines)
+
+
+def profile_call(
+    name: str,
+    options: ProfileOptions,
+    func: Callable[..., Any],
+    *args,
+    **kwargs,
+) -> tuple[Any, ProfileReport]:
+    os.makedirs(options.out_dir, exist_ok=True)
+    prof_file = os.path.join(options.out_dir, f'{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof')
+    trace_memory = options.memory and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+    profile = cProfile.Profile()
+    snapshot = None
+    try:
+        result = profile.runcall(func, *args, **kwargs)
+    finally:
+        if options.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, cProfile.__file__),
+            ])
+        if trace_memory:
+            tracemalloc.stop()
+        profile.dump_stats(prof_file)
+    report = ProfileReport(
+        prof_file=prof_file,
+        functions=_format_functions(profile, options.top),
+        allocations=_format_allocations(snapshot, options.top) if snapshot else None,
+    )
+    return result, report
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from . import types
+from .changelog import CHANGE_LOG_SUFFIX, ChangeLog, ChangeOp
+from .db import Database
+
+DEFAULT_POLL_INTERVAL = 0.1
+
+
+@dataclass
+class ReplicaStatus:
+    position: int
+    log_size: int
+    entries_applied: int
+    # age of the oldest change which is not applied yet
+    lag_seconds: float
+    error: str | None = None
+
+    @property
+    def pending_bytes(self) -> int:
+        return self.log_size - self.position
+
+    def format(self) -> str:
+        lines = [
+            f'{"position":<16} {self.position}',
+            f'{"pending_bytes":<16} {self.pending_bytes}',
+            f'{"entries_applied":<16} {self.entries_applied}',
+            f'{"lag":<16} {self.lag_seconds:.6f}',
+        ]
+        if self.error:
+            lines.append(f'{"error":<16} {self.error}')
+        return '\n'.join(lines)
+
+
+class Replica:
+    # read only copy of primary database, starts from the files copied when primary started its
+    # change log and replays the log with the same cursor writes, so row refs are equal on both sides
+    def __init__(
+        self,
+        primary_db_file: str,
+        db_file: str,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        **database_options: Any,
+    ):
+        self.primary_db_file = primary_db_file
+        self.db_file = db_file
+        self.poll_interval = poll_interval
+        self.position_file = f'{db_file}.replica.json'
+        if not os.path.exists(db_file):
+            ChangeLog.copy_base(primary_db_file, db_file)
+            self._write_position(0)
+        self.position = self._read_position()
+        self.database = Database(db_file=db_file, READ_ONLY=True, **database_options)
+        self.change_log = ChangeLog(f'{primary_db_file}{CHANGE_LOG_SUFFIX}')
+        self.entries_applied = 0
+        self.error: str | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _read_position(self) -> int:
+        try:
+            with open(self.position_file, 'r') as f:
+                saved = json.load(f)
+        except OSError:
+            raise ValueError(f'Database {self.db_file} is not a replica')
+        if saved['primary'] != os.path.abspath(self.primary_db_file):
+            raise ValueError(f'Database is a replica of {saved["primary"]}')
+        return saved['position']
+
+    def _write_position(self, position: int) -> None:
+        with open(self.position_file, 'w') as f:
+            json.dump({'primary': os.path.abspath(self.primary_db_file), 'position': position}, f)
+
+    def _apply_entry(self, entry: dict) -> None:
+        cursor = self.database.cursor
+        indexer = self.database.indexer
+        op = ChangeOp(entry['op'])
+        if op == ChangeOp.CREATE_TABLE:
+            table = types.MetaTable.parse_obj(entry['table'])
+            cursor.write_table_meta(table)
+            indexer.build_for_table(table.name)
+        elif op == ChangeOp.OVERRIDE_TABLE:
+            old_table = cursor.get_table_by_name(entry['name'])
+            table = types.MetaTable.parse_obj(entry['table'])
+            cursor.override_table_meta(table, entry['name'])
+            new_keys = [key for key in table.indexes if key not in old_table.indexes]
+            if new_keys:
+                indexer.build_for_table_keys(table.name, new_keys)
+        elif op == ChangeOp.INSERT_ROW:
+            meta_row, ref = cursor.write_row_meta(entry['table'], types.RowRecord(entry['data']))
+            indexer.add_item(cursor.get_table_by_name(entry['table']), meta_row, ref)
+        elif op == ChangeOp.INSERT_ROWS:
+            meta_rows = [types.RowRecord(data) for data in entry['rows']]
+            refs = cursor.write_rows_meta(entry['table'], meta_rows)
+            meta_table = cursor.get_table_by_name(entry['table'])
+            for meta_row, ref in zip(meta_rows, refs):
+                indexer.add_item(meta_table, meta_row, ref)
+        elif op == ChangeOp.UPDATE_ROW:
+            cursor.override_row_meta(entry['table'], types.RowRecord(entry['data']), entry['ref'])
+
+    def apply(self, limit: int = 0) -> int:
+        entries = self.change_log.read(self.position, limit)
+        for position, entry in entries:
+            with self.database.cursor.lock:
+                self._apply_entry(entry)
+                self.position = position
+            # applied position is saved with every entry, entries are not idempotent
+            self._write_position(position)
+            self.entries_applied += 1
+        return len(entries)
+
+    def status(self) -> ReplicaStatus:
+        next_entries = self.change_log.read(self.position, 1)
+        lag = time.time() - next_entries[0][1]['time'] if next_entries else 0.0
+        return ReplicaStatus(self.position, self.change_log.size(), self.entries_applied, max(lag, 0.0), self.error)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.apply()
+            except Exception as e:
+                # replica cannot skip entries, it stops until it is restarted
+                self.error = str(e)
+                return
+            self._stop.wait(self.poll_interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            raise ValueError('Replica is already started')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def close(self) -> None:
+        self.stop()
+        self.database.save()
@@ -0,0 +1,74 @@
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
+from typing import Callable, Generator
+
+
+@dataclass
+class QueryStats:
+    file_opens: int = 0
+    seeks: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    records_decoded: int = 0
+    decode_time: float = 0.0
+    index_postings: int = 0
+    rows_scanned: int = 0
+    rows_filtered: int = 0
+    rows_returned: int = 0
+    blocks_skipped: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    result_hits: int = 0
+    result_misses: int = 0
+    elapsed: float = 0.0
+
+    def copy(self) -> 'QueryStats':
+        return QueryStats(**asdict(self))
+
+    def __sub__(self, other: 'QueryStats') -> 'QueryStats':
+        return QueryStats(**{
+            it.name: getattr(self, it.name) - getattr(other, it.name)
+            for it in fields(self)
+        })
+
+    def update(self, other: 'QueryStats') -> None:
+        for it in fields(self):
+            setattr(self, it.name, getattr(other, it.name))
+
+    def add(self, other: 'QueryStats') -> None:
+        for it in fields(self):
+            setattr(self, it.name, getattr(self, it.name) + getattr(other, it.name))
+
+    def reset(self) -> None:
+        self.update(QueryStats())
+
+    def dict(self) -> dict:
+        return asdict(self)
+
+    def format(self) -> str:
+        return '\n'.join(
+            f'{name:<16} {value:.6f}' if isinstance(value, float) else f'{name:<16} {value}'
+            for name, value in self.dict().items()
+        )
+
+
+StatsHook = Callable[[str, QueryStats], None]
+
+
+@contextmanager
+def collect(
+    total: QueryStats,
+    name: str,
+    hooks: list[StatsHook] | None = None,
+) -> Generator[QueryStats, None, None]:
+    start_total = total.copy()
+    result = QueryStats()
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        total.elapsed += time.perf_counter() - start
+        result.update(total - start_total)
+        for hook in hooks or []:
+            hook(name, result)
@@ -0,0 +1,110 @@
+import csv
+import gzip
+import json
+import pathlib
+from itertools import islice
+from typing import IO, Generator, Iterable, TypeVar
+
+from . import types
+
+T = TypeVar('T')
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+class FileFormat(types.StrEnum):
+    JSONL = 'jsonl'
+    CSV = 'csv'
+
+
+def detect_format(path: str) -> FileFormat:
+    suffixes = pathlib.Path(path).suffixes
+    for suffix in reversed(suffixes):
+        if suffix in ('.jsonl', '.ndjson', '.json'):
+            return FileFormat.JSONL
+        if suffix == '.csv':
+            return FileFormat.CSV
+    raise ValueError(f'Cannot detect file format for {path}, use jsonl or csv')
+
+
+def is_gzip_path(path: str) -> bool:
+    return pathlib.Path(path).suffix == '.gz'
+
+
+def open_text(path: str, mode: str = 'r', compress: bool | None = None) -> IO[str]:
+    if compress is None:
+        compress = is_gzip_path(path)
+    if compress:
+        return gzip.open(path, f'{mode}t', encoding='utf-8', newline='')
+    if 'w' in mode:
+        return open(path, mode, encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def read_jsonl(path: str) -> Generator[dict, None, None]:
+    with open_text(path) as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError(f'Incorrect JSON at {path}:{line_no}')
+            if not isinstance(record, dict):
+                raise ValueError(f'Expected object at {path}:{line_no}')
+            yield record
+
+
+def read_csv(path: str) -> Generator[dict, None, None]:
+    with open_text(path) as f:
+        yield from csv.DictReader(f)
+
+
+def read_records(path: str, format_: FileFormat | None = None) -> Generator[dict, None, None]:
+    format_ = format_ or detect_format(path)
+    if format_ == FileFormat.CSV:
+        return read_csv(path)
+    return read_jsonl(path)
+
+
+def write_jsonl(path: str, rows_data: Iterable[dict], compress: bool | None = None) -> int:
+    amount = 0
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    with open_text(path, 'w', compress) as f:
+        write = f.write
+        for data in rows_data:
+            write(dumps(data))
+            write('\n')
+            amount += 1
+    return amount
+
+
+def write_csv(path: str, keys: list[str], rows_data: Iterable[dict], compress: bool | None = None) -> int:
+    amount = 0
+    with open_text(path, 'w', compress) as f:
+        writer = csv.DictWriter(f, fieldnames=keys)
+        writer.writeheader()
+        for data in rows_data:
+            writer.writerow(data)
+            amount += 1
+    return amount
+
+
+def write_records(
+    path: str,
+    keys: list[str],
+    rows_data: Iterable[dict],
+    format_: FileFormat | None = None,
+    compress: bool | None = None,
+) -> int:
+    format_ = format_ or detect_format(path)
+    if format_ == FileFormat.CSV:
+        return write_csv(path, keys, rows_data, compress)
+    return write_jsonl(path, rows_data, compress)
+
+
+def batched(iterable: Iterable[T], size: int) -> Generator[list[T], None, None]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 from enum import Enum
 from typing import Any, Callable
@@ -33,14 +34,27 @@ DB_TYPES_CONVERTERS: dict[DbType, Callable] = {
 }
 
 
+class TableEngine(StrEnum):
+    ROW = "row"
+    COLUMN = "column"
+    LSM = "lsm"
+
+
+class Compression(StrEnum):
+    ZLIB = "zlib"
+    LZMA = "lzma"
+
+
 class MetaDB(BaseModel):
     created: datetime
     updated: datetime
+    catalog_offset: int = 0
+    commit_seq: int = 0
+    # head of legacy linked list of tables, migrated to catalog on open
     first_table_offset: int = 0
-    last_table_offset: int = 0
 
-    def has_tables(self):
-        return self.first_table_offset > 0
+    def has_catalog(self):
+        return self.catalog_offset > 0
 
 
 class MetaKey(BaseModel):
@@ -52,16 +66,37 @@ class MetaTable(BaseModel):
     name: str
     keys: dict[str, DbType]
     indexes: list[str]
+    # indexes stored in on disk hash files instead of index json
+    disk_indexes: list[str] = []
+    # unique key for point gets, always indexed
+    primary_key: str | None = None
+    # rows are spread by hash of the key over partition files
+    partition_key: str | None = None
+    partitions: int = 0
+    id: int = 0
+    engine: TableEngine = TableEngine.ROW
+    compression: Compression | None = None
+    compression_level: int | None = None
+    # reused area for rows of not yet compressed block
+    staging_offset: int = 0
+    # row chain heads and stats, stored in fixed size catalog slot
     first_row_offset: int = 0
     last_row_offset: int = 0
+    rows_count: int = 0
+
+
+class LegacyMetaTable(MetaTable):
     next_table_offset: int = 0
-    prev_table_offset: int = 0
 
-    def has_next(self):
-        return self.next_table_offset > 0
 
-    def has_prev(self):
-        return self.prev_table_offset > 0
+TABLE_HEADS_FIELDS = {'first_row_offset', 'last_row_offset', 'rows_count'}
+
+
+class MetaCatalog(BaseModel):
+    tables: list[MetaTable] = []
+    next_table_id: int = 1
+    heads_offset: int = 0
+    heads_capacity: int = 0
 
 
 class MetaRow(BaseModel):
@@ -76,15 +111,83 @@ class MetaRow(BaseModel):
         return self.prev_row_offset > 0
 
 
+class RowRecord:
+    # engine side row without validation, stored in the same format as MetaRow
+    __slots__ = ('data', 'next_row_offset', 'prev_row_offset')
+
+    def __init__(self, data: dict, next_row_offset: int = 0, prev_row_offset: int = 0):
+        self.data = data
+        self.next_row_offset = next_row_offset
+        self.prev_row_offset = prev_row_offset
+
+    @classmethod
+    def from_dict(cls, record: dict) -> 'RowRecord':
+        return cls(record['data'], record.get('next_row_offset', 0), record.get('prev_row_offset', 0))
+
+    def has_next(self):
+        return self.next_row_offset > 0
+
+    def has_prev(self):
+        return self.prev_row_offset > 0
+
+    def copy(self) -> 'RowRecord':
+        return RowRecord(self.data, self.next_row_offset, self.prev_row_offset)
+
+    def dict(self) -> dict:
+        return {
+            'data': self.data,
+            'next_row_offset': self.next_row_offset,
+            'prev_row_offset': self.prev_row_offset,
+        }
+
+    def json(self) -> str:
+        return json.dumps(self.dict())
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, (RowRecord, MetaRow)):
+            return NotImplemented
+        return self.dict() == other.dict()
+
+    def __repr__(self) -> str:
+        return f'RowRecord({self.dict()})'
+
+
+class MetaBlock(BaseModel):
+    codec: Compression
+    count: int
+    payload_size: int
+    next_row_offset: int = 0
+    prev_row_offset: int = 0
+
+    def has_next(self):
+        return self.next_row_offset > 0
+
+    def has_prev(self):
+        return self.prev_row_offset > 0
+
+
 class TableCreate(BaseModel):
     name: str
     keys: dict[str, DbType]
+    primary_key: str | None = None
+    partition_key: str | None = None
+    partitions: int = 0
+    engine: TableEngine = TableEngine.ROW
+    compression: Compression | None = None
+    compression_level: int | None = None
 
 
 class Table(BaseModel):
     name: str
     keys: dict[str, DbType]
     indexes: list[str]
+    disk_indexes: list[str] = []
+    primary_key: str | None = None
+    partition_key: str | None = None
+    partitions: int = 0
+    engine: TableEngine = TableEngine.ROW
+    compression: Compression | None = None
+    compression_level: int | None = None
 
 
 class Row(BaseModel):
@@ -5,6 +5,8 @@ import re
 from pydantic.error_wrappers import ValidationError
 
 from . import types
+from .aggregate import Aggregation
+from .loadgen import KeyDistribution
 
 
 def print_pydantic_errors(exc: ValidationError):
@@ -46,6 +48,34 @@ def valid_row_data(s: str) -> dict:
     return valid_json(s)
 
 
+def valid_aggregations(s: str) -> list[Aggregation]:
+    try:
+        return [Aggregation.parse(it) for it in s.split(',') if it.strip()]
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def valid_distribution(s: str) -> KeyDistribution:
+    try:
+        return KeyDistribution.parse(s)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def valid_join_keys(s: str) -> tuple[str, str]:
+    left, _, right = s.partition('=')
+    if not left.strip() or _ and not right.strip():
+        raise argparse.ArgumentTypeError("%s is not key or left_key=right_key" % s)
+    return left.strip(), (right or left).strip()
+
+
+def valid_ratio(value) -> float:
+    fvalue = float(value)
+    if not 0 <= fvalue < 1:
+        raise argparse.ArgumentTypeError("%s is not in [0, 1) range" % value)
+    return fvalue
+
+
 def check_positive(value):
     ivalue = int(value)
     if ivalue <= 0:
@@ -57,9 +87,9 @@ def execution_time(func):
     import time
 
     def wrapper(*args, **kwargs):
-        start = time.time()
+        start = time.perf_counter()
         return_value = func(*args, **kwargs)
-        end = time.time()
+        end = time.perf_counter()
         print('Execution time: {} s.'.format(end-start))
         return return_value
     return wrapper
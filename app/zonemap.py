@@ -0,0 +1,128 @@
+import base64
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any
+
+from . import types
+
+BLOOM_BITS = 8192
+BLOOM_HASHES = 4
+
+
+@dataclass
+class BloomFilter:
+    bits: bytearray = field(default_factory=lambda: bytearray(BLOOM_BITS // 8))
+
+    @staticmethod
+    def _positions(value: Any) -> list[int]:
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+    def add(self, value: Any) -> None:
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def may_contain(self, value: Any) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    def dump(self) -> str:
+        return base64.b64encode(bytes(self.bits)).decode('ascii')
+
+    @classmethod
+    def load(cls, s: str) -> 'BloomFilter':
+        return cls(bytearray(base64.b64decode(s)))
+
+
+@dataclass
+class Zone:
+    first_offset: int
+    count: int = 0
+    mins: dict[str, int] = field(default_factory=dict)
+    maxs: dict[str, int] = field(default_factory=dict)
+    blooms: dict[str, BloomFilter] = field(default_factory=dict)
+
+    def add(self, keys: dict[str, types.DbType], data: dict) -> None:
+        for key, type_v in keys.items():
+            value = data[key]
+            if type_v == types.DbType.INT:
+                if key not in self.mins or value < self.mins[key]:
+                    self.mins[key] = value
+                if key not in self.maxs or value > self.maxs[key]:
+                    self.maxs[key] = value
+            else:
+                if key not in self.blooms:
+                    self.blooms[key] = BloomFilter()
+                self.blooms[key].add(value)
+        self.count += 1
+
+    def may_contain(self, key: str, value: Any) -> bool:
+        if key in self.blooms:
+            return self.blooms[key].may_contain(value)
+        if key in self.mins:
+            return self.mins[key] <= value <= self.maxs[key]
+        return self.count > 0
+
+    def may_match_part(self, filter_part: types.FilterPart) -> bool:
+        for key, val in filter_part.items():
+            values = val if isinstance(val, list) else [val]
+            if not any(self.may_contain(key, v) for v in values):
+                return False
+        return True
+
+    def may_match(self, filter_: types.Filter) -> bool:
+        if isinstance(filter_, list):
+            return len(filter_) == 0 or any(self.may_match_part(part) for part in filter_)
+        return self.may_match_part(filter_)
+
+    def dump(self) -> dict:
+        return {
+            'first_offset': self.first_offset,
+            'count': self.count,
+            'mins': self.mins,
+            'maxs': self.maxs,
+            'blooms': {key: bloom.dump() for key, bloom in self.blooms.items()},
+        }
+
+    @classmethod
+    def load(cls, data: dict) -> 'Zone':
+        return cls(
+            first_offset=data['first_offset'],
+            count=data['count'],
+            mins=data['mins'],
+            maxs=data['maxs'],
+            blooms={key: BloomFilter.load(it) for key, it in data['blooms'].items()},
+        )
+
+
+@dataclass
+class TableZones:
+    block_size: int
+    rows_count: int = 0
+    zones: list[Zone] = field(default_factory=list)
+
+    def add(self, keys: dict[str, types.DbType], offset: int, data: dict) -> None:
+        if not self.zones or self.zones[-1].count >= self.block_size:
+            self.zones.append(Zone(first_offset=offset))
+        self.zones[-1].add(keys, data)
+        self.rows_count += 1
+
+    def relocate(self, moves: dict[int, int]) -> None:
+        for zone in self.zones:
+            zone.first_offset = moves.get(zone.first_offset, zone.first_offset)
+
+    def dump(self) -> dict:
+        return {
+            'block_size': self.block_size,
+            'rows_count': self.rows_count,
+            'zones': [zone.dump() for zone in self.zones],
+        }
+
+    @classmethod
+    def load(cls, data: dict) -> 'TableZones':
+        return cls(
+            block_size=data['block_size'],
+            rows_count=data['rows_count'],
+            zones=[Zone.load(it) for it in data['zones']],
+        )
@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.suite import (DEFAULT_REPEAT, DEFAULT_ROWS,  # noqa: E402
+                              DEFAULT_TOLERANCE, DEFAULT_WIDTHS, compare,
+                              format_results, load_results, run_suite,
+                              save_results)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='benchmarks')
+    parser.add_argument('--rows', '-r', dest="rows", type=int, nargs='+', default=DEFAULT_ROWS, help='Rows amounts')
+    parser.add_argument(
+        '--width', '-w',
+        dest="widths",
+        type=int,
+        nargs='+',
+        default=DEFAULT_WIDTHS,
+        help='Table widths'
+    )
+    parser.add_argument('--repeat', dest="repeat", type=int, default=DEFAULT_REPEAT, help='Keep best of N runs')
+    parser.add_argument('--seed', dest="seed", type=int, default=0, help='Data generator seed')
+    parser.add_argument('--out', '-o', dest="out", type=str, default=None, help='Write results to JSON file')
+    parser.add_argument('--baseline', '-b', dest="baseline", type=str, default=None, help='Baseline JSON file')
+    parser.add_argument(
+        '--tolerance',
+        dest="tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help='Allowed relative slowdown against baseline'
+    )
+    parser.add_argument(
+        '--save-baseline',
+        dest="save_baseline",
+        action="store_true",
+        default=False,
+        help='Store results as the new baseline'
+    )
+    args = parser.parse_args()
+
+    results = run_suite(args.rows, args.widths, args.seed, args.repeat)
+    print(format_results(results))
+    if args.out:
+        save_results(args.out, results)
+    if not args.baseline:
+        return
+    if args.save_baseline or not os.path.exists(args.baseline):
+        save_results(args.baseline, results)
+        print(f'Baseline saved to {args.baseline}')
+        return
+    regressions = compare(results, load_results(args.baseline), args.tolerance)
+    if regressions:
+        print('Regressions:')
+        for regression in regressions:
+            print(regression)
+        sys.exit(1)
+    print('No regressions')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Generator
+
+from app import types
+from app.db import Database
+
+TABLE_NAME = 'Bench'
+DEFAULT_ROWS = [1000, 10000]
+DEFAULT_WIDTHS = [2, 8]
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_REPEAT = 3
+LOOKUPS = 200
+
+
+@dataclass
+class BenchResult:
+    name: str
+    rows: int
+    width: int
+    value: float
+    unit: str
+    higher_is_better: bool
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}[rows={self.rows},width={self.width}]'
+
+
+@dataclass
+class Regression:
+    key: str
+    baseline: float
+    value: float
+    change: float
+
+    def __str__(self) -> str:
+        return f'{self.key}: {self.baseline:.2f} -> {self.value:.2f} ({self.change:+.1%})'
+
+
+def make_keys(width: int) -> dict[str, types.DbType]:
+    keys = {'id': types.DbType.STR, 'group': types.DbType.INT}
+    for i in range(width - len(keys)):
+        keys[f'col_{i}'] = types.DbType.INT if i % 2 == 0 else types.DbType.STR
+    return keys
+
+
+def make_rows(keys: dict[str, types.DbType], rows: int, seed: int = 0) -> list[dict]:
+    rnd = random.Random(seed)
+    groups = max(rows // 100, 1)
+    result = []
+    for i in range(rows):
+        data = {}
+        for key, type_v in keys.items():
+            if key == 'id':
+                data[key] = f'id-{i}'
+            elif key == 'group':
+                data[key] = rnd.randrange(groups)
+            elif type_v == types.DbType.INT:
+                data[key] = rnd.randrange(1_000_000)
+            else:
+                data[key] = f'{rnd.getrandbits(64):016x}'
+        result.append(data)
+    return result
+
+
+@contextmanager
+def timer() -> Generator[Callable[[], float], None, None]:
+    start = time.perf_counter()
+    end = None
+
+    def elapsed() -> float:
+        return (end or time.perf_counter()) - start
+
+    yield elapsed
+    end = time.perf_counter()
+
+
+def _rate(amount: int, seconds: float) -> float:
+    return amount / seconds if seconds > 0 else float('inf')
+
+
+def run_case(rows: int, width: int, seed: int = 0) -> list[BenchResult]:
+    keys = make_keys(width)
+    rows_data = make_rows(keys, rows, seed)
+    lookups = random.Random(seed).sample(range(rows), min(LOOKUPS, rows))
+    results = []
+
+    def add(name: str, value: float, unit: str, higher_is_better: bool = True) -> None:
+        results.append(BenchResult(name, rows, width, value, unit, higher_is_better))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'bench.db-lab')
+        db = Database(db_file=db_file)
+        db.create_table(types.TableCreate(name=TABLE_NAME, keys=keys))
+        empty_size = os.path.getsize(db_file)
+
+        with timer() as elapsed:
+            db.import_rows(TABLE_NAME, rows_data)
+        add('bulk_insert', _rate(rows, elapsed()), 'rows/s')
+        add('file_size_per_row', (os.path.getsize(db_file) - empty_size) / rows, 'bytes', higher_is_better=False)
+
+        single_rows = rows_data[:min(rows, 200)]
+        with timer() as elapsed:
+            for data in single_rows:
+                db.insert_row(TABLE_NAME, types.Row(data=data))
+        add('single_insert', _rate(len(single_rows), elapsed()), 'rows/s')
+        total_rows = rows + len(single_rows)
+
+        with timer() as elapsed:
+            scanned = sum(1 for _ in db.get_rows_data_iterator(TABLE_NAME))
+        assert scanned == total_rows
+        add('full_scan', _rate(total_rows, elapsed()), 'rows/s')
+
+        with timer() as elapsed:
+            for _ in db.get_rows_data_iterator(TABLE_NAME, {'group': 0}):
+                pass
+        add('filtered_scan', _rate(total_rows, elapsed()), 'rows/s')
+
+        with timer() as elapsed:
+            db.create_table_index(TABLE_NAME, 'id')
+        add('index_build', _rate(total_rows, elapsed()), 'rows/s')
+
+        with timer() as elapsed:
+            for i in lookups:
+                for _ in db.get_rows_data_iterator(TABLE_NAME, {'id': f'id-{i}'}, use_index=True):
+                    pass
+        add('index_lookup', _rate(len(lookups), elapsed()), 'ops/s')
+
+        db.indexer.save()
+        with timer() as elapsed:
+            Database(db_file=db_file)
+        add('startup_index_load', elapsed(), 's', higher_is_better=False)
+
+        os.remove(f'{db_file}.index.json')
+        with timer() as elapsed:
+            Database(db_file=db_file)
+        add('startup_index_rebuild', elapsed(), 's', higher_is_better=False)
+    return results
+
+
+def best_of(runs: list[list[BenchResult]]) -> list[BenchResult]:
+    best: dict[str, BenchResult] = {}
+    for run in runs:
+        for result in run:
+            current = best.get(result.key)
+            if current is None:
+                best[result.key] = result
+            elif (result.value > current.value) == result.higher_is_better and result.value != current.value:
+                best[result.key] = result
+    return list(best.values())
+
+
+def run_suite(
+    rows_list: list[int] | None = None,
+    widths: list[int] | None = None,
+    seed: int = 0,
+    repeat: int = DEFAULT_REPEAT,
+) -> list[BenchResult]:
+    results = []
+    for rows in rows_list or DEFAULT_ROWS:
+        for width in widths or DEFAULT_WIDTHS:
+            results.extend(best_of([run_case(rows, width, seed) for _ in range(repeat)]))
+    return results
+
+
+def save_results(path: str, results: list[BenchResult]) -> None:
+    with open(path, 'w') as f:
+        json.dump([asdict(it) for it in results], f, indent=2)
+
+
+def load_results(path: str) -> list[BenchResult]:
+    with open(path, 'r') as f:
+        return [BenchResult(**it) for it in json.load(f)]
+
+
+def compare(
+    results: list[BenchResult],
+    baseline: list[BenchResult],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> list[Regression]:
+    baseline_dict = {it.key: it for it in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_dict.get(result.key)
+        if base is None or base.value == 0:
+            continue
+        change = (result.value - base.value) / base.value
+        worse = -change if result.higher_is_better else change
+        if worse > tolerance:
+            regressions.append(Regression(result.key, base.value, result.value, change))
+    return regressions
+
+
+def format_results(results: list[BenchResult]) -> str:
+    return '\n'.join(
+        f'{it.key:<50} {it.value:>14.2f} {it.unit}'
+        for it in results
+    )
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from benchmarks.suite import (BenchResult, best_of, compare, load_results,
+                              run_case)
+
+BASELINE = os.environ.get('KVDB_BENCH_BASELINE')
+TOLERANCE = float(os.environ.get('KVDB_BENCH_TOLERANCE', 0.2))
+
+
+@pytest.mark.skipif(not os.environ.get('KVDB_BENCH'), reason='Set KVDB_BENCH=1 to run benchmarks')
+@pytest.mark.parametrize("rows", [1000, 10000])
+@pytest.mark.parametrize("width", [2, 8])
+def test_benchmark(rows: int, width: int):
+    if not BASELINE or not os.path.exists(BASELINE):
+        pytest.skip('Baseline file is not set')
+    results = best_of([run_case(rows, width) for _ in range(3)])
+    regressions = compare(results, load_results(BASELINE), TOLERANCE)
+    assert not regressions, '\n'.join(str(it) for it in regressions)
+
+
+def test_compare():
+    baseline = [
+        BenchResult('full_scan', 10, 2, 100.0, 'rows/s', True),
+        BenchResult('startup_index_load', 10, 2, 1.0, 's', False),
+    ]
+    results = [
+        BenchResult('full_scan', 10, 2, 70.0, 'rows/s', True),
+        BenchResult('startup_index_load', 10, 2, 1.1, 's', False),
+    ]
+    regressions = compare(results, baseline, tolerance=0.2)
+    assert [it.key for it in regressions] == ['full_scan[rows=10,width=2]']
+
+
+def test_best_of():
+    runs = [
+        [BenchResult('full_scan', 10, 2, 100.0, 'rows/s', True), BenchResult('load', 10, 2, 2.0, 's', False)],
+        [BenchResult('full_scan', 10, 2, 120.0, 'rows/s', True), BenchResult('load', 10, 2, 3.0, 's', False)],
+    ]
+    assert [it.value for it in best_of(runs)] == [120.0, 2.0]
@@ -2,22 +2,47 @@ import argparse
 
 from app.db import Database
 from app.parser import Parser
+from app.replica import Replica
+from app.util import check_positive
 
 
 def main():
     parser = argparse.ArgumentParser(prog="select")
     parser.add_argument('--db-file', '-d', dest="db_file", required=True, help='Database filename or path')
+    parser.add_argument(
+        '--result-cache', dest="result_cache", type=check_positive, default=0,
+        help='Memory budget of select results cache in MiB, disabled by default',
+    )
+
+    parser.add_argument(
+        '--change-log', dest="change_log", action="store_true", default=False,
+        help='Log writes for replicas, log is kept in the next sessions',
+    )
+    parser.add_argument(
+        '--replica-of', dest="replica_of", default=None,
+        help='Open read only replica of primary database file which has change log',
+    )
 
     args = parser.parse_args()
-    database = Database(db_file=args.db_file)
-    parser = Parser(database=database)
+    result_cache_size = args.result_cache * 1024 * 1024
+    replica = None
+    if args.replica_of:
+        replica = Replica(args.replica_of, args.db_file, RESULT_CACHE_SIZE=result_cache_size)
+        replica.start()
+        database = replica.database
+    else:
+        database = Database(db_file=args.db_file, RESULT_CACHE_SIZE=result_cache_size, CHANGE_LOG=args.change_log)
+    parser = Parser(database=database, replica=replica)
     print('Init connection')
     while True:
         try:
             msg = input('$> ')
             parser.exec_cmd(msg)
         except KeyboardInterrupt:
-            database.indexer.save()
+            if replica is not None:
+                replica.close()
+            else:
+                database.save()
             break
 
 
@@ -41,18 +41,17 @@ def test_write_db_table(cursor: DatabaseCursor):
     )
     cursor.write_table_meta(table)
     assert table.name in cursor.tables
-    cache_table, offset = cursor.tables[table.name]
+    cache_table, table_id = cursor.tables[table.name]
     assert cache_table == table
+    assert cursor.get_table_by_id(table_id) == table
 
-    print(f'{cursor.db_meta.first_table_offset=}')
-    assert offset == cursor.db_meta.first_table_offset
+    print(f'{cursor.db_meta.catalog_offset=}')
+    assert cursor.db_meta.has_catalog()
     tables = cursor.read_all_tables()
     print(f'{tables[0]=}')
     assert table == tables[0][0]
-    assert offset == tables[0][1]
+    assert table_id == tables[0][1]
     assert len(tables) == 1
-    db_table = cursor.read_table_meta(offset)
-    assert db_table == table
 
 
 def test_write_2_db_tables(cursor: DatabaseCursor):
@@ -80,8 +79,9 @@ def test_write_2_db_tables(cursor: DatabaseCursor):
     assert tables[1][0].keys == table2.keys
     assert cursor.get_table_by_name(table.name).keys == table.keys
     assert cursor.get_table_by_name(table2.name).keys == table2.keys
-    assert cursor.db_meta.first_table_offset == tables[0][1]
-    assert cursor.db_meta.last_table_offset == tables[1][1]
+    assert tables[0][1] == 1
+    assert tables[1][1] == 2
+    assert cursor.get_table_by_id(tables[1][1]).name == table2.name
 
 
 def test_write_row(cursor: DatabaseCursor):
@@ -130,3 +130,132 @@ def test_write_2_row(cursor: DatabaseCursor):
     assert r_row.next_row_offset == db_table.last_row_offset
     assert r_row_2.prev_row_offset == db_table.first_row_offset
     assert r_row_2.next_row_offset == 0
+
+
+def test_write_rows_batch(cursor: DatabaseCursor):
+    table = types.MetaTable(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        indexes=[]
+    )
+    cursor.write_table_meta(table)
+    cursor.write_row_meta(table_name=table.name, row=types.MetaRow(data={'id': 'aaa', 'content': 1}))
+
+    rows = cursor.convert_rows_data(table, [
+        {'id': 'bbb', 'content': '2'},
+        {'id': 'c' * 600, 'content': 3},
+        {'id': 'ddd', 'content': 4},
+    ])
+    offsets = cursor.write_rows_meta(table.name, rows)
+    assert len(offsets) == 3
+
+    db_table = cursor.get_table_by_name(table.name)
+    assert db_table.last_row_offset == offsets[-1]
+    data = []
+    prev_offset = 0
+    offset = db_table.first_row_offset
+    while offset:
+        row = cursor.read_row_meta(offset)
+        assert row.prev_row_offset == prev_offset
+        data.append(row.data)
+        prev_offset, offset = offset, row.next_row_offset
+    assert data == [
+        {'id': 'aaa', 'content': 1},
+        {'id': 'bbb', 'content': 2},
+        {'id': 'c' * 600, 'content': 3},
+        {'id': 'ddd', 'content': 4},
+    ]
+
+
+def test_convert_rows_data_incompatible(cursor: DatabaseCursor):
+    table = types.MetaTable(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        indexes=[]
+    )
+    with pytest.raises(ValueError):
+        cursor.convert_rows_data(table, [{'id': 'aaa', 'content': 'x'}])
+    with pytest.raises(ValueError):
+        cursor.convert_rows_data(table, [{'id': 'aaa'}])
+
+
+def test_table_heads_update_keeps_catalog(cursor: DatabaseCursor):
+    table = types.MetaTable(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        indexes=[]
+    )
+    cursor.write_table_meta(table)
+    catalog_offset = cursor.db_meta.catalog_offset
+    for i in range(3):
+        cursor.write_row_meta(table_name=table.name, row=types.MetaRow(data={'id': 'a' * 600, 'content': i}))
+    assert cursor.db_meta.catalog_offset == catalog_offset
+
+    updated = cursor.get_table_by_name(table.name).copy(deep=True)
+    updated.indexes.append('content')
+    cursor.override_table_meta(updated, table.name)
+    assert cursor.db_meta.catalog_offset > catalog_offset
+
+    reopened = DatabaseCursor(db_file=cursor.db_file)
+    db_table = reopened.get_table_by_name(table.name)
+    assert db_table == cursor.get_table_by_name(table.name)
+    assert db_table.rows_count == 3
+    assert db_table.indexes == ['content']
+
+
+def test_many_tables_reopen(cursor: DatabaseCursor):
+    names = [f"Test Table {i}" for i in range(40)]
+    for name in names:
+        cursor.write_table_meta(types.MetaTable(name=name, keys={'id': types.DbType.INT}, indexes=[]))
+        cursor.write_row_meta(table_name=name, row=types.MetaRow(data={'id': 1}))
+
+    renamed = cursor.get_table_by_name(names[0]).copy()
+    renamed.name = 'Renamed'
+    cursor.override_table_meta(renamed, names[0])
+    assert not cursor.has_table(names[0])
+
+    reopened = DatabaseCursor(db_file=cursor.db_file)
+    assert [table.name for table, _ in reopened.read_all_tables()] == ['Renamed'] + names[1:]
+    for table_id, table in reopened.tables_by_id.items():
+        assert table.id == table_id
+        assert table.rows_count == 1
+        assert reopened.read_row_meta(table.first_row_offset).data == {'id': 1}
+
+
+def test_migrate_legacy_tables(cursor: DatabaseCursor):
+    legacy_tables = [
+        types.LegacyMetaTable(name='First', keys={'id': types.DbType.INT}, indexes=[]),
+        types.LegacyMetaTable(name='Second', keys={'id': types.DbType.INT}, indexes=['id']),
+    ]
+    first_offset = cursor._get_current_offset()
+    legacy_tables[0].next_table_offset = first_offset + cursor._META_BUFFER_SIZE
+    rows_offset = first_offset + 2 * cursor._META_BUFFER_SIZE
+    legacy_tables[1].first_row_offset = rows_offset
+    legacy_tables[1].last_row_offset = rows_offset + cursor._META_BUFFER_SIZE
+    cursor._write_meta(legacy_tables[0], first_offset, use_buffer=True)
+    cursor._write_meta(legacy_tables[1], legacy_tables[0].next_table_offset, use_buffer=True)
+    cursor._write_meta(types.MetaRow(data={'id': 1}, next_row_offset=legacy_tables[1].last_row_offset), rows_offset)
+    cursor._write_meta(types.MetaRow(data={'id': 2}, prev_row_offset=rows_offset), legacy_tables[1].last_row_offset)
+    cursor.write_db_meta(types.MetaDB(
+        created=cursor.db_meta.created,
+        updated=cursor.db_meta.updated,
+        first_table_offset=first_offset,
+    ))
+
+    migrated = DatabaseCursor(db_file=cursor.db_file)
+    assert migrated.db_meta.has_catalog()
+    assert migrated.db_meta.first_table_offset == 0
+    tables = [table for table, _ in migrated.read_all_tables()]
+    assert [table.name for table in tables] == ['First', 'Second']
+    assert tables[1].indexes == ['id']
+    assert tables[1].rows_count == 2
+    assert migrated.read_row_meta(tables[1].first_row_offset).data == {'id': 1}
+
+
+def test_row_record_format(cursor: DatabaseCursor):
+    record = types.RowRecord({'id': 'ы', 'content': 1}, next_row_offset=10, prev_row_offset=5)
+    meta_row = types.MetaRow.parse_raw(record.json())
+    assert record == meta_row
+    assert types.RowRecord.from_dict(meta_row.dict()) == record
+    assert record.copy() == record and record.copy() is not record
+    assert not hasattr(record, '__dict__')
@@ -1,10 +1,17 @@
+import glob
+import json
 import os
+import threading
 import uuid
+from itertools import islice
 
 import pytest
 
 from app import types
+from app.aggregate import Aggregation
+from app.continuation import Continuation
 from app.db import Database
+from app.transfer import read_records
 
 
 def gen_db_path():
@@ -17,7 +24,8 @@ def db():
     filename = gen_db_path()
     db = Database(db_file=filename)
     yield db
-    os.remove(filename)
+    for path in glob.glob(f'{filename}*'):
+        os.remove(path)
 
 
 def test_create_db_table(db: Database):
@@ -118,3 +126,1023 @@ def test_filter_row(db: Database):
         rows.append(row)
     print(f'{rows=}')
     assert rows == [row_1, row_2]
+
+
+@pytest.mark.parametrize("filename,content", [
+    ('data.jsonl', '{"id": "aaa", "content": 1}\n\n{"id": "bbb", "content": 2}\n{"id": "ccc", "content": 1}\n'),
+    ('data.csv', 'id,content\naaa,1\nbbb,2\nccc,1\n'),
+])
+def test_import_rows(db: Database, tmp_path, filename: str, content: str):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+    )
+    db.create_table(table)
+    db.create_table_index(table.name, 'content')
+    db.insert_row(table.name, types.Row(data={'id': 'first', 'content': 1}))
+
+    path = tmp_path / filename
+    path.write_text(content)
+    amount = db.import_rows(table.name, read_records(str(path)), batch_size=2)
+    assert amount == 3
+
+    rows = [row.data for row in db.get_rows_iterator(table.name)]
+    assert rows == [
+        {'id': 'first', 'content': 1},
+        {'id': 'aaa', 'content': 1},
+        {'id': 'bbb', 'content': 2},
+        {'id': 'ccc', 'content': 1},
+    ]
+    rows = [row.data['id'] for row in db.get_rows_iterator_use_indexes(table.name, {'content': 1})]
+    assert sorted(rows) == ['aaa', 'ccc', 'first']
+
+
+@pytest.mark.parametrize("filename", ['out.jsonl', 'out.csv', 'out.jsonl.gz', 'out.csv.gz'])
+def test_export_rows(db: Database, tmp_path, filename: str):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+    )
+    db.create_table(table)
+    db.create_table_index(table.name, 'content')
+    rows_data = [
+        {'id': 'aaa', 'content': 1},
+        {'id': 'b,"b', 'content': 2},
+        {'id': 'ccc', 'content': 1},
+    ]
+    for data in rows_data:
+        db.insert_row(table.name, types.Row(data=data))
+
+    path = str(tmp_path / filename)
+    assert db.export_rows(table.name, path) == 3
+    exported = [
+        db.cursor.convert_rows_data(db.cursor.get_table_by_name(table.name), [record])[0].data
+        for record in read_records(path)
+    ]
+    assert exported == rows_data
+
+    assert db.export_rows(table.name, path, filter_={'content': 1}, use_index=True, limit=1) == 1
+    assert len(list(read_records(path))) == 1
+
+
+def test_collect_stats(db: Database):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+    )
+    db.create_table(table)
+    db.create_table_index(table.name, 'content')
+    hook_calls = []
+    db.add_stats_hook(lambda name, query_stats: hook_calls.append((name, query_stats)))
+
+    with db.collect_stats('insert') as insert_stats:
+        db.insert_row(table.name, types.Row(data={'id': 'aaa', 'content': 1}))
+        db.insert_row(table.name, types.Row(data={'id': 'bbb', 'content': 2}))
+    assert insert_stats.bytes_written > 0
+    assert insert_stats.file_opens > 0
+
+    with db.collect_stats('select') as select_stats:
+        rows = list(db.get_rows_iterator(table.name, {'content': 1}))
+    assert len(rows) == 1
+    assert select_stats.rows_scanned == 2
+    assert select_stats.rows_filtered == 1
+    assert select_stats.rows_returned == 1
+    assert select_stats.records_decoded == 2
+    assert select_stats.bytes_written == 0
+    assert select_stats.bytes_read > 0
+    assert select_stats.decode_time > 0
+
+    with db.collect_stats('select index') as index_stats:
+        rows = list(db.get_rows_iterator_use_indexes(table.name, {'content': 2}))
+    assert len(rows) == 1
+    assert index_stats.index_postings == 1
+    assert index_stats.rows_scanned == 1
+
+    assert [name for name, _ in hook_calls] == ['insert', 'select', 'select index']
+    assert hook_calls[1][1] == select_stats
+    assert db.stats.rows_scanned >= 3
+    db.reset_stats()
+    assert db.stats.rows_scanned == 0
+
+
+def test_column_table(db: Database, tmp_path):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT, 'owner': types.DbType.STR},
+        engine=types.TableEngine.COLUMN,
+    )
+    db.create_table(table)
+    db.create_table_index(table.name, 'owner')
+    assert db.get_table_by_name(table.name).engine == types.TableEngine.COLUMN
+
+    rows_data = [
+        {'id': 'aaa', 'content': 1, 'owner': 'Lilly'},
+        {'id': '', 'content': -2, 'owner': 'Barry'},
+        {'id': 'ссс', 'content': 1, 'owner': 'Lilly'},
+    ]
+    db.insert_row(table.name, types.Row(data=rows_data[0]))
+    path = tmp_path / 'data.jsonl'
+    path.write_text('\n'.join(json.dumps(it) for it in rows_data[1:]))
+    assert db.import_rows(table.name, read_records(str(path))) == 2
+
+    assert [row.data for row in db.get_rows_iterator(table.name)] == rows_data
+    assert [row.data for row in db.get_rows_iterator(table.name, {'content': 1})] == [rows_data[0], rows_data[2]]
+    assert [row.data for row in db.get_rows_iterator(table.name, [{'content': -2}, {'id': ['ссс']}])] == rows_data[1:]
+    assert [row.data for row in db.get_rows_iterator_use_indexes(table.name, {'owner': 'Barry'})] == [rows_data[1]]
+
+    reopened = Database(db_file=db.db_file)
+    assert reopened.cursor.get_table_by_name(table.name).rows_count == 3
+    assert [row.data for row in reopened.get_rows_iterator(table.name, {'owner': 'Lilly'})] == [
+        rows_data[0], rows_data[2],
+    ]
+
+
+def test_column_table_drops_uncommitted_values(db: Database):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        engine=types.TableEngine.COLUMN,
+    )
+    db.create_table(table)
+    db.insert_row(table.name, types.Row(data={'id': 'aaa', 'content': 1}))
+    meta_table = db.cursor.get_table_by_name(table.name)
+    # values appended without updating rows count, as after a crash
+    db.cursor.get_column_store(meta_table).append([{'id': 'lost', 'content': 2}], meta_table.rows_count)
+
+    reopened = Database(db_file=db.db_file)
+    reopened.insert_row(table.name, types.Row(data={'id': 'bbb', 'content': 3}))
+    assert [row.data for row in reopened.get_rows_iterator(table.name)] == [
+        {'id': 'aaa', 'content': 1},
+        {'id': 'bbb', 'content': 3},
+    ]
+
+
+def test_column_table_rejects_out_of_range_ints(db: Database):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'a': types.DbType.INT, 'b': types.DbType.INT},
+        engine=types.TableEngine.COLUMN,
+    )
+    db.create_table(table)
+    db.insert_row(table.name, types.Row(data={'a': 1, 'b': 1}))
+    with pytest.raises(ValueError):
+        db.insert_row(table.name, types.Row(data={'a': 2, 'b': 2 ** 70}))
+    with pytest.raises(ValueError):
+        db.import_rows(table.name, [{'a': 2, 'b': 2}, {'a': 3, 'b': -2 ** 63 - 1}])
+    db.insert_row(table.name, types.Row(data={'a': 3, 'b': 2 ** 63 - 1}))
+    assert [row.data for row in db.get_rows_iterator(table.name)] == [{'a': 1, 'b': 1}, {'a': 3, 'b': 2 ** 63 - 1}]
+
+    # failed append is truncated, columns stay aligned
+    meta_table = db.cursor.get_table_by_name(table.name)
+    store = db.cursor.get_column_store(meta_table)
+    with pytest.raises(OverflowError):
+        store.append([{'a': 4, 'b': 2 ** 70}], meta_table.rows_count)
+    db.insert_row(table.name, types.Row(data={'a': 5, 'b': 5}))
+    assert [row.data['a'] for row in db.get_rows_iterator(table.name)] == [1, 3, 5]
+    assert [row.data['b'] for row in db.get_rows_iterator(table.name)] == [1, 2 ** 63 - 1, 5]
+
+
+@pytest.mark.parametrize("engine", list(types.TableEngine))
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_aggregate(db: Database, engine: types.TableEngine, use_numpy: bool):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'name': types.DbType.STR, 'age': types.DbType.INT, 'owner': types.DbType.STR},
+        engine=engine,
+    )
+    db.create_table(table)
+    db.COLUMN_BLOCK_SIZE = 2
+    rows_data = [
+        {'name': 'Kitty', 'age': 2, 'owner': 'Lilly'},
+        {'name': 'MurMur', 'age': 3, 'owner': 'Lilly'},
+        {'name': 'Pretty Cat', 'age': 1, 'owner': 'Barry'},
+        {'name': 'Tom', 'age': 7, 'owner': 'Barry'},
+        {'name': 'Garfield', 'age': 5, 'owner': 'Jon'},
+    ]
+    db.import_rows(table.name, rows_data)
+    aggs = [Aggregation.parse(it) for it in ['count', 'sum:age', 'min:age', 'max:age', 'max:name']]
+
+    assert db.aggregate(table.name, aggs, use_numpy=use_numpy) == [
+        {'count': 5, 'sum:age': 18, 'min:age': 1, 'max:age': 7, 'max:name': 'Tom'},
+    ]
+    assert db.aggregate(table.name, aggs, ['owner'], use_numpy=use_numpy) == [
+        {'owner': 'Barry', 'count': 2, 'sum:age': 8, 'min:age': 1, 'max:age': 7, 'max:name': 'Tom'},
+        {'owner': 'Jon', 'count': 1, 'sum:age': 5, 'min:age': 5, 'max:age': 5, 'max:name': 'Garfield'},
+        {'owner': 'Lilly', 'count': 2, 'sum:age': 5, 'min:age': 2, 'max:age': 3, 'max:name': 'MurMur'},
+    ]
+    assert db.aggregate(table.name, aggs[:2], ['owner', 'age'], {'owner': ['Lilly', 'Jon']}, use_numpy) == [
+        {'owner': 'Jon', 'age': 5, 'count': 1, 'sum:age': 5},
+        {'owner': 'Lilly', 'age': 2, 'count': 1, 'sum:age': 2},
+        {'owner': 'Lilly', 'age': 3, 'count': 1, 'sum:age': 3},
+    ]
+    assert db.aggregate(table.name, aggs[:3], filter_={'owner': 'Nobody'}, use_numpy=use_numpy) == [
+        {'count': 0, 'sum:age': 0, 'min:age': None},
+    ]
+    assert db.aggregate(table.name, aggs[:1], ['owner'], {'owner': 'Nobody'}, use_numpy) == []
+    with pytest.raises(ValueError):
+        db.aggregate(table.name, [Aggregation.parse('sum:name')])
+
+
+@pytest.mark.parametrize("engine", list(types.TableEngine))
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_aggregate_large_ints(db: Database, engine: types.TableEngine, use_numpy: bool):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'owner': types.DbType.STR, 'amount': types.DbType.INT},
+        engine=engine,
+    )
+    db.create_table(table)
+    db.import_rows(table.name, [{'owner': 'Lilly', 'amount': 2 ** 62}, {'owner': 'Lilly', 'amount': 2 ** 62}])
+    aggs = [Aggregation.parse(it) for it in ['sum:amount', 'min:amount', 'max:amount']]
+    # sums beyond int64 do not wrap around
+    assert db.aggregate(table.name, aggs, use_numpy=use_numpy) == [
+        {'sum:amount': 2 ** 63, 'min:amount': 2 ** 62, 'max:amount': 2 ** 62},
+    ]
+    assert db.aggregate(table.name, aggs, ['owner'], use_numpy=use_numpy) == [
+        {'owner': 'Lilly', 'sum:amount': 2 ** 63, 'min:amount': 2 ** 62, 'max:amount': 2 ** 62},
+    ]
+    if engine == types.TableEngine.COLUMN:
+        return
+    # row tables keep ints which do not fit int64
+    db.insert_row(table.name, types.Row(data={'owner': 'Barry', 'amount': 2 ** 70}))
+    assert db.aggregate(table.name, aggs, use_numpy=use_numpy) == [
+        {'sum:amount': 2 ** 70 + 2 ** 63, 'min:amount': 2 ** 62, 'max:amount': 2 ** 70},
+    ]
+    assert db.aggregate(table.name, aggs, ['owner', 'amount'], use_numpy=use_numpy) == [
+        {'owner': 'Barry', 'amount': 2 ** 70, 'sum:amount': 2 ** 70, 'min:amount': 2 ** 70, 'max:amount': 2 ** 70},
+        {'owner': 'Lilly', 'amount': 2 ** 62, 'sum:amount': 2 ** 63, 'min:amount': 2 ** 62, 'max:amount': 2 ** 62},
+    ]
+
+
+def test_zone_maps_skip_blocks(db: Database):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+    )
+    db.create_table(table)
+    meta_table = db.cursor.get_table_by_name(table.name)
+    db.cursor.zone_maps[meta_table.id].block_size = 10
+    db.import_rows(table.name, [{'id': f'id-{i}', 'content': i} for i in range(95)], batch_size=30)
+    db.insert_row(table.name, types.Row(data={'id': 'last', 'content': 1000}))
+
+    zones = db.cursor.get_zone_maps(db.cursor.get_table_by_name(table.name))
+    assert [zone.count for zone in zones.zones] == [10] * 9 + [6]
+
+    with db.collect_stats('select') as select_stats:
+        rows = [row.data for row in db.get_rows_iterator(table.name, {'content': [15, 1000]})]
+    assert rows == [{'id': 'id-15', 'content': 15}, {'id': 'last', 'content': 1000}]
+    assert select_stats.blocks_skipped == 8
+    assert select_stats.rows_scanned == 16
+
+    with db.collect_stats('select') as select_stats:
+        rows = [row.data for row in db.get_rows_iterator(table.name, [{'id': 'id-42'}, {'id': 'nope'}])]
+    assert rows == [{'id': 'id-42', 'content': 42}]
+    assert select_stats.blocks_skipped >= 8
+
+    db.save()
+    reopened = Database(db_file=db.db_file)
+    reopened_zones = reopened.cursor.get_zone_maps(reopened.cursor.get_table_by_name(table.name))
+    assert reopened_zones.dump() == zones.dump()
+
+
+def test_zone_maps_rebuild_when_stale(db: Database):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+    )
+    db.create_table(table)
+    db.insert_row(table.name, types.Row(data={'id': 'aaa', 'content': 1}))
+    db.save()
+    db.insert_row(table.name, types.Row(data={'id': 'bbb', 'content': 2}))
+
+    meta_table = db.cursor.get_table_by_name(table.name)
+    last_row = db.cursor.read_row_meta(meta_table.last_row_offset)
+    last_row.data = {'id': 'ccc', 'content': 3}
+    db.cursor.override_row_meta(table.name, last_row, meta_table.last_row_offset)
+    assert db.cursor.get_zone_maps(meta_table) is None
+    assert [row.data['id'] for row in db.get_rows_iterator(table.name, {'content': 3})] == ['ccc']
+
+    reopened = Database(db_file=db.db_file)
+    zones = reopened.cursor.get_zone_maps(reopened.cursor.get_table_by_name(table.name))
+    assert zones.rows_count == 2
+    assert [row.data['id'] for row in reopened.get_rows_iterator(table.name, {'content': 3})] == ['ccc']
+
+
+def test_zone_maps_rebuild_after_crash(db: Database):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.INT, 'v': types.DbType.STR},
+    )
+    db.create_table(table)
+    db.import_rows(table.name, [{'id': i, 'v': f'v-{i % 10}'} for i in range(3000)])
+    db.save()
+    meta_table = db.cursor.get_table_by_name(table.name)
+    first_row = db.cursor.read_row_meta(meta_table.first_row_offset)
+    first_row.data = {'id': 99999, 'v': 'zzz'}
+    db.cursor.override_row_meta(table.name, first_row, meta_table.first_row_offset)
+
+    # rows count is not changed, saved zone maps are dropped by the write
+    crashed = Database(db_file=db.db_file)
+    expected = [{'id': 99999, 'v': 'zzz'}]
+    assert [row.data for row in crashed.get_rows_iterator(table.name, {'id': 99999})] == expected
+    assert [row.data for row in crashed.get_rows_iterator(table.name, {'v': 'zzz'})] == expected
+
+
+@pytest.mark.parametrize('compression', [types.Compression.ZLIB, types.Compression.LZMA])
+def test_compressed_table(db: Database, compression: types.Compression):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 8
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        compression=compression,
+        compression_level=6,
+    )
+    plain_table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+    )
+    db.create_table(table)
+    db.create_table(plain_table)
+    db.create_table_index(table.name, 'id')
+    meta_table = db.cursor.get_table_by_name(table.name)
+    db.cursor.zone_maps[meta_table.id].block_size = 10
+    rows_data = [{'id': f'id-{i}', 'content': i % 3} for i in range(40)]
+    db.insert_row(table.name, types.Row(data=rows_data[0]))
+    db.import_rows(table.name, rows_data[1:30], batch_size=9)
+    db.import_rows(plain_table.name, rows_data[:30])
+    for data in rows_data[30:]:
+        db.insert_row(table.name, types.Row(data=data))
+    assert db.get_table_by_name(table.name).compression == compression
+
+    assert [row.data for row in db.get_rows_iterator(table.name)] == rows_data
+    with db.collect_stats('select') as select_stats:
+        assert [row.data for row in db.get_rows_iterator(table.name)] == rows_data
+    assert select_stats.cache_hits == 5
+    assert select_stats.cache_misses == 0
+    assert [row.data['id'] for row in db.get_rows_iterator(table.name, {'id': 'id-33'})] == ['id-33']
+    for i in [0, 5, 17, 39]:
+        rows = [row.data for row in db.get_rows_iterator_use_indexes(table.name, {'id': f'id-{i}'})]
+        assert rows == [rows_data[i]]
+
+    with db.collect_stats('select') as compressed_stats:
+        list(islice(db.get_rows_iterator(table.name), 30))
+    with db.collect_stats('select') as plain_stats:
+        list(db.get_rows_iterator(plain_table.name))
+    assert compressed_stats.bytes_read < plain_stats.bytes_read
+
+    meta_table = db.cursor.get_table_by_name(table.name)
+    first_ref = next(db.cursor.iter_table_rows(meta_table))[0]
+    with pytest.raises(ValueError):
+        db.cursor.override_row_meta(table.name, types.MetaRow(data=rows_data[0]), first_ref)
+
+    db.save()
+    reopened = Database(db_file=db.db_file)
+    reopened.cursor._COMPRESSED_BLOCK_ROWS = 8
+    reopened.insert_row(table.name, types.Row(data={'id': 'last', 'content': 7}))
+    assert [row.data for row in reopened.get_rows_iterator(table.name)] == rows_data + [{'id': 'last', 'content': 7}]
+    assert [row.data['id'] for row in reopened.get_rows_iterator_use_indexes(table.name, {'id': 'id-38'})] == ['id-38']
+    assert reopened.get_table_by_name(table.name).compression_level == 6
+
+
+def test_compressed_table_validation(db: Database):
+    keys = {'id': types.DbType.STR}
+    with pytest.raises(ValueError):
+        db.create_table(types.TableCreate(
+            name='column', keys=keys, engine=types.TableEngine.COLUMN, compression=types.Compression.ZLIB,
+        ))
+    with pytest.raises(ValueError):
+        db.create_table(types.TableCreate(name='level', keys=keys, compression_level=5))
+    with pytest.raises(ValueError):
+        db.create_table(types.TableCreate(
+            name='zlib', keys=keys, compression=types.Compression.ZLIB, compression_level=11,
+        ))
+    assert db.get_all_tables() == []
+
+
+@pytest.mark.parametrize('compression', [None, types.Compression.ZLIB])
+def test_snapshot_reads(db: Database, compression: types.Compression | None):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 4
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        compression=compression,
+    )
+    db.create_table(table)
+    db.create_table_index(table.name, 'content')
+    db.import_rows(table.name, [{'id': f'id-{i}', 'content': i % 2} for i in range(6)])
+
+    rows = db.get_rows_iterator(table.name)
+    indexed_rows = db.get_rows_iterator_use_indexes(table.name, {'content': 1})
+    assert next(rows).data == {'id': 'id-0', 'content': 0}
+    first_indexed_id = next(indexed_rows).data['id']
+
+    # row 5 is still in staging area, it is changed and then moved into compressed block
+    meta_table = db.cursor.get_table_by_name(table.name)
+    last_row = db.cursor.read_row_meta(meta_table.last_row_offset)
+    last_row.data = {'id': 'changed', 'content': 1}
+    db.cursor.override_row_meta(table.name, last_row, meta_table.last_row_offset)
+    for i in range(6, 10):
+        db.insert_row(table.name, types.Row(data={'id': f'id-{i}', 'content': 1}))
+
+    assert [row.data['id'] for row in rows] == [f'id-{i}' for i in range(1, 6)]
+    assert sorted([first_indexed_id] + [row.data['id'] for row in indexed_rows]) == ['id-1', 'id-3', 'id-5']
+    assert [row.data['id'] for row in db.get_rows_iterator(table.name, {'content': 1})] == [
+        'id-1', 'id-3', 'changed', 'id-6', 'id-7', 'id-8', 'id-9',
+    ]
+    assert db.cursor.versions.snapshots == []
+    assert db.cursor.versions.undo == {}
+
+    commit_seq = db.cursor.versions.commit_seq
+    db.save()
+    assert Database(db_file=db.db_file).cursor.versions.commit_seq == commit_seq
+
+
+def test_disk_indexes(db: Database):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 16
+    db.indexer.cache_pages = 4
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        compression=types.Compression.ZLIB,
+    )
+    db.create_table(table)
+    db.import_rows(table.name, [{'id': f'id-{i}', 'content': i % 3} for i in range(500)])
+    db.create_table_index(table.name, 'content', on_disk=True)
+    db.create_table_index(table.name, 'id', on_disk=True)
+    for i in range(500, 1000):
+        db.insert_row(table.name, types.Row(data={'id': f'id-{i}', 'content': i % 3}))
+    assert db.get_table_by_name(table.name).disk_indexes == ['content', 'id']
+    assert table.name not in db.indexer.index_dict or not db.indexer.index_dict[table.name]
+
+    def check(database: Database):
+        rows = [row.data['id'] for row in database.get_rows_iterator_use_indexes(table.name, {'content': 2})]
+        assert sorted(rows) == sorted(f'id-{i}' for i in range(2, 1000, 3))
+        for i in [0, 499, 500, 999]:
+            rows = [row.data for row in database.get_rows_iterator_use_indexes(table.name, {'id': f'id-{i}'})]
+            assert rows == [{'id': f'id-{i}', 'content': i % 3}]
+        assert all(len(it.pages) <= 4 for it in database.indexer.hash_indexes.values())
+
+    check(db)
+    db.save()
+    reopened = Database(db_file=db.db_file)
+    reopened.indexer.cache_pages = 4
+    with reopened.collect_stats('select') as select_stats:
+        check(reopened)
+    assert select_stats.rows_scanned == 333 + 4
+
+    # changes without save leave index dirty, it is rebuilt on next use
+    reopened.insert_row(table.name, types.Row(data={'id': 'id-1000', 'content': 2}))
+    crashed = Database(db_file=db.db_file)
+    rows = [row.data for row in crashed.get_rows_iterator_use_indexes(table.name, {'id': 'id-1000'})]
+    assert rows == [{'id': 'id-1000', 'content': 2}]
+
+    # first write after crash rebuilds dirty index with its own row
+    crashed.insert_row(table.name, types.Row(data={'id': 'id-1001', 'content': 2}))
+    rows = [row.data for row in crashed.get_many(table.name, 'id', ['id-1001'])[0]]
+    assert rows == [{'id': 'id-1001', 'content': 2}]
+    assert len(crashed.get_many(table.name, 'content', [2])[0]) == 333 + 2
+
+
+@pytest.mark.parametrize('engine, compression', [
+    (types.TableEngine.ROW, None),
+    (types.TableEngine.ROW, types.Compression.ZLIB),
+    (types.TableEngine.COLUMN, None),
+])
+def test_continuation_tokens(db: Database, engine: types.TableEngine, compression: types.Compression | None):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 8
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        engine=engine,
+        compression=compression,
+    )
+    db.create_table(table)
+    meta_table = db.cursor.get_table_by_name(table.name)
+    if engine == types.TableEngine.ROW:
+        db.cursor.zone_maps[meta_table.id].block_size = 10
+    rows_data = [{'id': f'id-{i}', 'content': i % 4} for i in range(45)]
+    db.import_rows(table.name, rows_data)
+
+    def read_pages(filter_: types.Filter | None, limit: int) -> list[list[dict]]:
+        pages = []
+        token = None
+        while True:
+            rows = db.get_rows_iterator(table.name, filter_, after=token)
+            page = [row.data for row in islice(rows, limit)]
+            if not page:
+                return pages
+            pages.append(page)
+            token = rows.token
+
+    assert sum(read_pages(None, 7), []) == rows_data
+    assert sum(read_pages({'content': [1, 2]}, 4), []) == [it for it in rows_data if it['content'] in [1, 2]]
+
+    rows = db.get_rows_iterator(table.name, {'content': 3})
+    assert [row.data for row in islice(rows, 3)] == [rows_data[3], rows_data[7], rows_data[11]]
+    token = rows.token
+    with db.collect_stats('select') as select_stats:
+        rows = [row.data for row in islice(db.get_rows_iterator(table.name, {'content': 3}, after=token), 2)]
+    assert rows == [rows_data[15], rows_data[19]]
+    if engine == types.TableEngine.ROW:
+        assert select_stats.rows_scanned <= 10
+
+    if engine == types.TableEngine.ROW and not compression:
+        # changed row cannot be used to resume, position in table is used instead
+        ref = Continuation.decode(token).ref
+        meta_row = db.cursor.read_row_meta(ref)
+        meta_row.data = {'id': 'changed', 'content': 3}
+        db.cursor.override_row_meta(table.name, meta_row, ref)
+        rows = [row.data for row in islice(db.get_rows_iterator(table.name, {'content': 3}, after=token), 2)]
+        assert rows == [rows_data[15], rows_data[19]]
+
+    with pytest.raises(ValueError):
+        db.get_rows_iterator(table.name, {'content': 2}, after=token)
+    with pytest.raises(ValueError):
+        db.get_rows_iterator(table.name, after='broken')
+
+
+@pytest.mark.parametrize('engine, compression', [
+    (types.TableEngine.ROW, None),
+    (types.TableEngine.ROW, types.Compression.ZLIB),
+    (types.TableEngine.COLUMN, None),
+])
+def test_reverse_and_sorted_rows(db: Database, engine: types.TableEngine, compression: types.Compression | None):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 8
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        engine=engine,
+        compression=compression,
+    )
+    db.create_table(table)
+    rows_data = [{'id': f'id-{i}', 'content': (i * 7) % 10} for i in range(30)]
+    db.import_rows(table.name, rows_data[:20])
+    for data in rows_data[20:]:
+        db.insert_row(table.name, types.Row(data=data))
+
+    assert [row.data for row in db.get_rows_iterator(table.name, reverse=True)] == rows_data[::-1]
+    with db.collect_stats('select') as select_stats:
+        rows = [row.data for row in islice(db.get_rows_iterator(table.name, {'content': 3}, reverse=True), 2)]
+    assert rows == [rows_data[29], rows_data[19]]
+    if engine == types.TableEngine.ROW:
+        assert select_stats.rows_scanned == 11
+
+    assert db.get_sorted_rows_data(table.name, 'content', limit=4) == [
+        rows_data[0], rows_data[10], rows_data[20], rows_data[3],
+    ]
+    assert db.get_sorted_rows_data(table.name, 'content', desc=True, limit=2, filter_={'content': [1, 4]}) == [
+        rows_data[2], rows_data[12],
+    ]
+    assert db.get_sorted_rows_data(table.name, 'id') == sorted(rows_data, key=lambda it: it['id'])
+    assert [row.data for row in db.get_sorted_rows(table.name, 'content', True, 1)] == [rows_data[7]]
+    with pytest.raises(ValueError):
+        db.get_sorted_rows_data(table.name, 'missing')
+
+
+@pytest.mark.parametrize('engine, compression', [
+    (types.TableEngine.ROW, None),
+    (types.TableEngine.ROW, types.Compression.ZLIB),
+    (types.TableEngine.COLUMN, None),
+])
+def test_primary_key(db: Database, engine: types.TableEngine, compression: types.Compression | None):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 8
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.INT, 'content': types.DbType.STR},
+        primary_key='id',
+        engine=engine,
+        compression=compression,
+    )
+    db.create_table(table)
+    assert db.get_table_by_name(table.name).indexes == ['id']
+    rows_data = [{'id': i, 'content': f'content-{i}'} for i in range(30)]
+    db.import_rows(table.name, rows_data[:20])
+    for data in rows_data[20:]:
+        db.insert_row(table.name, types.Row(data=data))
+
+    with db.collect_stats('get') as get_stats:
+        assert db.get(table.name, '17').data == rows_data[17]
+    assert get_stats.rows_scanned == 1
+    assert db.get(table.name, 29).data == rows_data[29]
+    assert db.get(table.name, 30) is None
+
+    with pytest.raises(ValueError):
+        db.insert_row(table.name, types.Row(data={'id': '5', 'content': 'duplicate'}))
+    with pytest.raises(ValueError):
+        db.import_rows(table.name, [{'id': 30, 'content': 'new'}, {'id': 30, 'content': 'duplicate'}])
+    db.import_rows(table.name, [{'id': 31, 'content': 'new'}])
+    # batches written before the duplicate stay in the table
+    with pytest.raises(ValueError):
+        db.import_rows(table.name, [{'id': 32, 'content': 'new'}, {'id': 31, 'content': 'duplicate'}], batch_size=1)
+    assert db.get(table.name, 5).data == rows_data[5]
+    assert db.get(table.name, 30) is None
+    assert db.get(table.name, 32).data == {'id': 32, 'content': 'new'}
+    assert len(list(db.get_rows_iterator(table.name))) == 32
+
+
+def test_primary_key_validation(db: Database):
+    name = f"Test Table {uuid.uuid4()}"
+    with pytest.raises(ValueError):
+        db.create_table(types.TableCreate(name=name, keys={'id': types.DbType.INT}, primary_key='missing'))
+    db.create_table(types.TableCreate(name=name, keys={'id': types.DbType.INT}))
+    with pytest.raises(ValueError):
+        db.get(name, 1)
+
+
+@pytest.mark.parametrize('engine, compression, on_disk', [
+    (types.TableEngine.ROW, None, False),
+    (types.TableEngine.ROW, None, True),
+    (types.TableEngine.ROW, types.Compression.ZLIB, False),
+    (types.TableEngine.COLUMN, None, False),
+])
+def test_get_many(
+    db: Database, engine: types.TableEngine, compression: types.Compression | None, on_disk: bool,
+):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 16
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.INT, 'group': types.DbType.STR},
+        primary_key='id',
+        engine=engine,
+        compression=compression,
+    )
+    db.create_table(table)
+    rows_data = [{'id': i, 'group': f'group-{i % 5}'} for i in range(200)]
+    db.import_rows(table.name, rows_data)
+    db.create_table_index(table.name, 'group', on_disk=on_disk)
+
+    values = [150, '3', 199, 500, 3, 0]
+    with db.collect_stats('mget') as mget_stats:
+        results = db.get_many(table.name, None, values)
+    assert [[row.data for row in rows] for rows in results] == [
+        [rows_data[150]], [rows_data[3]], [rows_data[199]], [], [rows_data[3]], [rows_data[0]],
+    ]
+    assert mget_stats.rows_scanned == 4
+    if engine == types.TableEngine.ROW and not compression:
+        assert mget_stats.seeks < 4
+
+    results = db.get_many(table.name, 'group', ['group-4', 'group-9', 'group-1'])
+    assert [[row.data['id'] for row in rows] for rows in results] == [
+        list(range(4, 200, 5)), [], list(range(1, 200, 5)),
+    ]
+    with pytest.raises(ValueError):
+        db.get_many(table.name, 'missing', [1])
+
+
+@pytest.mark.parametrize('compression', [None, types.Compression.ZLIB])
+def test_prefetch_scan(db: Database, compression: types.Compression | None):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 16
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        compression=compression,
+    )
+    db.create_table(table)
+    rows_data = [{'id': f'id-{i}' * (i % 50), 'content': i % 4} for i in range(300)]
+    db.import_rows(table.name, rows_data[:200])
+    for data in rows_data[200:]:
+        db.insert_row(table.name, types.Row(data=data))
+
+    with db.collect_stats('select') as serial_stats:
+        assert [row.data for row in db.get_rows_iterator(table.name, {'content': 1})] == rows_data[1::4]
+    with db.collect_stats('select') as prefetch_stats:
+        rows = [row.data for row in db.get_rows_iterator(table.name, {'content': 1}, prefetch=8)]
+    assert rows == rows_data[1::4]
+    assert prefetch_stats.bytes_read == serial_stats.bytes_read
+    assert prefetch_stats.rows_scanned == serial_stats.rows_scanned
+    assert prefetch_stats.file_opens < serial_stats.file_opens
+
+    # writes during the scan switch it back to reading rows in place
+    rows = db.get_rows_iterator(table.name, prefetch=4)
+    scanned = [row.data for row in islice(rows, 10)]
+    db.insert_row(table.name, types.Row(data={'id': 'new', 'content': 0}))
+    scanned.extend(row.data for row in rows)
+    assert scanned == rows_data
+    assert [row.data for row in islice(db.get_rows_iterator(table.name, prefetch=2), 3)] == rows_data[:3]
+    assert threading.active_count() == 1
+
+
+@pytest.mark.parametrize('compression', [None, types.Compression.ZLIB])
+def test_background_index_build(db: Database, compression: types.Compression | None):
+    db.cursor._COMPRESSED_BLOCK_ROWS = 16
+    db.indexer.build_chunk_rows = 8
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        compression=compression,
+    )
+    db.create_table(table)
+    db.import_rows(table.name, [{'id': f'id-{i}', 'content': i % 3} for i in range(300)])
+
+    with db.cursor.lock:
+        db.create_table_indexes(table.name, ['content', 'id'], background=True)
+        assert not db.indexer.is_ready(table.name, ['id'])
+        # index selects scan the table until the build is finished
+        rows = [row.data['id'] for row in db.get_rows_iterator_use_indexes(table.name, {'content': 2})]
+        assert rows == [f'id-{i}' for i in range(2, 300, 3)]
+        assert [[row.data for row in rows] for rows in db.get_many(table.name, 'id', ['id-5', 'id-500'])] == [
+            [{'id': 'id-5', 'content': 2}], [],
+        ]
+    for i in range(300, 400):
+        db.insert_row(table.name, types.Row(data={'id': f'id-{i}', 'content': i % 3}))
+    db.indexer.wait()
+    assert db.indexer.is_ready(table.name, ['content', 'id'])
+
+    with db.collect_stats('select') as select_stats:
+        rows = [row.data['id'] for row in db.get_rows_iterator_use_indexes(table.name, {'content': 2})]
+    assert sorted(rows) == sorted(f'id-{i}' for i in range(2, 400, 3))
+    assert select_stats.rows_scanned == len(rows)
+    assert [len(rows) for rows in db.get_many(table.name, 'id', [f'id-{i}' for i in range(400)])] == [1] * 400
+
+
+def test_background_index_build_failure(db: Database):
+    db.indexer.build_chunk_rows = 8
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+    )
+    db.create_table(table)
+    db.import_rows(table.name, [{'id': f'id-{i}', 'content': i % 3} for i in range(100)])
+    add_built = db.indexer._add_built
+    added = 0
+
+    def failing_add_built(*args):
+        nonlocal added
+        added += 1
+        if added > 20:
+            raise OSError('disk failure')
+        add_built(*args)
+
+    db.indexer._add_built = failing_add_built
+    db.create_table_indexes(table.name, ['content'], background=True)
+    db.indexer.wait()
+
+    # partially built index is dropped, rows are found by scan
+    assert db.indexer.errors == {table.name: {'content': 'disk failure'}}
+    assert db.get_table_by_name(table.name).indexes == []
+    assert db.indexer.is_ready(table.name, ['content'])
+    rows = [row.data['id'] for row in db.get_rows_iterator(table.name, {'content': 2})]
+    assert rows == [f'id-{i}' for i in range(2, 100, 3)]
+    with pytest.raises(ValueError):
+        db.get_many(table.name, 'content', [2])
+    db.indexer._add_built = add_built
+    db.create_table_index(table.name, 'content')
+    assert len(db.get_many(table.name, 'content', [2])[0]) == 33
+
+
+def test_multi_key_index_build(db: Database):
+    tables = [f"Test Table {uuid.uuid4()}" for _ in range(2)]
+    for name in tables:
+        db.create_table(types.TableCreate(name=name, keys={'id': types.DbType.STR, 'content': types.DbType.INT}))
+        db.import_rows(name, [{'id': f'id-{i}', 'content': i % 3} for i in range(100)])
+    with db.collect_stats('create-index') as index_stats:
+        db.create_table_indexes(tables[0], ['id', 'content'])
+    assert index_stats.records_decoded <= 100 + 2
+    db.create_table_indexes(tables[1], ['content'], on_disk=True)
+    with pytest.raises(ValueError):
+        db.create_table_indexes(tables[1], ['id', 'content'])
+    with pytest.raises(ValueError):
+        db.create_table_indexes(tables[1], ['id', 'id'])
+    db.save()
+    os.remove(f'{db.db_file}.index.json')
+
+    # indexes of all tables are rebuilt in parallel
+    reopened = Database(db_file=db.db_file)
+    for name in tables:
+        rows = [row.data['id'] for row in reopened.get_rows_iterator_use_indexes(name, {'content': 1})]
+        assert sorted(rows) == sorted(f'id-{i}' for i in range(1, 100, 3))
+
+
+@pytest.mark.parametrize('index, engine', [
+    (None, types.TableEngine.ROW),
+    ('memory', types.TableEngine.ROW),
+    ('disk', types.TableEngine.ROW),
+    ('memory', types.TableEngine.COLUMN),
+])
+def test_join(db: Database, index: str | None, engine: types.TableEngine):
+    cats = f"Cats {uuid.uuid4()}"
+    owners = f"Owners {uuid.uuid4()}"
+    db.create_table(types.TableCreate(name=cats, keys={'name': types.DbType.STR, 'owner': types.DbType.STR}))
+    db.create_table(types.TableCreate(
+        name=owners, keys={'name': types.DbType.STR, 'city': types.DbType.STR}, engine=engine,
+    ))
+    cats_data = [{'name': f'cat-{i}', 'owner': f'owner-{i % 7}'} for i in range(50)]
+    owners_data = [{'name': f'owner-{i}', 'city': f'city-{i % 2}'} for i in range(1, 10)]
+    db.import_rows(cats, cats_data)
+    db.import_rows(owners, owners_data)
+    if index:
+        db.create_table_index(owners, 'name', on_disk=index == 'disk')
+
+    def expected(cat_filter, owner_filter) -> list[tuple[dict, dict]]:
+        return [
+            (cat, owner)
+            for cat in cats_data if cat_filter(cat)
+            for owner in owners_data if owner['name'] == cat['owner'] and owner_filter(owner)
+        ]
+
+    with db.collect_stats('join') as join_stats:
+        pairs = [(left.data, right.data) for left, right in db.join(cats, owners, ('owner', 'name'))]
+    assert sorted(pairs, key=str) == sorted(expected(lambda it: True, lambda it: True), key=str)
+    if index:
+        # rows are joined in left table order
+        assert pairs == expected(lambda it: True, lambda it: True)
+        assert join_stats.index_postings == 6 * 1 and join_stats.rows_scanned == 50 + 6
+    else:
+        assert join_stats.index_postings == 0
+
+    pairs = db.join(cats, owners, ('owner', 'name'), {'owner': ['owner-1', 'owner-2', 'owner-0']}, {'city': 'city-1'})
+    assert sorted([(left.data, right.data) for left, right in pairs], key=str) == sorted(expected(
+        lambda it: it['owner'] in ['owner-1', 'owner-2', 'owner-0'], lambda it: it['city'] == 'city-1',
+    ), key=str)
+
+    with pytest.raises(ValueError):
+        db.join(cats, owners, ('owner', 'missing'))
+    with pytest.raises(ValueError):
+        db.join(cats, owners, ('owner', 'name'), {'missing': 1})
+
+
+@pytest.mark.parametrize('engine', [types.TableEngine.ROW, types.TableEngine.COLUMN])
+def test_result_cache(db: Database, engine: types.TableEngine):
+    db.result_cache.resize(64 * 1024)
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.STR, 'content': types.DbType.INT},
+        engine=engine,
+    )
+    db.create_table(table)
+    rows_data = [{'id': f'id-{i}', 'content': i % 4} for i in range(100)]
+    db.import_rows(table.name, rows_data)
+
+    with db.collect_stats('select') as miss_stats:
+        assert [row.data for row in db.get_rows_iterator(table.name, {'content': 1})] == rows_data[1::4]
+    with db.collect_stats('select') as hit_stats:
+        rows = db.get_rows_iterator(table.name, {'content': [1]})
+        assert [row.data for row in rows] == rows_data[1::4]
+    assert miss_stats.result_misses == 1 and miss_stats.rows_scanned == 100
+    assert hit_stats.result_hits == 1 and hit_stats.rows_scanned == 0 and hit_stats.rows_returned == 25
+    # continuation of cached result points to the same row
+    token = rows.token
+    assert [row.data for row in db.get_rows_iterator(table.name, {'content': [1]}, after=token)] == []
+    assert db.aggregate(table.name, [Aggregation.parse('count')], filter_={'content': 1}) == [{'count': 25}]
+
+    # writes to the table invalidate its results
+    db.insert_row(table.name, types.Row(data={'id': 'new', 'content': 1}))
+    with db.collect_stats('select') as write_stats:
+        rows = [row.data for row in db.get_rows_iterator(table.name, {'content': 1})]
+    assert rows == rows_data[1::4] + [{'id': 'new', 'content': 1}]
+    assert write_stats.result_misses == 1 and write_stats.rows_scanned == 101
+
+    if engine == types.TableEngine.ROW:
+        first = db.get_rows_iterator(table.name, {'content': 1})
+        next(first)
+        ref = Continuation.decode(first.token).ref
+        meta_row = db.cursor.read_row_meta(ref)
+        meta_row.data = {'id': 'changed', 'content': 1}
+        db.cursor.override_row_meta(table.name, meta_row, ref)
+        assert [row.data for row in db.get_rows_iterator(table.name, {'content': 1})][0] == meta_row.data
+
+    # partially read and too large results are not cached
+    list(islice(db.get_rows_iterator(table.name, {'content': 2}), 3))
+    db.result_cache.resize(1000)
+    list(db.get_rows_iterator(table.name))
+    assert db.result_cache.size <= 1000
+    with db.collect_stats('select') as partial_stats:
+        list(db.get_rows_iterator(table.name, {'content': 2}))
+        list(db.get_rows_iterator(table.name))
+    assert partial_stats.result_hits == 0
+
+
+@pytest.mark.parametrize('compression', [None, types.Compression.ZLIB])
+def test_partitioned_table(db: Database, compression: types.Compression | None):
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.INT, 'name': types.DbType.STR},
+        primary_key='id',
+        partition_key='id',
+        partitions=3,
+        compression=compression,
+    )
+    db.create_table(table)
+    rows_data = [{'id': i, 'name': f'name-{i % 7}'} for i in range(300)]
+    db.import_rows(table.name, rows_data, batch_size=64)
+    db.insert_row(table.name, types.Row(data={'id': '300', 'name': 'last'}))
+    rows_data.append({'id': 300, 'name': 'last'})
+    meta_table = db.get_table_by_name(table.name)
+    assert meta_table.partitions == 3 and db.cursor.get_table_by_name(table.name).rows_count == 301
+    partitions = db.partitions[db.cursor.get_table_by_name(table.name).id]
+    counts = [it.cursor.get_table_by_name(table.name).rows_count for it in partitions]
+    assert sum(counts) == 301 and all(counts)
+
+    def by_id(rows) -> list[dict]:
+        return sorted(rows, key=lambda it: it['id'])
+
+    assert db.get(table.name, 300).data == {'id': 300, 'name': 'last'}
+    assert [[row.data for row in rows] for rows in db.get_many(table.name, None, [5, 1000, 5])] == [
+        [rows_data[5]], [], [rows_data[5]],
+    ]
+    with pytest.raises(ValueError):
+        db.insert_row(table.name, types.Row(data={'id': 5, 'name': 'duplicate'}))
+
+    # scans of all partitions run in worker processes
+    with db.collect_stats('select') as fan_out_stats:
+        rows = [row.data for row in db.get_rows_iterator(table.name, {'name': 'name-3'})]
+    assert by_id(rows) == rows_data[3:300:7]
+    assert fan_out_stats.rows_scanned == 301 and fan_out_stats.rows_returned == len(rows)
+    with db.collect_stats('select') as routed_stats:
+        rows = [row.data for row in db.get_rows_iterator(table.name, {'id': [1, 2]})]
+    assert by_id(rows) == rows_data[1:3]
+    assert routed_stats.rows_scanned < 301
+    # worker processes are kept between scans
+    pool = db.pool
+    assert pool is not None
+    assert len(list(db.get_rows_iterator(table.name, {'name': 'name-4'}))) == 43 and db.pool is pool
+
+    db.create_table_index(table.name, 'name')
+    assert by_id(row.data for row in db.get_many(table.name, 'name', ['name-3'])[0]) == rows_data[3:300:7]
+    assert by_id(row.data for row in db.get_rows_iterator_use_indexes(table.name, {'name': 'name-3'})) == \
+        rows_data[3:300:7]
+    db.PARTITION_POOL_MIN_ROWS = 1
+    db.PARTITION_CHUNK_ROWS = 8
+    assert by_id(db.get_rows_data_iterator(table.name, {'name': ['name-3', 'last']}, use_index=True)) == \
+        rows_data[3:300:7] + [rows_data[-1]]
+
+    assert db.aggregate(table.name, [Aggregation.parse('count')], filter_={'name': 'name-3'}) == [{'count': 43}]
+    assert db.get_sorted_rows_data(table.name, 'id', desc=True, limit=2) == [rows_data[300], rows_data[299]]
+    with pytest.raises(ValueError):
+        db.get_rows_iterator(table.name, reverse=True)
+
+    db.save()
+    assert db.pool is None
+    reopened = Database(db_file=db.db_file)
+    assert by_id(row.data for row in reopened.get_rows_iterator(table.name)) == rows_data
+    assert reopened.get(table.name, 7).data == rows_data[7]
+
+
+def test_partitioned_table_validation(db: Database):
+    keys = {'id': types.DbType.INT, 'name': types.DbType.STR}
+    for table in [
+        types.TableCreate(name='Missing', keys=keys, partition_key='missing', partitions=2),
+        types.TableCreate(name='Zero', keys=keys, partition_key='id'),
+        types.TableCreate(name='Column', keys=keys, partition_key='id', partitions=2, engine=types.TableEngine.COLUMN),
+        types.TableCreate(name='Primary', keys=keys, partition_key='id', partitions=2, primary_key='name'),
+    ]:
+        with pytest.raises(ValueError):
+            db.create_table(table)
+
+
+def test_lsm_table(db: Database):
+    db.cursor._LSM_MEMTABLE_ROWS = 16
+    db.cursor._LSM_COMPACTION_RUNS = 3
+    table = types.TableCreate(
+        name=f"Test Table {uuid.uuid4()}",
+        keys={'id': types.DbType.INT, 'name': types.DbType.STR},
+        primary_key='id',
+        engine=types.TableEngine.LSM,
+    )
+    db.create_table(table)
+    # keys are inserted out of order, scans return them sorted
+    ids = [(i * 37) % 100 for i in range(100)]
+    db.import_rows(table.name, [{'id': i, 'name': f'name-{i % 5}'} for i in ids[:90]], batch_size=10)
+    for i in ids[90:]:
+        db.insert_row(table.name, types.Row(data={'id': str(i), 'name': f'name-{i % 5}'}))
+    rows_data = [{'id': i, 'name': f'name-{i % 5}'} for i in range(100)]
+    store = db.cursor.get_lsm_store(db.cursor.get_table_by_name(table.name))
+    store.wait()
+    assert store.memtable and len(store.runs) < 90 // 16
+    assert db.cursor.get_table_by_name(table.name).rows_count == 100
+    assert [row.data for row in db.get_rows_iterator(table.name)] == rows_data
+    assert [row.data for row in db.get_rows_iterator(table.name, {'name': 'name-3'})] == rows_data[3::5]
+    with pytest.raises(ValueError):
+        db.insert_row(table.name, types.Row(data={'id': 5, 'name': 'duplicate'}))
+
+    # point reads skip runs by key range and bloom filter
+    assert db.get(table.name, 42).data == rows_data[42]
+    assert db.get(table.name, 1000) is None
+    with db.collect_stats('get') as get_stats:
+        rows = [row.data for row in db.get_rows_iterator(table.name, {'id': [7, 1000]})]
+    assert rows == [rows_data[7]]
+    assert get_stats.rows_scanned == 1 and get_stats.blocks_skipped > 0
+    assert [[row.data for row in rows] for rows in db.get_many(table.name, None, [5, 1000, 5])] == [
+        [rows_data[5]], [], [rows_data[5]],
+    ]
+    assert list(db.get_rows_data_iterator(table.name, {'id': 8}, use_index=True)) == [rows_data[8]]
+    for query in [
+        lambda: db.get_many(table.name, 'name', ['name-1']),
+        lambda: db.create_table_index(table.name, 'name'),
+        lambda: db.get_rows_iterator(table.name, reverse=True),
+    ]:
+        with pytest.raises(ValueError):
+            query()
+    assert db.aggregate(table.name, [Aggregation.parse('count')], filter_={'name': 'name-3'}) == [{'count': 20}]
+    assert db.get_sorted_rows_data(table.name, 'id', desc=True, limit=2) == [rows_data[99], rows_data[98]]
+
+    # rows of memtable are replayed from write ahead log
+    db.save()
+    reopened = Database(db_file=db.db_file)
+    assert reopened.cursor.get_table_by_name(table.name).rows_count == 100
+    assert [row.data for row in reopened.get_rows_iterator(table.name)] == rows_data
+    assert reopened.get(table.name, ids[-1]).data == rows_data[ids[-1]]
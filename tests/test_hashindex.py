@@ -0,0 +1,43 @@
+import random
+
+from app.hashindex import _PAGE_CAPACITY, HashIndex
+
+
+def test_hash_index(tmp_path):
+    path = str(tmp_path / 'index')
+    hash_index = HashIndex(path, cache_pages=4)
+    assert not hash_index.valid
+    hash_index.clear()
+
+    rnd = random.Random(1)
+    expected: dict[int, list[int]] = {}
+    for ref in range(1, 5000):
+        # few frequent values do not fit into one page and go to overflow pages
+        hash_v = rnd.getrandbits(64) if ref % 2 else rnd.choice([7, 8, 2 ** 63 + 7])
+        expected.setdefault(hash_v, []).append(ref)
+        hash_index.add(hash_v, ref)
+    assert hash_index.global_depth > 0
+    assert len(hash_index.pages) <= 4
+    assert max(len(it) for it in expected.values()) > _PAGE_CAPACITY
+    for hash_v, refs in expected.items():
+        assert hash_index.get(hash_v) == refs
+    assert hash_index.get(12345) == []
+
+    hash_index.replace(7, expected[7][0], -1)
+    expected[7][0] = -1
+    # one bulk rewrite of overflow chain and of other buckets
+    refs = {7: {ref: -ref for ref in expected[7][1:]}, 8: {expected[8][-1]: -2}}
+    refs.update({hash_v: {it[0]: -3} for hash_v, it in list(expected.items())[:50] if hash_v not in (7, 8)})
+    hash_index.replace_many(refs)
+    for hash_v, remap in refs.items():
+        expected[hash_v] = [remap.get(it, it) for it in expected[hash_v]]
+    hash_index.flush()
+
+    reopened = HashIndex(path, cache_pages=16)
+    assert reopened.valid
+    for hash_v, refs in expected.items():
+        assert reopened.get(hash_v) == refs
+
+    reopened.add(7, 10000)
+    assert not HashIndex(path).valid
+    reopened.remove()
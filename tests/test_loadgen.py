@@ -0,0 +1,74 @@
+from collections import Counter
+
+import pytest
+
+from app import types
+from app.db import Database
+from app.loadgen import (Distribution, KeyDistribution, RowGenerator,
+                         percentile, run_load, table_generator)
+
+KEYS = {'id': types.DbType.INT, 'name': types.DbType.STR, 'group': types.DbType.INT}
+
+
+def test_parse_distribution():
+    assert KeyDistribution.parse('id=seq') == KeyDistribution('id', Distribution.SEQUENTIAL)
+    assert KeyDistribution.parse('group = zipf:1.5') == KeyDistribution('group', Distribution.ZIPF, s=1.5)
+    assert KeyDistribution.parse('name=card:10') == KeyDistribution('name', Distribution.CARDINALITY, 10)
+    for s in ['id=normal', '=seq', 'id=uniform:x', 'id=card:0']:
+        with pytest.raises(ValueError):
+            KeyDistribution.parse(s)
+
+
+def test_row_generator():
+    distributions = {
+        'id': KeyDistribution('id', Distribution.SEQUENTIAL),
+        'name': KeyDistribution('name', Distribution.CARDINALITY, 10),
+        'group': KeyDistribution('group', Distribution.ZIPF, 100),
+    }
+    generator = RowGenerator(KEYS, distributions, seed=3, batch_size=100)
+    batches = generator.batches(1050)
+    assert [len(it) for it in batches] == [100] * 10 + [50]
+    rows = [row for batch in batches for row in batch]
+    assert [row['id'] for row in rows] == list(range(1050))
+    assert len({row['name'] for row in rows}) == 10
+    groups = Counter(row['group'] for row in rows)
+    assert groups.most_common(1)[0][0] == 0
+    assert groups[0] > 5 * groups.get(10, 0)
+
+    # batches of inserts are generated lazily
+    assert list(generator.iter_batches(1050)) == batches
+
+    # rows depend only on seed, not on worker processes
+    assert RowGenerator(KEYS, distributions, seed=3, batch_size=100).batches(1050, workers=2) == batches
+    assert RowGenerator(KEYS, distributions, seed=4, batch_size=100).batches(1050) != batches
+    with pytest.raises(ValueError):
+        RowGenerator(KEYS, {'missing': KeyDistribution('missing', Distribution.SEQUENTIAL)})
+
+
+def test_run_load(tmp_path):
+    db = Database(db_file=str(tmp_path / 'load.db-lab'))
+    db.create_table(types.TableCreate(name='Load', keys=KEYS, primary_key='id'))
+
+    generator = table_generator(db, 'Load', [KeyDistribution('group', Distribution.UNIFORM, 5)], batch_size=64)
+    report = run_load(db, 'Load', 200, generator)
+    assert report.rows_written == 200
+    assert len(report.latencies['import']) == 4
+
+    # primary key continues after existing rows
+    report = run_load(db, 'Load', 100, table_generator(db, 'Load', seed=1), read_ratio=0.5)
+    assert report.rows_written == 100
+    assert len(report.latencies['insert']) == 100
+    assert len(report.latencies['get']) > 0
+    assert sorted(row.data['id'] for row in db.get_rows_iterator('Load')) == list(range(300))
+    assert {row.data['group'] for row in db.get_rows_iterator('Load', {'id': list(range(200))})} <= set(range(5))
+    assert 'p99=' in report.format()
+    with pytest.raises(ValueError):
+        run_load(db, 'Load', 10, generator, read_ratio=1)
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([], 50) == 0
@@ -0,0 +1,23 @@
+import os
+
+from app.profiler import ProfileOptions, profile_call
+
+
+def work(n: int) -> list[str]:
+    return [str(i) * 10 for i in range(n)]
+
+
+def test_profile_call(tmp_path):
+    options = ProfileOptions(memory=True, top=5, out_dir=str(tmp_path))
+    result, report = profile_call('work', options, work, 1000)
+    assert len(result) == 1000
+    assert os.path.exists(report.prof_file)
+    assert 'work' in report.functions
+    assert report.allocations is not None
+    assert 'test_profiler.py' in report.allocations
+
+
+def test_profile_call_without_memory(tmp_path):
+    options = ProfileOptions(top=5, out_dir=str(tmp_path))
+    _, report = profile_call('work', options, work, 10)
+    assert report.allocations is None
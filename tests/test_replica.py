@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from app import types
+from app.db import Database
+from app.replica import Replica
+
+BLOCK_ROWS = 8
+
+
+def open_replica(primary: Database, db_file: str) -> Replica:
+    replica = Replica(primary.db_file, db_file)
+    replica.database.cursor._COMPRESSED_BLOCK_ROWS = BLOCK_ROWS
+    return replica
+
+
+def table_rows(database: Database) -> dict[str, list[tuple[int, dict]]]:
+    return {
+        table.name: [(ref, row.data) for ref, row in database.cursor.iter_table_rows(table)]
+        for table in database.cursor.get_all_cached_tables()
+    }
+
+
+def test_replica(tmp_path):
+    primary = Database(db_file=str(tmp_path / 'primary.db-lab'))
+    primary.cursor._COMPRESSED_BLOCK_ROWS = BLOCK_ROWS
+    keys = {'id': types.DbType.INT, 'name': types.DbType.STR}
+    primary.create_table(types.TableCreate(name='Before', keys=keys))
+    primary.import_rows('Before', [{'id': i, 'name': f'name-{i}'} for i in range(10)])
+
+    # change log starts with copy of existing files
+    primary = Database(db_file=primary.db_file, CHANGE_LOG=True)
+    primary.cursor._COMPRESSED_BLOCK_ROWS = BLOCK_ROWS
+    primary.create_table(types.TableCreate(name='Users', keys=keys, primary_key='id'))
+    primary.create_table(types.TableCreate(name='Packed', keys=keys, compression=types.Compression.ZLIB))
+    primary.create_table(types.TableCreate(name='Columns', keys=keys, engine=types.TableEngine.COLUMN))
+    for name in ['Users', 'Packed', 'Columns']:
+        primary.import_rows(name, [{'id': i, 'name': f'name-{i % 3}'} for i in range(20)], batch_size=7)
+        primary.insert_row(name, types.Row(data={'id': 100, 'name': 'last'}))
+    primary.create_table_index('Packed', 'name', on_disk=True)
+    primary.insert_row('Before', types.Row(data={'id': 10, 'name': 'x' * 1000}))
+    ref = primary.indexer.get_offsets_for(primary.cursor.get_table_by_name('Users'), 'id', 5)[0]
+    # moved to the end of file
+    primary.cursor.override_row_meta('Users', types.RowRecord({'id': 5, 'name': 'x' * 1000}), ref)
+
+    replica = open_replica(primary, str(tmp_path / 'replica.db-lab'))
+    assert replica.status().pending_bytes > 0 and replica.status().lag_seconds > 0
+    assert replica.apply(limit=3) == 3
+    assert replica.apply() > 0
+    status = replica.status()
+    assert status.pending_bytes == 0 and status.lag_seconds == 0
+    assert table_rows(replica.database) == table_rows(primary)
+    assert replica.database.get('Users', 7) == primary.get('Users', 7)
+    assert replica.database.get('Users', 5).data == {'id': 5, 'name': 'x' * 1000}
+    assert [row.data for row in replica.database.get_rows_iterator_use_indexes('Packed', {'name': 'last'})] == [
+        {'id': 100, 'name': 'last'},
+    ]
+
+    with pytest.raises(ValueError):
+        replica.database.insert_row('Users', types.Row(data={'id': 200, 'name': 'replica'}))
+    with pytest.raises(ValueError):
+        replica.database.create_table(types.TableCreate(name='Replica', keys=keys))
+
+    # replica continues from saved position after restart
+    replica.close()
+    primary.import_rows('Packed', [{'id': i, 'name': 'more'} for i in range(5)])
+    replica = open_replica(primary, replica.db_file)
+    assert replica.position == status.position
+    replica.start()
+    primary.insert_row('Users', types.Row(data={'id': 101, 'name': 'new'}))
+    deadline = time.time() + 5
+    while replica.status().pending_bytes and time.time() < deadline:
+        time.sleep(0.01)
+    replica.stop()
+    assert replica.error is None
+    assert table_rows(replica.database) == table_rows(primary)
+    assert replica.database.get('Users', 101).data == {'id': 101, 'name': 'new'}
+    replica.close()
+
+    with pytest.raises(ValueError):
+        Replica(str(tmp_path / 'other.db-lab'), replica.db_file)
+    with pytest.raises(ValueError):
+        Replica(str(tmp_path / 'missing.db-lab'), str(tmp_path / 'replica-2.db-lab'))
+
+
+def test_change_log_rejects_partitioned_tables(tmp_path):
+    keys = {'id': types.DbType.INT, 'name': types.DbType.STR}
+    partitioned = types.TableCreate(name='Parts', keys=keys, partition_key='id', partitions=2)
+    primary = Database(db_file=str(tmp_path / 'primary.db-lab'), CHANGE_LOG=True)
+    with pytest.raises(ValueError):
+        primary.create_table(partitioned)
+    assert primary.get_all_tables() == []
+
+    db = Database(db_file=str(tmp_path / 'partitioned.db-lab'))
+    db.create_table(partitioned)
+    db.import_rows('Parts', [{'id': i, 'name': f'name-{i}'} for i in range(10)])
+    db.save()
+    with pytest.raises(ValueError):
+        Database(db_file=db.db_file, CHANGE_LOG=True)
+
+    # read only database does not create missing partition files
+    for path in tmp_path.glob('partitioned.db-lab.t*.p1*'):
+        path.unlink()
+    read_only = Database(db_file=db.db_file, READ_ONLY=True)
+    with pytest.raises(ValueError, match='does not exist'):
+        list(read_only.get_rows_iterator('Parts'))
+    assert not (tmp_path / 'partitioned.db-lab.t1.p1').exists()
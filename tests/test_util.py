@@ -1,6 +1,8 @@
+import argparse
+
 import pytest
 
-from app.util import convert_json
+from app.util import convert_json, valid_aggregations, valid_join_keys
 
 
 @pytest.mark.parametrize("val", [
@@ -34,3 +36,26 @@ def test_convert_long_json(val: str):
     print(f'{converted=}')
     print(f'_{expected=}')
     assert converted == expected
+
+
+@pytest.mark.parametrize("val,expected", [
+    ('count', ['count']),
+    ('sum:age, max:age', ['sum:age', 'max:age']),
+    ('MIN:name,', ['min:name']),
+])
+def test_valid_aggregations(val: str, expected: list[str]):
+    assert [it.name for it in valid_aggregations(val)] == expected
+
+
+@pytest.mark.parametrize("val", ['avg:age', 'sum'])
+def test_invalid_aggregations(val: str):
+    with pytest.raises(argparse.ArgumentTypeError):
+        valid_aggregations(val)
+
+
+def test_valid_join_keys():
+    assert valid_join_keys('owner = name') == ('owner', 'name')
+    assert valid_join_keys('id') == ('id', 'id')
+    for val in ['', '=name', 'owner=']:
+        with pytest.raises(argparse.ArgumentTypeError):
+            valid_join_keys(val)